@@ -0,0 +1,73 @@
+"""Throughput of group by key: a plain `collections.Counter` loop vs
+the `group_by` stage, counting and with several aggregations.
+
+Run: python benchmarks/bench_aggregate.py
+"""
+import sys
+sys.path.insert(0, '.')
+import os
+import random
+import time
+from collections import Counter
+
+from bramin import it
+from bramin.aggregate import group_by, count, total, distinct
+
+N = 2_000_000
+N_KEYS = 100_000
+
+
+def make_records():
+    rnd = random.Random(0)
+    return [(f"user{rnd.randrange(N_KEYS)}", rnd.randrange(1000))
+            for _ in range(N)]
+
+
+def counter_loop(records):
+    c = Counter()
+    for r in records:
+        c[r[0]] += 1
+    return c
+
+
+def dict_loop(records):
+    # count, sum, set of values by hand
+    d = {}
+    for r in records:
+        st = d.get(r[0])
+        if st is None:
+            st = d[r[0]] = [0, 0, set()]
+        st[0] += 1
+        st[1] += r[1]
+        st[2].add(r[1])
+    return d
+
+
+def main():
+    records = make_records()
+    # placeholder expressions are inlined into the generated loop
+    first, second = it[0], it[1]
+    aggs = {'n': count(), 'sum': total(second), 'values': distinct(second)}
+    workers = os.cpu_count()
+    runs = {
+        "Counter loop": lambda: counter_loop(records),
+        "group_by count": lambda: dict(group_by(first, count())(records)),
+        f"group_by count workers={workers}": lambda: dict(
+            group_by(first, count(), workers=workers)(records)),
+        "group_by count spilled": lambda: dict(
+            group_by(first, count(), memory_limit=1 << 20)(records)),
+        "dict loop count/sum/set": lambda: dict_loop(records),
+        "group_by count/sum/set": lambda: dict(
+            group_by(first, aggs)(records)),
+        f"group_by count/sum/set workers={workers}": lambda: dict(
+            group_by(first, aggs, workers=workers)(records)),
+    }
+    for name, run in runs.items():
+        t = time.perf_counter()
+        n = len(run())
+        cost = time.perf_counter() - t
+        print(f"  {name:<36} {N / cost:>12.0f} records/s  {n} groups")
+
+
+if __name__ == "__main__":
+    main()
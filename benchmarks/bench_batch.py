@@ -0,0 +1,63 @@
+"""Throughput and latency of per-item vs micro-batched calls.
+
+The stage simulates a function with a fixed per-call overhead
+(a DB round trip, a subprocess call ...) plus a small per-item cost.
+
+Run: python benchmarks/bench_batch.py
+"""
+import sys
+sys.path.insert(0, '.')
+import time
+import statistics
+
+from bramin import P
+from bramin.batch import batched
+
+CALL_COST = 2e-4
+ITEM_COST = 2e-6
+
+
+def score_many(items):
+    time.sleep(CALL_COST + ITEM_COST * len(items))
+    return [(t, x * 2) for t, x in items]
+
+
+def score_one(item):
+    return score_many([item])[0]
+
+
+def source(n, interval):
+    for i in range(n):
+        if interval:
+            time.sleep(interval)
+        yield time.perf_counter(), i
+
+
+def run(pipe, n, interval):
+    latencies = []
+    t0 = time.perf_counter()
+    for t, _ in pipe(source(n, interval)):
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - t0
+    latencies.sort()
+    return (n / total,
+            statistics.median(latencies),
+            latencies[int(len(latencies) * 0.99) - 1])
+
+
+def main(n=5000):
+    pipes = {
+        "per item": P | (lambda it: map(score_one, it)),
+        "batched(256)": P | batched(score_many, 256),
+        "batched(256, 5ms)": P | batched(score_many, 256, 0.005),
+    }
+    for interval in (0, 1e-4):
+        print(f"source interval: {interval}s")
+        for name, pipe in pipes.items():
+            tput, p50, p99 = run(pipe, n, interval)
+            print(f"  {name:<20} {tput:>10.0f} items/s  "
+                  f"p50 {p50 * 1e3:8.2f} ms  p99 {p99 * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
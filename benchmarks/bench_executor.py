@@ -0,0 +1,76 @@
+"""CPU-bound stages on the executor backends: serial, thread,
+process and interpreters pools, through `pmap` and a chunked pipe.
+The stage functions are run from the imported module(not `__main__`),
+so subinterpreters can load them.
+
+On Pythons without `InterpreterPoolExecutor`(< 3.14) the interpreters
+backend falls back to processes, the header says which one is used.
+
+Run: python benchmarks/bench_executor.py [workers]
+"""
+import sys
+sys.path.insert(0, '.')
+import os
+import time
+
+from bramin import P, END
+from bramin.chunk import concat
+from bramin.executor import pmap, pool_backend, HAS_INTERPRETERS
+
+N_TASKS = 64
+TASK_SIZE = 200_000
+
+
+def burn(n):
+    # pure python, holds the GIL
+    acc = 0
+    for i in range(n):
+        acc = (acc * 31 + i) % 1_000_003
+    return acc
+
+
+def burn_rows(rows):
+    return [burn(n) for n in rows]
+
+
+def timed(func):
+    t = time.perf_counter()
+    res = func()
+    return time.perf_counter() - t, res
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    tasks = [TASK_SIZE] * N_TASKS
+    print(f"python {sys.version.split()[0]}, {workers} workers, "
+          f"interpreters backend runs as "
+          f"{pool_backend('interpreters', burn)!r}"
+          f"{'' if HAS_INTERPRETERS else ' (not available)'}")
+
+    base, ref = timed(lambda: list(map(burn, tasks)))
+    print(f"{'serial':<28}{base:8.2f}s")
+    for backend in ('thread', 'process', 'interpreters'):
+        t, res = timed(lambda: list(pmap(burn, tasks, workers, backend)))
+        assert res == ref
+        print(f"{'pmap ' + backend:<28}{t:8.2f}s  x{base / t:.2f}")
+    size = max(N_TASKS // (2 * workers), 1)
+    chunks = [tasks[i:i + size] for i in range(0, N_TASKS, size)]
+    for backend in ('thread', 'process', 'interpreters'):
+        pipe = P.chunked(workers=workers, backend=backend) \
+            | burn_rows | concat
+        t, res = timed(lambda: chunks | pipe | END)
+        assert res == ref
+        print(f"{'chunked ' + backend:<28}{t:8.2f}s  x{base / t:.2f}")
+
+    # startup cost of a pool, tiny tasks
+    for backend in ('thread', 'process', 'interpreters'):
+        t, _ = timed(lambda: list(pmap(abs, range(workers), workers,
+                                       backend)))
+        print(f"{'startup ' + backend:<28}{t * 1e3:8.1f}ms")
+
+
+if __name__ == '__main__':
+    # run from the imported module, not __main__
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bench_executor
+    bench_executor.main()
@@ -0,0 +1,54 @@
+"""Read throughput of gzipped shards, one by one vs concurrently.
+
+Run: python benchmarks/bench_multifile.py
+"""
+import sys
+sys.path.insert(0, '.')
+import os
+import gzip
+import time
+import tempfile
+
+from bramin.io import callable_file
+from bramin.multifile import multi_file
+
+N_SHARDS = 8
+LINES = 200_000
+
+
+def make_shards(d):
+    for i in range(N_SHARDS):
+        with gzip.open(os.path.join(d, f"part-{i}.gz"), 'wt') as f:
+            for j in range(LINES):
+                f.write(f"{i}\t{j}\t{os.urandom(60).hex()}\n")
+    return os.path.join(d, "part-*.gz")
+
+
+def count(lines):
+    return sum(1 for _ in lines)
+
+
+def sequential(pattern):
+    from glob import glob
+    return sum(count(callable_file(f)()) for f in sorted(glob(pattern)))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as d:
+        pattern = make_shards(d)
+        size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+        runs = {"sequential": lambda: sequential(pattern)}
+        for backend in ('thread', 'process'):
+            for n in (1, 2, 4, 8):
+                f = multi_file(pattern, max_open=n, backend=backend)
+                runs[f"{backend} max_open={n}"] = lambda f=f: count(f())
+        for name, run in runs.items():
+            t = time.perf_counter()
+            n = run()
+            cost = time.perf_counter() - t
+            print(f"  {name:<24} {n / cost:>12.0f} lines/s  "
+                  f"{size / cost / 2**20:8.1f} MB/s(compressed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Stragglers in a parallel map: completion time of a chunked pipe where
+a few chunks are slow, plain vs cost-based splitting vs speculation.
+
+The stage sleeps(like a `subp` call or a remote lookup), so the result
+does not depend on the number of cores:
+
+- skew: the rows of a hot key cost 50x, cost splitting spread them.
+- hiccup: random chunks stall 1s(a slow host, a GC pause), speculation
+  re-launch them.
+
+Run: python benchmarks/bench_speculate.py
+"""
+import sys
+sys.path.insert(0, '.')
+import random
+import statistics
+import time
+
+import numpy as np
+
+from bramin import P, END
+from bramin.chunk import concat
+
+ROWS = 2000
+CHUNK = 100
+WORKERS = 4
+ROW_COST = 2e-5
+HOT = 50.0
+
+
+def costs(seed):
+    rnd = np.random.default_rng(seed)
+    c = np.ones(ROWS)
+    start = rnd.integers(0, ROWS - 100)
+    c[start:start + 100] = HOT  # a run of hot keys
+    return c
+
+
+def work(chunk):
+    time.sleep(ROW_COST * chunk.sum())
+    return chunk
+
+
+_rnd = random.Random(0)
+
+
+def work_hiccup(chunk):
+    if _rnd.random() < 0.05:
+        time.sleep(1.0)
+    time.sleep(ROW_COST * chunk.sum())
+    return chunk
+
+
+def run(stage, data, **kwargs):
+    pipe = P.chunked(rows=CHUNK, workers=WORKERS, **kwargs) | stage | concat
+    t = time.perf_counter()
+    data | pipe | END
+    return time.perf_counter() - t
+
+
+def report(name, times):
+    times = sorted(times)
+    print(f"{name:<28}median {statistics.median(times):6.3f}s  "
+          f"max {times[-1]:6.3f}s")
+
+
+def main():
+    repeats = 10
+    report("skew plain", [run(work, costs(s)) for s in range(repeats)])
+    report("skew cost split",
+           [run(work, costs(s), cost=lambda c: c) for s in range(repeats)])
+    report("hiccup plain", [run(work_hiccup, costs(s))
+                            for s in range(repeats)])
+    report("hiccup speculate=3", [run(work_hiccup, costs(s), speculate=3)
+                                  for s in range(repeats)])
+
+
+if __name__ == '__main__':
+    main()
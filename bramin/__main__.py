@@ -0,0 +1,26 @@
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bramin')
+    sub = parser.add_subparsers(dest='command', required=True)
+    w = sub.add_parser('worker', help="start a distributed pipe worker.")
+    w.add_argument('--host', default='127.0.0.1')
+    w.add_argument('--port', type=int, default=0)
+    w.add_argument('--authkey', default=None,
+                   help="default from env BRAMIN_AUTHKEY.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        from .distributed import serve, DEFAULT_AUTHKEY
+        authkey = args.authkey.encode() if args.authkey else DEFAULT_AUTHKEY
+
+        def on_ready(addr):
+            print(f"bramin worker listening on {addr[0]}:{addr[1]}",
+                  flush=True)
+        serve(args.host, args.port, authkey, on_ready)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
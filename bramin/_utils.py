@@ -45,7 +45,7 @@ class SpecialMethods(object):
 
             'left': ['add', 'sub', 'mul', 'matmul',
                      'truediv', 'floordiv', 'mod', 'divmod',
-                     'pow', 'lshifh', 'rshift',
+                     'pow', 'lshift', 'rshift',
                      'and', 'xor', 'or'],
 
             'other': ['neg', 'pos', 'abs', 'invert', 'index',
@@ -98,10 +98,12 @@ class SpecialMethods(object):
         """Get the corresponding function with same semantic to the special method"""
         if name in dir(operator):
             impl = getattr(operator, name)
+        elif name + '_' in dir(operator):  # and, or ...
+            impl = getattr(operator, name + '_')
         elif name in dir(builtins):
             impl = getattr(builtins, name)
         elif name in self['numeric/right']:
-            impl = reverse_args(self._get_impl(name.lstrip('r')))
+            impl = reverse_args(self._get_impl(name[1:]))
         else:
             impl = None
         return impl
@@ -297,6 +299,19 @@ class type_guard(object):
             return types.MethodType(self, instance)
 
 
+class hybridmethod(object):
+    """Method can be called from both class and instance,
+    the first argument is the class or the instance."""
+
+    def __init__(self, func: Callable):
+        wraps(func)(self)
+        self.func = func
+
+    def __get__(self, instance, cls):
+        bound = cls if instance is None else instance
+        return types.MethodType(self.func, bound)
+
+
 def get_callable_name(func: Callable) -> str:
     if hasattr(func, '__qualname__'):
         name = func.__qualname__
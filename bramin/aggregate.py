@@ -0,0 +1,424 @@
+"""Streaming hash aggregation(group by) with combinable aggregators.
+
+    "log.tsv" >> P | c(map, str.split) \\
+        | group_by(it[0], {'n': count(), 'bytes': total(lambda r: int(r[2]))}) \\
+        | dict | END
+
+Aggregators keep a partial state per group, states of the same group
+computed separately(in another worker, or before a spill) are merged,
+so the input can be aggregated chunk by chunk in parallel, and the
+group table can be spilled to disk when it grows too large.
+"""
+
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+)
+from collections import Counter
+from itertools import islice
+import tempfile
+import shutil
+import sys
+import os
+
+from .io import callable_file
+from .executor import check_backend, pmap
+from .pipe import placeholder
+
+
+class Agg(object):
+    """Combinable aggregator, the value of a record is `of(record)`
+    (the record itself if `of` is None).
+
+    Subclasses define the state: `init`, `add` a value into it, `merge`
+    two states and the `result` of it. `add`/`merge` may update the
+    state in place, and return the new state.
+
+    `inline` is the statement(s) of `add` inlined into the generated
+    loop of `group_by`, with the state `{s}` and the value `{v}`.
+    """
+
+    inline: Optional[str] = None
+
+    def __init__(self, of: Optional[Callable[[Any], Any]] = None):
+        self.of = of
+
+    def init(self) -> Any:
+        raise NotImplementedError
+
+    def add(self, state: Any, value: Any) -> Any:
+        raise NotImplementedError
+
+    def merge(self, a: Any, b: Any) -> Any:
+        raise NotImplementedError
+
+    def result(self, state: Any) -> Any:
+        return state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+class count(Agg):
+    """Number of records."""
+
+    inline = "{s} += 1"
+
+    def init(self):
+        return 0
+
+    def add(self, state, value):
+        return state + 1
+
+    def merge(self, a, b):
+        return a + b
+
+
+class total(Agg):
+    """Sum of the values."""
+
+    inline = "{s} += {v}"
+
+    def init(self):
+        return 0
+
+    def add(self, state, value):
+        return state + value
+
+    def merge(self, a, b):
+        return a + b
+
+
+class minimum(Agg):
+    inline = "if {s} is None or {v} < {s}: {s} = {v}"
+
+    def init(self):
+        return None
+
+    def add(self, state, value):
+        return value if (state is None or value < state) else state
+
+    def merge(self, a, b):
+        if a is None or b is None:
+            return b if a is None else a
+        return self.add(a, b)
+
+
+class maximum(Agg):
+    inline = "if {s} is None or {v} > {s}: {s} = {v}"
+
+    def init(self):
+        return None
+
+    def add(self, state, value):
+        return value if (state is None or value > state) else state
+
+    def merge(self, a, b):
+        if a is None or b is None:
+            return b if a is None else a
+        return self.add(a, b)
+
+
+class mean(Agg):
+    """Mean of the values, state is [sum, n]."""
+
+    inline = "{s}[0] += {v}; {s}[1] += 1"
+
+    def init(self):
+        return [0, 0]
+
+    def add(self, state, value):
+        state[0] += value
+        state[1] += 1
+        return state
+
+    def merge(self, a, b):
+        a[0] += b[0]
+        a[1] += b[1]
+        return a
+
+    def result(self, state):
+        return state[0] / state[1] if state[1] else None
+
+
+class distinct(Agg):
+    """Set of the values."""
+
+    inline = "{s}.add({v})"
+
+    def init(self):
+        return set()
+
+    def add(self, state, value):
+        state.add(value)
+        return state
+
+    def merge(self, a, b):
+        a |= b
+        return a
+
+
+class count_distinct(distinct):
+    """Number of distinct values."""
+
+    def result(self, state):
+        return len(state)
+
+
+Aggregations = Union[Agg, Dict[str, Agg], List[Agg], Tuple[Agg, ...]]
+
+# number of hash partitions of the spilled table
+N_PARTITIONS = 16
+
+
+def agg_list(aggregations: Aggregations) -> List[Agg]:
+    """The aggregators in `Aggregations`, their states are kept in a list
+    of the same order."""
+    if isinstance(aggregations, Agg):
+        aggs = [aggregations]
+    elif isinstance(aggregations, dict):
+        aggs = list(aggregations.values())
+    else:
+        aggs = list(aggregations)
+    if not aggs or not all(isinstance(a, Agg) for a in aggs):
+        raise TypeError(f"aggregations should be Agg objects, "
+                        f"got {repr(aggregations)}")
+    return aggs
+
+
+def agg_result(aggregations: Aggregations, aggs: List[Agg],
+               states: list) -> Any:
+    """The value, tuple or dict of the results, like `aggregations`."""
+    if isinstance(aggregations, Agg):
+        return aggs[0].result(states[0])
+    res = [a.result(s) for a, s in zip(aggs, states)]
+    if isinstance(aggregations, dict):
+        return dict(zip(aggregations, res))
+    return tuple(res)
+
+
+def _inline(agg: Agg) -> Optional[str]:
+    """The inline statement, if it's of the `add` in use(a subclass may
+    override `add` only)."""
+    mro = type(agg).__mro__
+    owner = next(c for c in mro if 'inline' in vars(c))
+    return agg.inline if owner is next(c for c in mro if 'add' in vars(c)) \
+        else None
+
+
+def _call_expr(func: Optional[Callable], ns: dict, lines: List[str],
+               name: str) -> str:
+    """Expression of func(_x) in generated code, placeholder inlined."""
+    if func is None:
+        return '_x'
+    elif isinstance(func, placeholder):
+        lines_, expr, ns_ = func._codegen('_x', f'_{name}_')
+        lines.extend(lines_)
+        ns.update(ns_)
+        return expr
+    ns[f'_{name}'] = func
+    return f'_{name}(_x)'
+
+
+def _state_size(st: Any) -> int:
+    size = sys.getsizeof(st)
+    if isinstance(st, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(s) for s in st)
+    return size
+
+
+class group_by(object):
+    """Stage group the records by `key(record)`, and aggregate each group
+    with the `aggregations`: an `Agg`, a list of them, or a dict of
+    name -> `Agg`. Yield (key, result) pairs, the result is the value,
+    a tuple or a dict of the aggregations accordingly.
+
+    The input is consumed in chunks of `chunksize` records. With
+    `workers`, the chunks are pre-aggregated by a pool of `backend`
+    'process' or 'thread', and the partial tables are merged.
+
+    When the estimated size of the group table exceed `memory_limit`
+    bytes, it's hash partitioned and spilled to the `tmpdir`, at the end
+    the partitions are aggregated one by one. The groups come in the
+    order of first seen if nothing spilled, else in no particular order.
+
+    >>> records = [('a', 1), ('b', 2), ('a', 3)]
+    >>> dict(group_by(lambda r: r[0], count())(records))
+    {'a': 2, 'b': 1}
+    >>> aggs = {'sum': total(lambda r: r[1]), 'max': maximum(lambda r: r[1])}
+    >>> list(group_by(lambda r: r[0], aggs)(records))
+    [('a', {'sum': 4, 'max': 3}), ('b', {'sum': 2, 'max': 2})]
+    """
+
+    def __init__(self, key: Callable[[Any], Any],
+                 aggregations: Aggregations,
+                 memory_limit: int = 256 << 20,
+                 workers: Optional[int] = None,
+                 backend: str = 'process',
+                 chunksize: int = 10_000,
+                 tmpdir: Optional[str] = None):
+        check_backend(backend)
+        self.key = key
+        self.aggregations = aggregations
+        self.aggs = agg_list(aggregations)
+        self.memory_limit = memory_limit
+        self.workers = workers
+        self.backend = backend
+        self.chunksize = chunksize
+        self.tmpdir = tmpdir
+        # counting only: the states are ints in a Counter
+        self._counting = len(self.aggs) == 1 and type(self.aggs[0]) is count
+        self._fn = None  # compiled lazily
+
+    def __call__(self, records: Iterable) -> Iterator[Tuple[Any, Any]]:
+        return self._group(iter(records))
+
+    def _chunks(self, records: Iterator) -> Iterator[list]:
+        while True:
+            chunk = list(islice(records, self.chunksize))
+            if not chunk:
+                break
+            yield chunk
+
+    def _new_table(self) -> dict:
+        return Counter() if self._counting else {}
+
+    def _aggregate(self, chunk: list, table: Optional[dict] = None) -> dict:
+        """Add the records into the table(a new one if None)."""
+        if table is None:
+            table = self._new_table()
+        if self._counting:
+            key = self.key
+            if isinstance(key, placeholder):  # skip the node's __call__
+                key = key._fn or key._compile()
+            table.update(map(key, chunk))  # counted in C
+            return table
+        fn = self._fn
+        if fn is None:
+            fn = self._fn = self._compile()
+        return fn(chunk, table)
+
+    def _compile(self) -> Callable:
+        """Generate the loop add a chunk into the table, like `FusedLoop`,
+        the aggregators' `inline` statements are used instead of calling
+        their `add`, the values used by several are computed once."""
+        ns, body = {}, []
+        key = _call_expr(self.key, ns, body, 'key')
+        body += [f"_k = {key}", "_st = _get(_k)", "if _st is None:",
+                 "    _st = _table[_k] = [" +
+                 ", ".join(f"_i{i}()" for i in range(len(self.aggs))) + "]"]
+        values = {}  # id(of) -> variable of the value
+        for i, a in enumerate(self.aggs):
+            ns[f'_i{i}'] = a.init
+            inline = _inline(a)
+            if inline is not None and '{v}' not in inline:
+                body.append(inline.format(s=f"_st[{i}]"))
+                continue
+            v = values.get(id(a.of))
+            if v is None:
+                v = values[id(a.of)] = f"_v{i}"
+                body.append(f"{v} = {_call_expr(a.of, ns, body, f'of{i}')}")
+            if inline is not None:
+                body.append(inline.format(s=f"_st[{i}]", v=v))
+            else:
+                ns[f'_add{i}'] = a.add
+                body.append(f"_st[{i}] = _add{i}(_st[{i}], {v})")
+        src = ["def _aggregate(_chunk, _table):", "    _get = _table.get",
+               "    for _x in _chunk:"] + [f"        {l}" for l in body] + \
+            ["    return _table"]
+        exec(compile("\n".join(src) + "\n", f"<{self!r}>", "exec"), ns)
+        return ns['_aggregate']
+
+    def _merge(self, table: dict, items: Iterable[Tuple[Any, Any]]):
+        """Merge the partial states into the table."""
+        get = table.get
+        if self._counting:
+            for k, n in items:
+                table[k] = get(k, 0) + n
+            return
+        merges = [a.merge for a in self.aggs]
+        for k, st in items:
+            old = get(k)
+            if old is None:
+                table[k] = st
+            else:
+                for i, m in enumerate(merges):
+                    old[i] = m(old[i], st[i])
+
+    def _result(self, st: Any) -> Any:
+        if self._counting:
+            return st
+        return agg_result(self.aggregations, self.aggs, st)
+
+    def _table_size(self, table: dict) -> int:
+        """Estimated from a sample of the groups."""
+        n = len(table)
+        if n == 0:
+            return 0
+        sample = list(islice(table.items(), 64))
+        per = sum(sys.getsizeof(k) + _state_size(st) + 100
+                  for k, st in sample) / len(sample)
+        return int(per * n)
+
+    def _group(self, records: Iterator) -> Iterator[Tuple[Any, Any]]:
+        chunks = self._chunks(records)
+        table = self._new_table()
+        if self.workers is None:
+            steps = (self._aggregate(chunk, table) for chunk in chunks)
+        else:
+            # merge the partial tables of the workers
+            steps = (self._merge(table, part.items())
+                     for part in pmap(self._aggregate, chunks, self.workers,
+                                      self.backend))
+        spill_dir, n_spills = None, 0
+        try:
+            for _ in steps:
+                if self._table_size(table) > self.memory_limit:
+                    if spill_dir is None:
+                        spill_dir = tempfile.mkdtemp(
+                            prefix="bramin-groupby-", dir=self.tmpdir)
+                    self._spill(table, spill_dir, n_spills)
+                    n_spills += 1
+            if spill_dir is None:
+                for k, st in table.items():
+                    yield k, self._result(st)
+                return
+            # merge the rest in memory with the spilled,
+            # one partition at a time
+            parts = self._partitions(table)
+            table.clear()
+            for p in range(N_PARTITIONS):
+                t = self._new_table()
+                self._merge(t, parts[p])
+                parts[p] = None
+                for i in range(n_spills):
+                    path = self._path(spill_dir, i, p)
+                    if os.path.exists(path):
+                        self._merge(t, callable_file(
+                            path, 'rb', file_type='pickle_batches')())
+                for k, st in t.items():
+                    yield k, self._result(st)
+        finally:
+            steps.close()
+            if spill_dir is not None:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def _partitions(table: dict) -> List[list]:
+        parts: List[list] = [[] for _ in range(N_PARTITIONS)]
+        for k, st in table.items():
+            parts[hash(k) % N_PARTITIONS].append((k, st))
+        return parts
+
+    @staticmethod
+    def _path(d: str, spill: int, part: int) -> str:
+        return os.path.join(d, f"spill{spill}-{part}.gz")
+
+    def _spill(self, table: dict, d: str, n: int):
+        for p, items in enumerate(self._partitions(table)):
+            if items:
+                callable_file(self._path(d, n, p), 'wb',
+                              file_type='pickle_batches')(items)
+        table.clear()
+
+    def __repr__(self) -> str:
+        return f"<group_by {self.aggregations!r}>"
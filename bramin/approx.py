@@ -0,0 +1,457 @@
+"""Approximate streaming operators with bounded memory.
+
+The sketches(`BloomFilter`, `HyperLogLog`, `Reservoir`, `CountMinSketch`,
+`TopK`) are mergeable: sketches of the same parameters built on parts of
+a stream(for example by parallel workers) can be merged into the sketch
+of the whole stream. Records are hashed by blake2b, so sketches built in
+different processes agree.
+
+    "ids.txt" >> P | dedup(approx=True, capacity=10**9) > "uniq.txt" | END
+    "ids.txt" >> P | count_distinct() | END
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from array import array
+from hashlib import blake2b
+from itertools import islice, count
+from collections import deque
+import random
+import math
+
+from .aggregate import Agg
+
+
+def _encode(x: Any) -> bytes:
+    if isinstance(x, bytes):
+        return x
+    elif isinstance(x, str):
+        return x.encode('utf-8', 'surrogatepass')
+    return repr(x).encode('utf-8')
+
+
+def hash64(x: Any) -> int:
+    """Stable 64 bits hash(not randomized like `hash`).
+    Objects other than str/bytes are hashed by their repr."""
+    return int.from_bytes(blake2b(_encode(x), digest_size=8).digest(),
+                          'little')
+
+
+def _hash_pair(x: Any) -> Tuple[int, int]:
+    d = blake2b(_encode(x), digest_size=16).digest()
+    # odd step, so the probes of double hashing never collapse
+    return int.from_bytes(d[:8], 'little'), \
+        int.from_bytes(d[8:], 'little') | 1
+
+
+def _check_same(a: Any, b: Any, attrs: Tuple[str, ...]):
+    if type(a) is not type(b) or \
+            any(getattr(a, n) != getattr(b, n) for n in attrs):
+        raise ValueError(f"can't merge {repr(a)} with {repr(b)}, "
+                         f"the parameters {attrs} should be the same.")
+
+
+class BloomFilter(object):
+    """Set membership with false positives at about `error_rate` when
+    holding `capacity` items, never false negatives.
+
+    >>> bf = BloomFilter(1000, 0.01)
+    >>> bf.add("a"), bf.add("a"), "b" in bf
+    (False, True, False)
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0 or not (0 < error_rate < 1):
+            raise ValueError("capacity should be positive and "
+                             "error_rate in (0, 1).")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.n_bits = max(8, int(-capacity * math.log(error_rate)
+                                 / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _indexes(self, x: Any) -> List[int]:
+        h1, h2 = _hash_pair(x)
+        m = self.n_bits
+        return [(h1 + i * h2) % m for i in range(self.n_hashes)]
+
+    def add(self, x: Any) -> bool:
+        """Add x, return True if it was(probably) present."""
+        bits, present = self.bits, True
+        for i in self._indexes(x):
+            byte, mask = i >> 3, 1 << (i & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+    def __contains__(self, x: Any) -> bool:
+        bits = self.bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(x))
+
+    def merge(self, other: "BloomFilter") -> "BloomFilter":
+        """Union, in place."""
+        _check_same(self, other, ('n_bits', 'n_hashes'))
+        n = len(self.bits)
+        union = int.from_bytes(self.bits, 'little') | \
+            int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(union.to_bytes(n, 'little'))
+        return self
+
+    def __repr__(self) -> str:
+        return (f"<BloomFilter bits={self.n_bits} "
+                f"hashes={self.n_hashes}>")
+
+
+class HyperLogLog(object):
+    """Distinct count estimation with 2 ** `p` one byte registers,
+    the standard error is about 1.04 / sqrt(2 ** p)(0.8% for p=14).
+
+    >>> hll = HyperLogLog(p=12)
+    >>> hll.update(range(10000))
+    >>> abs(hll.count() - 10000) < 300
+    True
+    """
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 18:
+            raise ValueError(f"p should be in [4, 18], got {p}")
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, x: Any):
+        h = hash64(x)
+        q = 64 - self.p
+        idx = h >> q
+        rank = q - (h & ((1 << q) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def update(self, xs: Iterable):
+        add = self.add
+        for x in xs:
+            add(x)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(
+            m, 0.7213 / (1 + 1.079 / m))
+        est = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:  # small range: linear counting
+            est = m * math.log(m / zeros)
+        return round(est)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Union, in place."""
+        _check_same(self, other, ('p',))
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def __repr__(self) -> str:
+        return f"<HyperLogLog p={self.p}>"
+
+
+class Reservoir(object):
+    """Uniform random sample of `k` items of a stream(reservoir sampling,
+    algorithm L, the items won't be sampled are skipped in bulk).
+
+    >>> r = Reservoir(3, seed=0)
+    >>> r.update(range(1000))
+    >>> len(r.items), r.n
+    (3, 1000)
+    """
+
+    def __init__(self, k: int, seed: Optional[int] = None):
+        if k <= 0:
+            raise ValueError(f"k should be positive, got {k}")
+        self.k = k
+        self.rnd = random.Random(seed)
+        self.items: List[Any] = []
+        self.n = 0  # items seen
+        # the threshold of the keys, and the items to skip before the next
+        # replacement, when the reservoir is full
+        self._w = 0.0
+        self._skip: Optional[int] = None
+
+    def _uniform(self) -> float:
+        return self.rnd.random() or 1e-300
+
+    def _next_skip(self, w: float):
+        self._w = w
+        self._skip = int(math.log(self._uniform()) / math.log1p(-w))
+
+    def update(self, xs: Iterable):
+        it, k, items = iter(xs), self.k, self.items
+        if self._skip is None:
+            for x in islice(it, k - len(items)):
+                items.append(x)
+            self.n = len(items)
+            if len(items) < k:
+                return
+            self._next_skip(math.exp(math.log(self._uniform()) / k))
+        while True:
+            skip = self._skip
+            counter = count()
+            deque(zip(islice(it, skip), counter), maxlen=0)
+            skipped = next(counter)
+            self.n += skipped
+            if skipped < skip:  # exhausted, skip the rest later
+                self._skip = skip - skipped
+                return
+            x = next(it, _MISSING)
+            if x is _MISSING:
+                self._skip = 0
+                return
+            self.n += 1
+            items[self.rnd.randrange(k)] = x
+            self._next_skip(
+                self._w * math.exp(math.log(self._uniform()) / k))
+
+    def add(self, x: Any):
+        self.update((x,))
+
+    def merge(self, other: "Reservoir") -> "Reservoir":
+        """Sample of the both streams, in place."""
+        _check_same(self, other, ('k',))
+        na, nb, k = self.n, other.n, self.k
+        # how many from each, as drawing k without replacement
+        # from the union of the streams
+        take_a, ra, rb = 0, na, nb
+        for _ in range(min(k, na + nb)):
+            if self.rnd.random() * (ra + rb) < ra:
+                take_a += 1
+                ra -= 1
+            else:
+                rb -= 1
+        take_b = min(k, na + nb) - take_a
+        self.items = self.rnd.sample(self.items, take_a) + \
+            self.rnd.sample(other.items, take_b)
+        self.rnd.shuffle(self.items)
+        self.n = na + nb
+        if self.n >= k:
+            # the threshold is the k-th smallest of n uniform keys
+            self._next_skip(self.rnd.betavariate(k, self.n - k + 1))
+        else:
+            self._skip = None
+        return self
+
+    def __repr__(self) -> str:
+        return f"<Reservoir k={self.k} n={self.n}>"
+
+
+_MISSING = object()
+
+
+class CountMinSketch(object):
+    """Frequency estimation in `depth` rows of `width` counters, the
+    estimate never under count, over count at most e/width * total
+    with probability 1 - exp(-depth).
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        if width <= 0 or depth <= 0:
+            raise ValueError("width and depth should be positive.")
+        self.width = width
+        self.depth = depth
+        self.table = [array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def _indexes(self, x: Any) -> List[int]:
+        h1, h2 = _hash_pair(x)
+        w = self.width
+        return [(h1 + i * h2) % w for i in range(self.depth)]
+
+    def add(self, x: Any, n: int = 1) -> int:
+        """Count x, return the new estimate of it."""
+        est = None
+        for row, i in zip(self.table, self._indexes(x)):
+            row[i] += n
+            est = row[i] if est is None else min(est, row[i])
+        self.total += n
+        return est
+
+    def estimate(self, x: Any) -> int:
+        return min(row[i] for row, i in zip(self.table, self._indexes(x)))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """Sum of the counts, in place."""
+        _check_same(self, other, ('width', 'depth'))
+        self.table = [array('Q', map(sum, zip(a, b)))
+                      for a, b in zip(self.table, other.table)]
+        self.total += other.total
+        return self
+
+    def __repr__(self) -> str:
+        return f"<CountMinSketch {self.depth}x{self.width}>"
+
+
+class TopK(object):
+    """The `k` most frequent items(heavy hitters), counted by a
+    `CountMinSketch`, at most 2k candidates are kept."""
+
+    def __init__(self, k: int, width: int = 2048, depth: int = 4):
+        self.k = k
+        self.cms = CountMinSketch(width, depth)
+        self.candidates = {}
+        self._threshold = 0
+
+    def add(self, x: Any):
+        est = self.cms.add(x)
+        cand = self.candidates
+        if x in cand or est > self._threshold:
+            cand[x] = est
+            if len(cand) > 2 * self.k:
+                self._trim()
+
+    def update(self, xs: Iterable):
+        add = self.add
+        for x in xs:
+            add(x)
+
+    def _trim(self):
+        top = self.items()
+        self.candidates = dict(top)
+        self._threshold = top[-1][1] if len(top) == self.k else 0
+
+    def items(self) -> List[Tuple[Any, int]]:
+        """[(item, estimated count)], the most frequent first."""
+        est = self.cms.estimate
+        ranked = sorted(((x, est(x)) for x in self.candidates),
+                        key=lambda p: p[1], reverse=True)
+        return ranked[:self.k]
+
+    def merge(self, other: "TopK") -> "TopK":
+        _check_same(self, other, ('k',))
+        self.cms.merge(other.cms)
+        for x in other.candidates:
+            self.candidates[x] = 0
+        self._trim()
+        return self
+
+    def __repr__(self) -> str:
+        return f"<TopK k={self.k} {self.cms!r}>"
+
+
+def _keyed(records: Iterable, key: Optional[Callable]) -> Iterable:
+    return records if key is None else map(key, records)
+
+
+class dedup(object):
+    """Stage drop the repeated records(by `key(record)` if given).
+
+    Exact by default, the seen keys are kept in a set. With `approx`, they
+    are kept in a `BloomFilter` of `capacity` and `error_rate`: memory is
+    bounded, but about `error_rate` of the unique records are dropped
+    (as false positives) once `capacity` records are seen.
+
+    >>> list(dedup(approx=True, capacity=100)([1, 2, 1, 3, 2]))
+    [1, 2, 3]
+    """
+
+    def __init__(self, key: Optional[Callable[[Any], Any]] = None,
+                 approx: bool = False, capacity: int = 10_000_000,
+                 error_rate: float = 0.001):
+        self.key = key
+        self.approx = approx
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+    def __call__(self, records: Iterable) -> Iterator:
+        return self._approx(records) if self.approx else \
+            self._exact(records)
+
+    def _exact(self, records: Iterable) -> Iterator:
+        seen, key = set(), self.key
+        add = seen.add
+        for rec in records:
+            k = rec if key is None else key(rec)
+            if k not in seen:
+                add(k)
+                yield rec
+
+    def _approx(self, records: Iterable) -> Iterator:
+        seen_add = BloomFilter(self.capacity, self.error_rate).add
+        key = self.key
+        for rec in records:
+            if not seen_add(rec if key is None else key(rec)):
+                yield rec
+
+    def __repr__(self) -> str:
+        return f"<dedup approx={self.approx}>"
+
+
+class count_distinct(object):
+    """Stage estimate the number of distinct records(or keys) by
+    `HyperLogLog` of precision `p`."""
+
+    def __init__(self, key: Optional[Callable[[Any], Any]] = None,
+                 p: int = 14):
+        self.key = key
+        self.p = p
+
+    def __call__(self, records: Iterable) -> int:
+        hll = HyperLogLog(self.p)
+        hll.update(_keyed(records, self.key))
+        return hll.count()
+
+
+class sample(object):
+    """Stage return a uniform random sample of `k` records.
+
+    >>> len(sample(5, seed=1)(range(100)))
+    5
+    """
+
+    def __init__(self, k: int, seed: Optional[int] = None):
+        self.k = k
+        self.seed = seed
+
+    def __call__(self, records: Iterable) -> List:
+        r = Reservoir(self.k, self.seed)
+        r.update(records)
+        return r.items
+
+
+class top_k(object):
+    """Stage return the `k` most frequent records(or keys) with their
+    estimated counts, see `TopK`.
+
+    >>> top_k(2)(list("abracadabra"))
+    [('a', 5), ('b', 2)]
+    """
+
+    def __init__(self, k: int, key: Optional[Callable[[Any], Any]] = None,
+                 width: int = 2048, depth: int = 4):
+        self.k = k
+        self.key = key
+        self.width = width
+        self.depth = depth
+
+    def __call__(self, records: Iterable) -> List[Tuple[Any, int]]:
+        t = TopK(self.k, self.width, self.depth)
+        t.update(_keyed(records, self.key))
+        return t.items()
+
+
+class approx_distinct(Agg):
+    """`group_by` aggregator: estimated distinct values by `HyperLogLog`,
+    a small `p` is enough when there are many groups."""
+
+    def __init__(self, of: Optional[Callable[[Any], Any]] = None,
+                 p: int = 10):
+        super().__init__(of)
+        self.p = p
+
+    def init(self):
+        return HyperLogLog(self.p)
+
+    def add(self, state, value):
+        state.add(value)
+        return state
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def result(self, state):
+        return state.count()
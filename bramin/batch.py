@@ -0,0 +1,147 @@
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+from itertools import islice, chain
+from threading import Thread, Event
+from queue import Queue, Empty, Full
+import time
+
+from ._utils import get_callable_name
+
+
+_END = object()
+
+
+class _Raised(object):
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class batch(object):
+    """Group the elements of a stream into lists.
+
+    A batch is emitted when it has `n` elements, or when `timeout` seconds
+    passed since its first element arrived.
+
+    >>> list(batch(2)(range(5)))
+    [[0, 1], [2, 3], [4]]
+    """
+
+    def __init__(self, n: int, timeout: Optional[float] = None):
+        if n <= 0:
+            raise ValueError(f"batch size should be positive, got {n}")
+        self.n = n
+        self.timeout = timeout
+
+    def __call__(self, iterable: Iterable) -> Iterator[List]:
+        if self.timeout is None:
+            return self._by_size(iter(iterable))
+        else:
+            return self._by_latency(iterable)
+
+    def _by_size(self, it: Iterator) -> Iterator[List]:
+        while True:
+            b = list(islice(it, self.n))
+            if not b:
+                break
+            yield b
+
+    def _by_latency(self, iterable: Iterable) -> Iterator[List]:
+        # pull upstream in another thread, so a slow upstream
+        # can not hold a partial batch longer than the timeout.
+        q = Queue(maxsize=self.n * 2)
+        stop = Event()
+
+        def _put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def _feed():
+            try:
+                for e in iterable:
+                    if not _put(e):
+                        return
+                _put(_END)
+            except BaseException as e:
+                _put(_Raised(e))
+
+        t = Thread(target=_feed, daemon=True)
+        t.start()
+        try:
+            done = False
+            while not done:
+                item = q.get()
+                if item is _END:
+                    break
+                if isinstance(item, _Raised):
+                    raise item.exc
+                b = [item]
+                deadline = time.monotonic() + self.timeout
+                while len(b) < self.n:
+                    remain = deadline - time.monotonic()
+                    try:
+                        item = q.get(timeout=remain) if remain > 0 \
+                            else q.get_nowait()
+                    except Empty:
+                        break
+                    if item is _END:
+                        done = True
+                        break
+                    if isinstance(item, _Raised):
+                        yield b
+                        raise item.exc
+                    b.append(item)
+                yield b
+        finally:
+            stop.set()
+
+    def __repr__(self) -> str:
+        return f"batch({self.n}, timeout={self.timeout})"
+
+
+def unbatch(batches: Iterable[Iterable]) -> Iterator:
+    """Flatten the batches back to a stream of elements.
+
+    >>> list(unbatch([[0, 1], [2]]))
+    [0, 1, 2]
+    """
+    return chain.from_iterable(batches)
+
+
+class batched(object):
+    """Wrap a function process a list of elements at once,
+    into a stage work on a stream of single elements.
+
+    `func` receive a list(at most `max_size` elements, waited at most
+    `max_latency` seconds) and should return a sequence of results
+    with same length, results are re-emitted one by one in order.
+
+    >>> scores = batched(lambda xs: [x * 10 for x in xs], max_size=2)
+    >>> list(scores(range(3)))
+    [0, 10, 20]
+    """
+
+    def __init__(self, func: Callable[[List], Sequence],
+                 max_size: int = 1024,
+                 max_latency: Optional[float] = None):
+        self.func = func
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self._batch = batch(max_size, max_latency)
+
+    def __call__(self, iterable: Iterable) -> Iterator:
+        func = self.func
+        for b in self._batch(iterable):
+            res = func(b)
+            if len(res) != len(b):
+                raise ValueError(
+                    f"{repr(self)} got {len(res)} results "
+                    f"for a batch of {len(b)} elements.")
+            yield from res
+
+    def __repr__(self) -> str:
+        return (f"<batched {get_callable_name(self.func)} "
+                f"max_size={self.max_size} max_latency={self.max_latency}>")
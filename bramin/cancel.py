@@ -0,0 +1,176 @@
+"""Deadlines and cancellation of pipe execution.
+
+A `CancelToken` is checked between stages and between elements of the
+streams flow through the pipe. Resources can not be stopped by checks
+(child processes, worker threads) register a callback with `on_cancel`,
+it's called once the token is cancelled, or it's deadline passed.
+
+While a pipe is running with a token, the token is also available to
+the stages through `current_token()`.
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+from contextvars import ContextVar
+from contextlib import contextmanager
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """The execution is cancelled."""
+
+
+class DeadlineExceeded(Cancelled, TimeoutError):
+    """The deadline of the execution passed."""
+
+
+_current: ContextVar[Optional["CancelToken"]] = ContextVar(
+    'bramin_cancel_token', default=None)
+
+
+def current_token() -> Optional["CancelToken"]:
+    """Token of the running pipe in this context, None if there is not."""
+    return _current.get()
+
+
+@contextmanager
+def scope(token: Optional["CancelToken"]):
+    """Make the token current in the block."""
+    ctx = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(ctx)
+
+
+class CancelToken(object):
+    """Cancel flag with an optional deadline(`timeout` seconds from now).
+
+    A token with a `parent` is cancelled with it, and it's deadline
+    is not later than the parent's.
+
+    >>> token = CancelToken()
+    >>> g = token.guard(range(10))
+    >>> next(g)
+    0
+    >>> token.cancel()
+    >>> next(g)
+    Traceback (most recent call last):
+    ...
+    bramin.cancel.Cancelled: cancelled
+    """
+
+    def __init__(self, timeout: Optional[float] = None,
+                 parent: Optional["CancelToken"] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._reason: Optional[Cancelled] = None
+        self._timer: Optional[threading.Timer] = None
+        self._unlink = None
+        self.deadline = None if timeout is None \
+            else time.monotonic() + timeout
+        self.parent = parent
+        if parent is not None:
+            if parent.deadline is not None and \
+                    (self.deadline is None or parent.deadline < self.deadline):
+                self.deadline = parent.deadline
+            self._unlink = parent.on_cancel(
+                lambda: self.cancel(parent._reason))
+        if self.deadline is not None and not self.cancelled:
+            self._timer = threading.Timer(
+                max(self.remaining(), 0), self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleep until cancelled or `timeout`, return if it's cancelled."""
+        remain = self.remaining()
+        if remain is not None and (timeout is None or remain < timeout):
+            timeout = max(remain, 0)
+        self._event.wait(timeout)
+        return self.cancelled or (
+            remain is not None and time.monotonic() >= self.deadline)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def _expire(self):
+        self.cancel(DeadlineExceeded("deadline exceeded"))
+
+    def cancel(self, reason: Optional[Cancelled] = None):
+        """Cancel it, run the registered callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._reason = reason or Cancelled("cancelled")
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        if self._timer is not None:
+            self._timer.cancel()
+        for cb in callbacks:
+            cb()
+
+    def check(self):
+        """Raise `Cancelled`(or `DeadlineExceeded`) if cancelled."""
+        if not self._event.is_set() and self.deadline is not None \
+                and time.monotonic() >= self.deadline:
+            self._expire()
+        if self._event.is_set():
+            raise self._reason
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Register a callback(called at once if already cancelled),
+        return a function to unregister it."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def release(self):
+        """The guarded execution is over, stop the timer and
+        detach from the parent. Do not cancel it."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._unlink is not None:
+            self._unlink()
+        with self._lock:
+            self._callbacks = []
+
+    def guard(self, iterable: Iterable, release: bool = False) -> Iterator:
+        """Check the token before each element,
+        `release` the token when the iteration is over."""
+        try:
+            self.check()
+            for item in iterable:
+                self.check()
+                yield item
+        finally:
+            if release:
+                self.release()
+            close = getattr(iterable, 'close', None)
+            if close is not None:  # free the upstream's resources now
+                close()
+
+    def __repr__(self) -> str:
+        state = 'cancelled' if self.cancelled else 'active'
+        remain = self.remaining()
+        if remain is not None:
+            state += f", {max(remain, 0):.3f}s left"
+        return f"<CancelToken {state}>"
@@ -0,0 +1,304 @@
+"""Chunked execution for big pandas/numpy inputs.
+
+The input is split by rows, the stages before `concat` run chunk by
+chunk(optionally in parallel), so the intermediates of each stage are
+bounded by the chunk size instead of the whole frame. Only row-wise
+stages(filter rows, map columns ...) give the same result as running
+on the whole input.
+
+    df | P.chunked(rows=10**6) | f | g | concat | END
+"""
+
+from typing import Any, Callable, Iterable, Iterator, Optional
+from collections.abc import Iterator as IteratorABC
+from itertools import chain
+import sys
+
+from .pipe import Pipe, FuncList
+from .io import FileType, callable_file
+from .executor import check_backend, pool_backend, pmap
+from .cancel import CancelToken
+from . import shm
+
+
+def concat(chunks: Iterable) -> Any:
+    """Join the per-chunk results back: DataFrame/Series and ndarray
+    are concatenated, lists and iterators are flattened, other results
+    (for example a count of each chunk) are collected into a list.
+    As a stage of `ChunkedPipe`, it marks the end of the chunked part.
+
+    >>> concat([[1, 2], [3]])
+    [1, 2, 3]
+    >>> concat([2, 1])
+    [2, 1]
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return []
+    first = chunks[0]
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(first, (pd.DataFrame, pd.Series)):
+        return pd.concat(chunks)
+    elif np is not None and isinstance(first, np.ndarray):
+        return np.concatenate(chunks)
+    elif isinstance(first, (list, tuple, IteratorABC)):
+        return list(chain.from_iterable(chunks))
+    return chunks
+
+
+def unchunk(chunks: Iterable) -> Iterator:
+    """Like `concat` but keep the chunk results a lazy stream,
+    for the stages consume chunks one by one(for example `write_chunks`).
+    """
+    return iter(chunks)
+
+
+def split_rows(obj: Any, rows: int,
+               cost: Optional[Callable[[Any], Any]] = None) -> Iterator:
+    """Split DataFrame/Series/ndarray into views of `rows` rows,
+    other objects are taken as an iterable of chunks already
+    (for example the output of `read_chunks`).
+
+    With `cost`, a function give the (estimated) cost of each row of
+    the DataFrame/Series/ndarray, the same number of chunks are cut by
+    cost instead of rows, so heavy rows(skewed keys ...) are spread
+    into smaller chunks instead of making a straggler. A chunk has at
+    most 4 * `rows` rows.
+
+    >>> import numpy as np
+    >>> [len(c) for c in split_rows(np.arange(8), 4)]
+    [4, 4]
+    >>> [len(c) for c in split_rows(np.arange(8), 4, cost=lambda a: a)]
+    [6, 2]
+    """
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(obj, (pd.DataFrame, pd.Series)):
+        if len(obj) == 0:
+            yield obj
+        for i, j in _bounds(obj, rows, cost):
+            yield obj.iloc[i:j]
+    elif np is not None and isinstance(obj, np.ndarray):
+        if len(obj) == 0:
+            yield obj
+        for i, j in _bounds(obj, rows, cost):
+            yield obj[i:j]
+    else:
+        yield from obj
+
+
+def _bounds(obj: Any, rows: int,
+            cost: Optional[Callable[[Any], Any]]) -> Iterator:
+    n = len(obj)
+    if cost is None:
+        for i in range(0, n, rows):
+            yield i, min(i + rows, n)
+        return
+    import numpy as np
+    cum = np.cumsum(np.asarray(cost(obj), dtype='f8'))
+    if len(cum) != n:
+        raise ValueError(f"cost gave {len(cum)} values for {n} rows")
+    n_chunks = -(-n // rows)
+    # cut at the quantiles of the total cost
+    quantiles = cum[-1] / n_chunks * np.arange(1, n_chunks) if n else []
+    cuts = np.unique(np.searchsorted(cum, quantiles, 'left') + 1).tolist()
+    i = 0
+    for j in cuts + [n]:
+        while i < min(j, n):
+            k = min(j, i + 4 * rows, n)
+            yield i, k
+            i = k
+
+
+class ChunkedPipe(Pipe):
+    """Pipe run the stages before the first `concat` on each chunk
+    of the input, then the rest on the concatenated result.
+    With `unchunk` instead, the rest receive an iterator of the chunk
+    results. Without both, the result is that iterator.
+
+    Chunks are processed one by one, or by a pool of `workers` with
+    `backend` 'thread', 'process'(ndarrays and numeric columns are moved
+    through shared memory) or 'interpreters'(see `bramin.executor`).
+    At most 2 * workers chunks are in flight. With `ordered=False` the
+    chunk results come in the order they finish.
+
+    Against stragglers, `cost` cut the chunks by the cost of rows(see
+    `split_rows`), and with `speculate`, chunks running longer than
+    `speculate` times the median are launched again on an idle worker
+    (see `bramin.executor.pmap`).
+
+    >>> import numpy as np
+    >>> from bramin import P, it, END
+    >>> np.arange(10) | P.chunked(rows=4) | it * 2 | concat | sum | END
+    np.int64(90)
+    """
+
+    def __init__(self, invoke_chain: Optional[FuncList] = None,
+                 _input: Any = None,
+                 rows: int = 100_000,
+                 workers: Optional[int] = None,
+                 backend: str = 'thread',
+                 ordered: bool = True,
+                 cost: Optional[Callable[[Any], Any]] = None,
+                 speculate: Optional[float] = None):
+        super().__init__(invoke_chain, _input)
+        if rows <= 0:
+            raise ValueError(f"rows should be positive, got {rows}")
+        if speculate is not None and speculate < 1:
+            raise ValueError(f"speculate should be >= 1, got {speculate}")
+        check_backend(backend)
+        self.rows = rows
+        self.workers = workers
+        self.backend = backend
+        self.ordered = ordered
+        self.cost = cost
+        self.speculate = speculate
+
+    def _new(self, invoke_chain: FuncList, _input: Any) -> "ChunkedPipe":
+        return type(self)(invoke_chain, _input, self.rows,
+                          self.workers, self.backend, self.ordered,
+                          self.cost, self.speculate)
+
+    def _run(self, _input: Any, token: Optional[CancelToken]) -> Any:
+        # compare with identity, placeholder nodes reloaded __eq__
+        idx = next((i for i, f in enumerate(self._chain)
+                    if f is concat or f is unchunk), None)
+        head = self._chain if idx is None else self._chain[:idx]
+        results = split_rows(_input, self.rows, self.cost)
+        if token is not None:
+            results = token.guard(results)
+        if head:
+            results = self._map(Pipe(head), results)
+        if idx is None:
+            return results
+        res = self._chain[idx](results)
+        for func in self._chain[idx+1:]:
+            if token is not None:
+                token.check()
+            res = self._process(func, res, _input)
+        return res
+
+    def _map(self, stage: Pipe, chunks: Iterator) -> Iterator:
+        if self.workers is None:
+            return map(stage, chunks)
+        backend = pool_backend(self.backend, stage)
+        shm_min_bytes = shm.MIN_BYTES if backend == 'process' else None
+        return pmap(stage, chunks, self.workers, backend,
+                    ordered=self.ordered, shm_min_bytes=shm_min_bytes,
+                    speculate=self.speculate)
+
+    def __repr__(self) -> str:
+        return super().__repr__().replace(
+            "[P:", f"[P.chunked(rows={self.rows}):", 1)
+
+
+def _open_csv_chunks(fname: str, mode: str = 'r', rows: int = 100_000,
+                     **kwargs):
+    if 'r' in mode:
+        import pandas as pd
+        return pd.read_csv(fname, chunksize=rows, **kwargs)
+    return open(fname, mode, newline='')
+
+
+def _write_csv_chunks(fh, frames: Iterable):
+    for df in frames:
+        df.to_csv(fh, index=False, header=(fh.tell() == 0))
+
+
+csv_chunks = FileType(
+    "csv_chunks",
+    lambda fname: False,  # only selected by name
+    _open_csv_chunks,
+    lambda fh: fh,
+    _write_csv_chunks
+)
+
+
+class _ParquetChunks(object):
+    """Read a parquet file as DataFrames of at most `rows` rows."""
+
+    def __init__(self, fname: str, rows: int, **kwargs):
+        import pyarrow.parquet as pq
+        self.file = pq.ParquetFile(fname, **kwargs)
+        self.rows = rows
+
+    def __iter__(self) -> Iterator:
+        for b in self.file.iter_batches(batch_size=self.rows):
+            yield b.to_pandas()
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink(object):
+    """Write DataFrames into one parquet file, schema from the first."""
+
+    def __init__(self, fname: str, **kwargs):
+        self.fname = fname
+        self.kwargs = kwargs
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(
+                self.fname, table.schema, **self.kwargs)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _write_parquet_chunks(fh: _ParquetSink, frames: Iterable):
+    for df in frames:
+        fh.write(df)
+
+
+def _open_parquet_chunks(fname: str, mode: str = 'r', rows: int = 100_000,
+                         **kwargs):
+    if 'r' in mode:
+        return _ParquetChunks(fname, rows, **kwargs)
+    return _ParquetSink(fname, **kwargs)
+
+
+parquet_chunks = FileType(
+    "parquet_chunks",
+    lambda fname: False,
+    _open_parquet_chunks,
+    iter,
+    _write_parquet_chunks
+)
+
+
+callable_file.register(csv_chunks)
+callable_file.register(parquet_chunks)
+
+
+def _chunks_type(fname: str) -> str:
+    if fname.endswith(('.parquet', '.pq')):
+        return 'parquet_chunks'
+    return 'csv_chunks'
+
+
+def read_chunks(fname: str, rows: int = 100_000, **kwargs) -> Iterator:
+    """Stream a CSV or Parquet(needs pyarrow) file as DataFrames
+    of at most `rows` rows, extra kwargs are passed to the reader.
+
+        read_chunks("big.csv", rows=10**6) | P.chunked() | f | concat | END
+    """
+    f = callable_file(fname, 'r', file_type=_chunks_type(fname),
+                      rows=rows, **kwargs)
+    return f()
+
+
+def write_chunks(fname: str, **kwargs) -> callable_file:
+    """Stage write a stream of DataFrames into one CSV or Parquet file,
+    return the filename.
+
+        df | P.chunked() | f | unchunk | write_chunks("out.csv") | END
+    """
+    return callable_file(fname, 'w', file_type=_chunks_type(fname), **kwargs)
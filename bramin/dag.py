@@ -0,0 +1,378 @@
+"""DAG of pipes: named nodes with many consumers, each computed once.
+
+    g = DAG()
+    g.node('rows', "data.tsv" >> P | c(map, str.split))
+    g.node('stats', P | group_by(it[0], count()) | dict, 'rows')
+    g.node('export', P | c(filter, ok) | c(map, '\\t'.join) > "ok.tsv", 'rows')
+    res = g.run(stream=True)  # 'rows' is read once, for both
+    res['stats']
+
+A node is a callable(pipes, stages ...) called with the results of it's
+input nodes, a node without inputs is a source: a pipe with input(run
+with it), a callable(called without arguments), a filename(read by
+`callable_file`) or a value. The inputs should be added before, so the
+graph can't have a cycle.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Union
+from collections.abc import Iterator as IteratorABC
+from concurrent.futures import (
+    ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+)
+import threading
+import queue
+import time
+
+from .pipe import Pipe
+from .io import callable_file
+from .cancel import DeadlineExceeded
+from .executor import put_until
+from .pipeline import _get_until, _Stopped
+
+
+class DAG(object):
+    """Graph of named nodes, see the module doc.
+
+    >>> g = DAG()
+    >>> g = g.node('xs', range(5)).node('evens', lambda xs: xs[::2], 'xs')
+    >>> g = g.node('total', sum, 'xs')
+    >>> g = g.node('odds', lambda e, t: t - sum(e), 'evens', 'total')
+    >>> g.run()
+    {'odds': 4}
+    >>> g.run(['evens', 'total'])
+    {'evens': range(0, 5, 2), 'total': 10}
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Any] = {}
+        self.inputs: Dict[str, tuple] = {}
+
+    def node(self, name: str, func: Any, *inputs: str) -> "DAG":
+        """Add a node compute `func(*results of inputs)`."""
+        if name in self.nodes:
+            raise ValueError(f"node {repr(name)} already exists.")
+        for i in inputs:
+            if i not in self.nodes:
+                raise KeyError(
+                    f"input {repr(i)} of node {repr(name)} not found, "
+                    "the inputs should be added before.")
+        if inputs and not callable(func):
+            raise TypeError(f"node {repr(name)} with inputs is not callable.")
+        self.nodes[name] = func
+        self.inputs[name] = inputs
+        return self
+
+    def sinks(self) -> List[str]:
+        """Nodes without consumers."""
+        used = {i for ins in self.inputs.values() for i in ins}
+        return [n for n in self.nodes if n not in used]
+
+    def _plan(self, outputs: Iterable[str]) -> tuple:
+        """The nodes needed by `outputs`(in the order added, which is a
+        topological order), and their consumers among them."""
+        needed, todo = set(), list(outputs)
+        while todo:
+            n = todo.pop()
+            if n not in self.nodes:
+                raise KeyError(f"node {repr(n)} not found.")
+            if n not in needed:
+                needed.add(n)
+                todo.extend(self.inputs[n])
+        order = [n for n in self.nodes if n in needed]
+        consumers = {n: [] for n in order}
+        for n in order:
+            for i in self.inputs[n]:
+                consumers[i].append(n)
+        return order, consumers
+
+    def _call(self, name: str, args: list) -> Any:
+        func = self.nodes[name]
+        if self.inputs[name]:
+            return func(*args)
+        if isinstance(func, Pipe):
+            return func(func._input)
+        elif isinstance(func, str):
+            return callable_file(func)()
+        elif callable(func):
+            return func()
+        return func
+
+    def run(self, outputs: Union[None, str, Iterable[str]] = None,
+            workers: Optional[int] = None, stream: bool = False,
+            maxsize: int = 16, chunksize: int = 64,
+            timeout: Optional[float] = None) -> Any:
+        """Compute the `outputs` nodes(the sinks by default) and the nodes
+        they need, each once. Return a dict of name -> result, or the
+        result if `outputs` is a name.
+
+        The nodes run in threads. By default, a node is started by a pool
+        of `workers` once it's inputs are ready, and an iterator result
+        consumed by several nodes is collected into a list. Results are
+        dropped once all their consumers finished.
+
+        With `stream`, all nodes start at once, iterator results are
+        passed in chunks of `chunksize` through bounded queues(`maxsize`
+        chunks) to each of it's consumers, so big streams are read once
+        and never held in the memory, the slowest consumer sets the pace.
+        Iterator results of the outputs are collected into lists. An
+        iterator result with one consumer is passed to it as is, read
+        lazily in the consumer's thread.
+
+        Raise `DeadlineExceeded` if not finished in `timeout` seconds, the
+        nodes still running are stopped at their next read or write of a
+        stream, or left running in background threads.
+        """
+        single = isinstance(outputs, str)
+        if outputs is None:
+            outputs = self.sinks()
+        elif single:
+            outputs = [outputs]
+        outputs = list(outputs)
+        order, consumers = self._plan(outputs)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if stream:
+            res = self._run_stream(order, consumers, outputs,
+                                   maxsize, chunksize, deadline)
+        else:
+            res = self._run_batch(order, consumers, outputs, workers,
+                                  deadline)
+        return res[outputs[0]] if single else res
+
+    def _run_batch(self, order: List[str], consumers: Dict[str, list],
+                   outputs: List[str], workers: Optional[int],
+                   deadline: Optional[float]) -> dict:
+        results = {}
+        waiting = {n: len(self.inputs[n]) for n in order}
+        users = {n: len(consumers[n]) for n in order}
+        ready = [n for n in order if waiting[n] == 0]
+        running: Dict[Future, str] = {}
+        pool = ThreadPoolExecutor(workers)
+        try:
+            while ready or running:
+                for n in ready:
+                    args = [results[i] for i in self.inputs[n]]
+                    running[pool.submit(self._call, n, args)] = n
+                ready = []
+                done, _ = wait(running, _left(deadline), FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("deadline exceeded")
+                for fut in done:
+                    n = running.pop(fut)
+                    res = fut.result()
+                    if isinstance(res, IteratorABC) and \
+                            len(consumers[n]) + (n in outputs) > 1:
+                        res = list(res)  # shared
+                    results[n] = res
+                    for c in consumers[n]:
+                        waiting[c] -= 1
+                        if waiting[c] == 0:
+                            ready.append(c)
+                    for i in self.inputs[n]:
+                        users[i] -= 1
+                        if users[i] == 0 and i not in outputs:
+                            del results[i]
+        finally:
+            # do not wait the nodes still running after a failure
+            pool.shutdown(wait=not running, cancel_futures=True)
+        return {n: results[n] for n in outputs}
+
+    def _run_stream(self, order: List[str], consumers: Dict[str, list],
+                    outputs: List[str], maxsize: int, chunksize: int,
+                    deadline: Optional[float]) -> dict:
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        shared = {n: Future() for n in order}  # what consumers receive
+        results = {}
+        threads = []
+        for n in order:
+            t = threading.Thread(
+                target=self._stream_node,
+                args=(n, len(consumers[n]), n in outputs, shared, results,
+                      stop, errors, maxsize, chunksize),
+                daemon=True)
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join(_left(deadline))
+            if t.is_alive():
+                stop.set()
+                raise DeadlineExceeded("deadline exceeded")
+        if errors:
+            raise errors[0]
+        return {n: results[n] for n in outputs}
+
+    def _stream_node(self, name: str, n_consumers: int, is_output: bool,
+                     shared: Dict[str, Future], results: dict,
+                     stop: threading.Event, errors: list,
+                     maxsize: int, chunksize: int):
+        fut = shared[name]
+        owned = []  # the input streams, closed when done with them
+        try:
+            args = []
+            for i in self.inputs[name]:
+                val = shared[i].result()
+                if isinstance(val, _Tee):
+                    val = val.reader()
+                if isinstance(val, (_Reader, _Owning)):
+                    owned.append(val)
+                args.append(val)
+            res = self._call(name, args)
+            if not isinstance(res, IteratorABC):
+                fut.set_result(res)
+                results[name] = res
+            elif n_consumers == 1 and not is_output:
+                # read lazily by the consumer, it may read the inputs too
+                res, owned = _Owning(res, owned), []
+                fut.set_result(res)
+            elif n_consumers == 0:
+                results[name] = res = list(res)
+                fut.set_result(res)
+            else:
+                tee = _Tee(n_consumers, maxsize, chunksize, stop)
+                fut.set_result(tee)
+                collected = tee.pump(res, collect=is_output)
+                if is_output:
+                    results[name] = collected
+        except BaseException as e:
+            if not isinstance(e, _Stopped):  # stopped by another error
+                errors.append(e)
+            stop.set()
+            if not fut.done():
+                fut.set_exception(e)
+        finally:
+            for o in owned:
+                o.close()  # detach, if not read to the end
+
+    def __repr__(self) -> str:
+        edges = ", ".join(
+            f"{n} <- {', '.join(ins)}" if ins else n
+            for n, ins in self.inputs.items())
+        return f"<DAG {edges}>"
+
+
+class _Either(object):
+    """Set if any of the events is set."""
+
+    def __init__(self, *events):
+        self.events = events
+
+    def is_set(self) -> bool:
+        return any(e.is_set() for e in self.events)
+
+
+def _left(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+_END = object()
+
+
+class _Tee(object):
+    """Copy an iterator to `n` readers, through bounded queues."""
+
+    def __init__(self, n: int, maxsize: int, chunksize: int,
+                 stop: threading.Event):
+        self.queues = [queue.Queue(maxsize) for _ in range(n)]
+        self.detached = [threading.Event() for _ in range(n)]
+        self.chunksize = chunksize
+        self.stop = stop
+        self.lock = threading.Lock()
+        self.n_readers = 0
+
+    def reader(self) -> "_Reader":
+        with self.lock:
+            idx = self.n_readers
+            self.n_readers += 1
+        return _Reader(self, idx)
+
+    def _put(self, msg: tuple):
+        for q, detached in zip(self.queues, self.detached):
+            if not detached.is_set():
+                put_until(q, msg, _Either(detached, self.stop))
+        if self.stop.is_set():
+            raise _Stopped()
+
+    def pump(self, items: Iterable, collect: bool = False) -> Optional[list]:
+        """Send all `items` to the readers, return them if `collect`."""
+        collected = [] if collect else None
+        buf = []
+        try:
+            for x in items:
+                buf.append(x)
+                if len(buf) >= self.chunksize:
+                    self._put(('items', buf))
+                    if collect:
+                        collected.extend(buf)
+                    buf = []
+            if buf:
+                self._put(('items', buf))
+                if collect:
+                    collected.extend(buf)
+            self._put(('end', None))
+        except _Stopped:
+            raise
+        except BaseException as e:
+            self._put(('error', e))
+            raise
+        return collected
+
+
+class _Reader(object):
+    """Iterator of a reader of `_Tee`, detached once closed or
+    exhausted, even if it's never read."""
+
+    def __init__(self, tee: _Tee, idx: int):
+        self.tee = tee
+        self.idx = idx
+        self.buf = iter(())
+        self.closed = False
+
+    def __iter__(self) -> "_Reader":
+        return self
+
+    def __next__(self) -> Any:
+        x = next(self.buf, _END)
+        while x is _END:
+            if self.closed:
+                raise StopIteration
+            try:
+                kind, val = _get_until(self.tee.queues[self.idx],
+                                       self.tee.stop)
+            except BaseException:
+                self.close()
+                raise
+            if kind == 'items':
+                self.buf = iter(val)
+            else:
+                self.close()
+                if kind == 'end':
+                    raise StopIteration
+                raise val
+            x = next(self.buf, _END)
+        return x
+
+    def close(self):
+        self.closed = True
+        self.tee.detached[self.idx].set()
+
+
+class _Owning(object):
+    """Iterator result of a node passed lazily to it's consumer, with the
+    input streams it may still read, they are closed together."""
+
+    def __init__(self, it: IteratorABC, owned: list):
+        self.it = it
+        self.owned = owned
+
+    def __iter__(self) -> "_Owning":
+        return self
+
+    def __next__(self) -> Any:
+        return next(self.it)
+
+    def close(self):
+        close = getattr(self.it, 'close', None)
+        if close is not None:
+            close()
+        for o in self.owned:
+            o.close()
@@ -0,0 +1,302 @@
+"""Run a pipe on chunks of input across worker processes(or machines).
+
+Workers are started with the `bramin worker` command, the coordinator
+connects to them with `multiprocessing.connection`(HMAC authenticated),
+sends the serialized pipe and chunks of the input, and collects the
+results in order. Chunks of a dead worker are retried on the others.
+
+WARNING: a worker runs whatever it receives, only expose it to trusted
+networks, and use a non-default authkey.
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from multiprocessing.connection import Listener, Client
+from itertools import islice
+from collections import deque
+import threading
+import subprocess
+import hashlib
+import pickle
+import os
+import sys
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+
+DEFAULT_AUTHKEY = os.environ.get('BRAMIN_AUTHKEY', 'bramin').encode()
+
+Address = Tuple[str, int]
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize stages, use cloudpickle(if installed) for lambdas."""
+    if cloudpickle is not None:
+        return cloudpickle.dumps(obj)
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+class RemoteError(Exception):
+    """Exception raised in worker could not be sent back."""
+
+
+def _safe_exc(exc: BaseException) -> BaseException:
+    try:
+        pickle.dumps(exc)
+        return exc
+    except Exception:
+        return RemoteError(f"{type(exc).__name__}: {exc}")
+
+
+def _handle(conn, funcs: dict, stop: threading.Event):
+    try:
+        while not stop.is_set():
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = msg[0]
+            if kind == 'task':
+                _, tid, payload, chunk = msg
+                key = hashlib.sha1(payload).digest()
+                func = funcs.get(key)
+                try:
+                    if func is None:
+                        func = funcs[key] = pickle.loads(payload)
+                    res = func(chunk)
+                    if isinstance(res, Iterator):
+                        res = list(res)
+                    conn.send(('ok', tid, res))
+                except Exception as e:
+                    conn.send(('error', tid, _safe_exc(e)))
+            elif kind == 'ping':
+                conn.send(('pong',))
+            elif kind == 'shutdown':
+                stop.set()
+                break
+    finally:
+        conn.close()
+
+
+def serve(host: str = '127.0.0.1', port: int = 0,
+          authkey: bytes = DEFAULT_AUTHKEY,
+          on_ready: Optional[Callable[[Address], None]] = None):
+    """Worker main loop, serve each connection in a thread."""
+    stop = threading.Event()
+    funcs = {}
+
+    def accept_loop(listener):
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except Exception:  # failed authentication, bad handshake ...
+                continue
+            threading.Thread(target=_handle, args=(conn, funcs, stop),
+                             daemon=True).start()
+
+    with Listener((host, port), authkey=authkey) as listener:
+        if on_ready is not None:
+            on_ready(listener.address)
+        threading.Thread(target=accept_loop, args=(listener,),
+                         daemon=True).start()
+        stop.wait()
+
+
+def spawn_local_workers(n: int, authkey: bytes = DEFAULT_AUTHKEY,
+                        env: Optional[dict] = None
+                        ) -> Tuple[List[subprocess.Popen], List[Address]]:
+    """Start n `bramin worker` processes on localhost,
+    return the processes and their addresses."""
+    procs, addrs = [], []
+    env = dict(os.environ, **(env or {}))
+    env['BRAMIN_AUTHKEY'] = authkey.decode()
+    for _ in range(n):
+        p = subprocess.Popen(
+            [sys.executable, '-m', 'bramin', 'worker', '--port', '0'],
+            stdout=subprocess.PIPE, env=env, text=True)
+        line = p.stdout.readline()  # "listening on host:port"
+        host, port = line.split()[-1].rsplit(':', 1)
+        procs.append(p)
+        addrs.append((host, int(port)))
+    return procs, addrs
+
+
+class _Scheduler(object):
+    """Hand out chunks to worker threads, collect results."""
+
+    def __init__(self, iterable: Iterable, chunksize: int,
+                 max_pending: int, max_retries: int):
+        self.source = iter(iterable)
+        self.chunksize = chunksize
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.cond = threading.Condition()
+        self.retry = deque()
+        self.attempts = {}
+        self.results = {}
+        self.n_chunks = 0      # chunks taken from source
+        self.n_taken = 0       # results taken by the consumer
+        self.exhausted = False
+        self.alive = 0
+        self.error = None
+
+    def next_task(self) -> Optional[Tuple[int, list]]:
+        with self.cond:
+            while True:
+                if self.error is not None:
+                    return None
+                if self.retry:
+                    return self.retry.popleft()
+                if (not self.exhausted) and \
+                        (self.n_chunks - self.n_taken < self.max_pending):
+                    chunk = list(islice(self.source, self.chunksize))
+                    if not chunk:
+                        self.exhausted = True
+                        self.cond.notify_all()
+                        continue
+                    idx = self.n_chunks
+                    self.n_chunks += 1
+                    return idx, chunk
+                if self.exhausted and self._running() == 0:
+                    return None
+                self.cond.wait()
+
+    def _running(self) -> int:
+        return self.n_chunks - len(self.results) - self.n_taken - \
+            len(self.retry)
+
+    def done(self, idx: int, res: Any):
+        with self.cond:
+            self.results[idx] = res
+            self.cond.notify_all()
+
+    def fail(self, task: Tuple[int, list], exc: BaseException,
+             retry: bool):
+        with self.cond:
+            n = self.attempts[task[0]] = self.attempts.get(task[0], 0) + 1
+            if retry and n <= self.max_retries:
+                self.retry.append(task)
+            elif self.error is None:
+                self.error = exc
+            self.cond.notify_all()
+
+    def worker_exit(self):
+        with self.cond:
+            self.alive -= 1
+            unfinished = self.retry or (not self.exhausted) or \
+                self._running() > 0
+            if self.alive == 0 and self.error is None and unfinished:
+                self.error = RemoteError("all workers are dead.")
+            self.cond.notify_all()
+
+    def _pop_result(self, ordered: bool):
+        """Wait the next result, return (False, None) when all done."""
+        with self.cond:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                if ordered and (self.n_taken in self.results):
+                    key = self.n_taken
+                elif (not ordered) and self.results:
+                    key = next(iter(self.results))
+                elif self.exhausted and self.n_taken == self.n_chunks:
+                    return False, None
+                else:
+                    self.cond.wait()
+                    continue
+                self.n_taken += 1
+                self.cond.notify_all()
+                return True, self.results.pop(key)
+
+    def collect(self, ordered: bool) -> Iterator:
+        while True:
+            ok, res = self._pop_result(ordered)
+            if not ok:
+                return
+            yield res
+
+
+class distributed(object):
+    """Run a pipe on chunks of the input in remote workers.
+
+    The pipe is applied to each chunk(a list of `chunksize` elements),
+    when `flatten` the chunk results are chained into one stream,
+    otherwise yielded one per chunk. Results come in input order
+    unless `ordered=False`.
+    """
+
+    def __init__(self, pipe, workers: List[Address],
+                 chunksize: int = 1000,
+                 authkey: bytes = DEFAULT_AUTHKEY,
+                 max_retries: int = 3,
+                 ordered: bool = True,
+                 flatten: bool = True,
+                 max_pending: Optional[int] = None):
+        if not workers:
+            raise ValueError("at least one worker address is needed.")
+        self.pipe = pipe
+        self.workers = list(workers)
+        self.chunksize = chunksize
+        self.authkey = authkey
+        self.max_retries = max_retries
+        self.ordered = ordered
+        self.flatten = flatten
+        self.max_pending = max_pending or 4 * len(self.workers)
+        self._payload = dumps(pipe)
+
+    def __call__(self, iterable: Optional[Iterable] = None) -> Iterator:
+        if iterable is None:
+            iterable = self.pipe._input
+        sched = _Scheduler(iterable, self.chunksize,
+                           self.max_pending, self.max_retries)
+        sched.alive = len(self.workers)
+        stop = threading.Event()
+        threads = [threading.Thread(target=self._work,
+                                    args=(addr, sched, stop), daemon=True)
+                   for addr in self.workers]
+        for t in threads:
+            t.start()
+        try:
+            for res in sched.collect(self.ordered):
+                if self.flatten:
+                    yield from res
+                else:
+                    yield res
+        finally:
+            stop.set()
+            with sched.cond:
+                if sched.error is None:
+                    sched.error = GeneratorExit()
+                sched.cond.notify_all()
+
+    def _work(self, addr: Address, sched: _Scheduler,
+              stop: threading.Event):
+        try:
+            conn = Client(addr, authkey=self.authkey)
+        except (OSError, EOFError):
+            sched.worker_exit()
+            return
+        try:
+            while not stop.is_set():
+                task = sched.next_task()
+                if task is None:
+                    break
+                tid, chunk = task
+                try:
+                    conn.send(('task', tid, self._payload, chunk))
+                    msg = conn.recv()
+                except (OSError, EOFError) as e:  # worker died
+                    sched.fail(task, e, retry=True)
+                    break
+                if msg[0] == 'ok':
+                    sched.done(tid, msg[2])
+                else:
+                    sched.fail(task, msg[2], retry=False)
+        finally:
+            conn.close()
+            sched.worker_exit()
+
+    def __repr__(self) -> str:
+        return f"<distributed {self.pipe} on {len(self.workers)} workers>"
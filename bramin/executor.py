@@ -0,0 +1,352 @@
+"""Worker backends used by the concurrent execution modes.
+
+'interpreters' runs the pool tasks in subinterpreters with their own GIL
+(Python 3.14+, `concurrent.futures.InterpreterPoolExecutor`), in one
+process, no fork and the items are pickled without going through a pipe.
+Where it's not available, or the function can not be pickled(lambdas,
+closures) or is defined in the script's `__main__`, which subinterpreters
+can not share, the process backend is used instead. Long-running workers
+connected by queues(`pipelined`, `multi_file`) always run as processes
+with this backend.
+"""
+
+from typing import Callable, Any, Iterable, Iterator, Optional
+import concurrent.futures
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+)
+from collections import deque
+import multiprocessing as mp
+import statistics
+import itertools
+import threading
+import pickle
+import queue
+import time
+import os
+
+from . import shm
+
+
+BACKENDS = ('thread', 'process', 'interpreters')
+
+HAS_INTERPRETERS = hasattr(concurrent.futures, 'InterpreterPoolExecutor')
+
+
+def mp_context():
+    """Prefer fork: workers inherit the stage functions(lambdas, closures)
+    instead of pickling them."""
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    return mp.get_context()
+
+
+def check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"backend should be one of {BACKENDS}, got {repr(backend)}")
+
+
+def worker_backend(backend: str) -> str:
+    """Backend of the long-running workers, 'thread' or 'process'."""
+    check_backend(backend)
+    return 'thread' if backend == 'thread' else 'process'
+
+
+def pool_backend(backend: str, func: Callable) -> str:
+    """Backend the pool of `func` really use, 'interpreters' fall back
+    to 'process' when unavailable."""
+    check_backend(backend)
+    if backend == 'interpreters' and \
+            not (HAS_INTERPRETERS and _shareable(func)):
+        return 'process'
+    return backend
+
+
+def _shareable(obj: Any) -> bool:
+    """Can be pickled and loaded in a subinterpreter, which has it's own
+    `__main__`: the objects defined in the script are not there."""
+    try:
+        return b'__main__' not in pickle.dumps(obj)
+    except Exception:
+        return False
+
+
+def start_worker(backend: str, target: Callable, args: tuple = ()):
+    """Start a daemon thread or process run target(*args)."""
+    backend = worker_backend(backend)
+    if backend == 'thread':
+        w = threading.Thread(target=target, args=args, daemon=True)
+    else:
+        w = mp_context().Process(target=target, args=args, daemon=True)
+    w.start()
+    return w
+
+
+def make_queue(backend: str, maxsize: int = 0):
+    if worker_backend(backend) == 'thread':
+        return queue.Queue(maxsize)
+    return mp_context().Queue(maxsize)
+
+
+def make_event(backend: str):
+    if worker_backend(backend) == 'thread':
+        return threading.Event()
+    return mp_context().Event()
+
+
+def stop_worker(w, timeout: float = 1.0):
+    w.join(timeout)
+    if isinstance(w, mp.process.BaseProcess) and w.is_alive():
+        w.terminate()
+        w.join()
+
+
+def put_until(q, item: Any, stop, poll: float = 0.1) -> bool:
+    """Put into a bounded queue, give up when stop is set.
+    return False if gave up."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=poll)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def qsize(q) -> int:
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS multiprocessing queue
+        return -1
+
+
+_END = object()
+
+
+# functions used by process pools, inherited by the forked workers,
+# or installed into each subinterpreter by the pool's initializer
+_registry = {}
+_reg_counter = itertools.count()
+
+
+def _install(key: int, func: Callable):
+    _registry[key] = func
+
+
+def _call_registered(key: int, item: Any, shm_args: tuple) -> Any:
+    func = _registry[key]
+    if shm_args:
+        item = shm.restore(item)
+    res = func(item)
+    if shm_args:
+        res = shm.share(res, *shm_args)
+    return res
+
+
+class _Pool(object):
+    """concurrent.futures pool, functions are not pickled
+    in process backend(workers inherit them by fork), and pickled once
+    for each subinterpreter in interpreters backend."""
+
+    def __init__(self, func: Callable, backend: str, workers: Optional[int],
+                 shm_min_bytes: Optional[int] = None):
+        backend = pool_backend(backend, func)
+        self.func = func
+        self.backend = backend
+        self.shm_args = ()
+        if backend == 'thread':
+            self.pool = ThreadPoolExecutor(workers)
+        elif backend == 'interpreters':
+            self.key = next(_reg_counter)
+            self.pool = concurrent.futures.InterpreterPoolExecutor(
+                workers, initializer=_install, initargs=(self.key, func))
+        else:
+            self.key = next(_reg_counter)
+            _registry[self.key] = func  # must before forking
+            if shm_min_bytes is not None:
+                self.shm_args = (shm.new_prefix(), shm_min_bytes)
+            self.pool = ProcessPoolExecutor(workers, mp_context=mp_context())
+
+    def submit(self, item: Any) -> Future:
+        if self.backend == 'thread':
+            return self.pool.submit(self.func, item)
+        if self.shm_args:
+            item = shm.share(item, *self.shm_args)
+        return self.pool.submit(_call_registered, self.key, item,
+                                self.shm_args)
+
+    def result(self, fut: Future) -> Any:
+        res = fut.result()
+        if self.shm_args:
+            res = shm.restore(res)
+        return res
+
+    def release(self, fut: Future):
+        """Drop the result of a task will not be consumed, once it's done
+        (it may hold shared memory)."""
+        if self.shm_args:
+            fut.add_done_callback(self._drop)
+
+    def _drop(self, fut: Future):
+        try:
+            self.result(fut)
+        except BaseException:
+            pass
+
+    def shutdown(self, wait: bool = True):
+        """Without `wait`, the running tasks are left to finish in the
+        background, their results are dropped if they are `release`d."""
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+        if self.backend != 'thread':
+            _registry.pop(self.key, None)
+            if self.shm_args:
+                shm.cleanup(self.shm_args[0])
+
+
+def pmap(func: Callable, iterable: Iterable,
+         workers: Optional[int] = None, backend: str = 'thread',
+         ordered: bool = True, max_pending: Optional[int] = None,
+         shm_min_bytes: Optional[int] = None,
+         speculate: Optional[float] = None) -> Iterator:
+    """Lazy parallel map, at most `max_pending` items are in flight,
+    so the memory is bounded even with an infinite input.
+
+    With `speculate`, a task running longer than `speculate` times the
+    median time of the finished ones(stragglers) is launched again on an
+    idle worker, the first finished copy wins and the other is cancelled,
+    or if it's already running, left to finish in the background and
+    it's result dropped. So `func` should be free of side effects.
+
+    >>> list(pmap(lambda x: x * 2, range(5), workers=2))
+    [0, 2, 4, 6, 8]
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    if speculate is not None:
+        if speculate < 1:
+            raise ValueError(f"speculate should be >= 1, got {speculate}")
+        return _speculative_map(func, iterable, workers, backend, ordered,
+                                max_pending, shm_min_bytes, speculate)
+    return _pmap(func, iterable, workers, backend, ordered, max_pending,
+                 shm_min_bytes)
+
+
+def _pmap(func: Callable, iterable: Iterable, workers: int, backend: str,
+          ordered: bool, max_pending: int,
+          shm_min_bytes: Optional[int]) -> Iterator:
+    pool = _Pool(func, backend, workers, shm_min_bytes)
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(pool.submit(item))
+            while len(pending) >= max_pending:
+                yield pool.result(_next_done(pending, ordered))
+        while pending:
+            yield pool.result(_next_done(pending, ordered))
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown()
+
+
+def _next_done(pending: deque, ordered: bool) -> Future:
+    if ordered:
+        return pending.popleft()
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    fut = next(iter(done))
+    pending.remove(fut)
+    return fut
+
+
+# finished tasks needed before the median is trusted
+MIN_SAMPLES = 3
+
+
+class _Task(object):
+    """An item of the speculative map, and the futures of it's copies."""
+
+    __slots__ = ('item', 'started', 'futures', 'winner')
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.started = 0.0
+        self.futures = []
+        self.winner: Optional[Future] = None
+
+
+def _speculative_map(func: Callable, iterable: Iterable, workers: int,
+                     backend: str, ordered: bool, max_pending: int,
+                     shm_min_bytes: Optional[int],
+                     factor: float) -> Iterator:
+    """pmap with stragglers re-launched. At most `workers` copies are
+    submitted at once, so a task starts when it's submitted, and the time
+    since then is it's running time."""
+    pool = _Pool(func, backend, workers, shm_min_bytes)
+    items = iter(iterable)
+    exhausted = False
+    tasks = deque()  # not yielded yet, in input order
+    running = {}  # future -> (task, submit time)
+    durations = deque(maxlen=256)  # of the recent winners
+
+    def launch(task: _Task):
+        now = time.perf_counter()
+        fut = pool.submit(task.item)
+        if not task.futures:
+            task.started = now
+        task.futures.append(fut)
+        running[fut] = (task, now)
+
+    try:
+        while True:
+            timeout = None
+            if len(running) < workers and len(durations) >= MIN_SAMPLES:
+                limit = factor * statistics.median(durations)
+                now = time.perf_counter()
+                for task in tasks:  # oldest first
+                    if task.winner is not None or len(task.futures) > 1:
+                        continue
+                    age = now - task.started
+                    if age < limit:
+                        left = limit - age
+                        timeout = left if timeout is None else \
+                            min(timeout, left)
+                    elif len(running) < workers:
+                        launch(task)
+            while not exhausted and len(running) < workers and \
+                    len(tasks) < max_pending:
+                item = next(items, _END)
+                if item is _END:
+                    exhausted = True
+                    break
+                tasks.append(_Task(item))
+                launch(tasks[-1])
+            if not tasks:
+                break
+            done, _ = wait(list(running), timeout, FIRST_COMPLETED)
+            for fut in done:
+                task, submitted = running.pop(fut)
+                if task.winner is not None:  # the loser, released
+                    continue
+                task.winner = fut
+                durations.append(time.perf_counter() - submitted)
+                for other in task.futures:
+                    if other is fut:
+                        continue
+                    if other.cancel():
+                        running.pop(other)
+                    else:
+                        pool.release(other)
+                task.item = None
+                if not ordered:
+                    tasks.remove(task)
+                    yield pool.result(fut)
+            while ordered and tasks and tasks[0].winner is not None:
+                yield pool.result(tasks.popleft().winner)
+    finally:
+        # do not wait the losers and the tasks still running after an
+        # early stop, their results are dropped in the background
+        for fut, (task, _) in running.items():
+            if not fut.cancel() and task.winner is None:
+                pool.release(fut)
+        pool.shutdown(wait=not any(f.running() for f in running))
@@ -0,0 +1,381 @@
+"""Inspect the plan of a pipe, and measure the cost of each stage.
+
+    print(p.explain())           # what will run, and how
+    print(p.analyze(data))       # run it, with time/rows/bytes/memory
+"""
+
+from typing import Any, Callable, Iterator, List, Optional
+from collections.abc import Iterator as IteratorABC, Sized
+import inspect
+import threading
+import time
+import tracemalloc
+
+from ._utils import is_partial_like, format_partial, get_callable_name
+from .curry import curry
+from .io import callable_file
+from .subp import subp
+from .partition import partition
+from .writebehind import write_behind
+from .pipe import Pipe, placeholder
+
+
+def stage_name(stage: Callable) -> str:
+    """Short description of a stage."""
+    from .optimize import as_map_filter
+    s = as_map_filter(stage)
+    if s is not None:
+        kind, f = s
+        fname = repr(f) if isinstance(f, placeholder) or f is None \
+            else get_callable_name(f)
+        return f"{kind}({fname})"
+    if isinstance(stage, placeholder):
+        return repr(stage)
+    elif isinstance(stage, subp):
+        return f"`{stage.cmd}`"
+    elif isinstance(stage, callable_file):
+        return stage._args[0]
+    elif is_partial_like(stage):
+        return format_partial(stage)
+    elif hasattr(stage, '__qualname__'):
+        return stage.__qualname__
+    return repr(stage)
+
+
+def stage_kind(stage: Callable) -> str:
+    """Kind of a stage: placeholder, curry, partial, subp, file source,
+    file sink, fused loop, pipe ... or function."""
+    from .optimize import FusedLoop
+    from .pushdown import filtered_file
+    from .multifile import multi_file
+    from .pipeline import pipelined
+    from .chunk import concat, unchunk
+    if isinstance(stage, placeholder):
+        return 'placeholder'
+    elif isinstance(stage, subp):
+        return 'subp'
+    elif isinstance(stage, callable_file):
+        if stage._follow is not None:
+            return 'file source(follow)'
+        fname, args, kwargs = stage._args
+        mode = stage._get_mode(stage._ftype.opener, args, kwargs)
+        return 'file source' if 'r' in mode else 'file sink'
+    elif isinstance(stage, filtered_file):
+        return 'file source(filtered)'
+    elif isinstance(stage, multi_file):
+        return 'file source(multi)'
+    elif isinstance(stage, (partition, write_behind)):
+        return 'file sink'
+    elif isinstance(stage, FusedLoop):
+        return 'fused loop'
+    elif isinstance(stage, pipelined):
+        return 'pipelined'
+    elif isinstance(stage, Pipe):
+        return 'pipe'
+    elif stage is concat or stage is unchunk:
+        return 'chunk marker'
+    elif isinstance(stage, curry):
+        return 'curry'
+    elif is_partial_like(stage):
+        return 'partial'
+    return 'function'
+
+
+def is_lazy(stage: Callable) -> bool:
+    """Does the stage return a stream(consumed by the next stage)?"""
+    from .optimize import FusedLoop, as_map_filter
+    from .pushdown import filtered_file
+    from .multifile import multi_file
+    if isinstance(stage, (subp, filtered_file, multi_file)):
+        return True
+    elif isinstance(stage, callable_file):
+        return stage_kind(stage).startswith('file source')
+    elif isinstance(stage, FusedLoop):
+        return stage.sink is None
+    elif as_map_filter(stage) is not None:
+        return True
+    f = stage.func if is_partial_like(stage) else stage
+    return inspect.isgeneratorfunction(f)
+
+
+def execution_mode(pipe: Pipe) -> str:
+    """'parallel'(with the details), 'streaming' or 'serial'."""
+    from .chunk import ChunkedPipe
+    if isinstance(pipe, ChunkedPipe):
+        if pipe.workers is None:
+            return f"chunked(rows={pipe.rows}), serial"
+        return (f"chunked(rows={pipe.rows}), parallel "
+                f"{pipe.backend} x{pipe.workers}")
+    if any(stage_kind(s) == 'pipelined' for s in pipe._chain):
+        return 'parallel'
+    if any(is_lazy(s) for s in pipe._chain[:-1]):
+        return 'streaming'
+    return 'serial'
+
+
+def explain(pipe: Pipe) -> str:
+    """The plan of the pipe: it's stages, optimizations applied
+    and execution mode."""
+    lines = [f"mode: {execution_mode(pipe)}"]
+    kinds = [stage_kind(s) for s in pipe._chain]
+    width = max([len(k) for k in kinds] + [4])
+    lines.append(f"  #  {'kind':<{width}}  stage")
+    for idx, (stage, kind) in enumerate(zip(pipe._chain, kinds)):
+        lazy = "  (stream)" if is_lazy(stage) else ""
+        lines.append(f"  {idx:<2} {kind:<{width}}  {stage_name(stage)}{lazy}")
+    if pipe.optimizations:
+        lines.append("optimizations:")
+        lines.extend([f"  - {o}" for o in pipe.optimizations])
+    return "\n".join(lines)
+
+
+class StageStats(object):
+    """Cost of one stage measured by `analyze`.
+
+    `time` exclude the time spent in the upstream stages, `rows`/`bytes`
+    are of the output(None if unknown), `memory` is the peak of the
+    traced allocations while the stage running(None if not traced, or
+    the stage ran concurrently with others).
+    """
+
+    __slots__ = ('index', 'name', 'kind', 'time', 'rows', 'bytes',
+                 'memory', '_inner', '_lock', '_overlapped')
+
+    def __init__(self, index: int, name: str, kind: str):
+        self.index = index
+        self.name = name
+        self.kind = kind
+        self.time: Optional[float] = 0.0
+        self.rows: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.memory: Optional[int] = None
+        self._inner = 0.0  # time of the upstream stages run inside it
+        self._lock = threading.Lock()
+        # ran in several threads at once, the traced peak is process-wide
+        self._overlapped = False
+
+    def _count(self, obj: Any):
+        n = _nbytes(obj)
+        with self._lock:
+            self.rows = (self.rows or 0) + 1
+            if n is not None:
+                self.bytes = (self.bytes or 0) + n
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__
+                if not k.startswith('_')}
+
+    def __repr__(self) -> str:
+        return (f"<StageStats {self.index} {self.name} time={self.time} "
+                f"rows={self.rows} bytes={self.bytes} memory={self.memory}>")
+
+
+def _nbytes(obj: Any) -> Optional[int]:
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    memory_usage = getattr(obj, 'memory_usage', None)  # pandas
+    if callable(memory_usage):
+        m = memory_usage()
+        return int(getattr(m, 'sum', lambda: m)())
+    n = getattr(obj, 'nbytes', None)  # numpy
+    if isinstance(n, int):
+        return n
+    if isinstance(obj, (list, tuple)):
+        sizes = [_nbytes(o) for o in obj]
+        if all(s is not None for s in sizes):
+            return sum(sizes)
+    return None
+
+
+class _Region(object):
+    """Measure the stage while code inside it running, nested regions
+    (upstream stages pulled by it) are subtracted from it's time.
+
+    The peak of `tracemalloc` is process-wide, so the memory of regions
+    running in other threads at the same time are mixed up, they are
+    marked overlapped."""
+
+    _local = threading.local()
+    _running: dict = {}  # thread id -> memory regions running in it
+    _running_lock = threading.Lock()
+
+    def __init__(self, stats: StageStats, memory: bool):
+        self.stats = stats
+        self.memory = memory
+
+    def __enter__(self):
+        stack = self._local.__dict__.setdefault('stack', [])
+        if self.memory:
+            self._join()
+            self.mem0, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.peak = 0
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        stack = self._local.stack
+        stack.pop()
+        s = self.stats
+        with s._lock:
+            s.time += elapsed
+        if stack:
+            parent = stack[-1]
+            with parent.stats._lock:
+                parent.stats._inner += elapsed
+        if self.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.peak)
+            with s._lock:
+                s.memory = max(s.memory or 0, peak - self.mem0)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            self._leave()
+
+    def _join(self):
+        tid = threading.get_ident()
+        with self._running_lock:
+            running = self._running
+            running.setdefault(tid, []).append(self)
+            if len(running) > 1:  # other threads are running regions
+                for regions in running.values():
+                    for r in regions:
+                        r.stats._overlapped = True
+
+    def _leave(self):
+        tid = threading.get_ident()
+        with self._running_lock:
+            regions = self._running[tid]
+            regions.remove(self)
+            if not regions:
+                del self._running[tid]
+
+
+class _Metered(object):
+    """Stage wrapper measure it's call and the stream it return."""
+
+    def __init__(self, pipe: Pipe, func: Callable, stats: StageStats,
+                 memory: bool):
+        self.pipe = pipe
+        self.func = func
+        self.stats = stats
+        self.memory = memory
+
+    def __call__(self, old: Any) -> Any:
+        with _Region(self.stats, self.memory):
+            res = self.pipe._process(self.func, old, None)
+        if isinstance(res, IteratorABC):
+            return self._stream(res)
+        s = self.stats
+        if isinstance(res, Sized) and not isinstance(res, (str, bytes)):
+            s.rows = (s.rows or 0) + len(res)
+        else:
+            s.rows = (s.rows or 0) + 1
+        n = _nbytes(res)
+        if n is not None:
+            s.bytes = (s.bytes or 0) + n
+        return res
+
+    def _stream(self, it: Iterator) -> Iterator:
+        region = _Region(self.stats, self.memory)
+        count = self.stats._count
+        while True:
+            with region:
+                try:
+                    x = next(it)
+                except StopIteration:
+                    break
+            count(x)
+            yield x
+
+    def __repr__(self) -> str:
+        return repr(self.func)
+
+
+class Analysis(object):
+    """Result of `Pipe.analyze`: the plan, the result of the run and the
+    `StageStats` of the stages."""
+
+    def __init__(self, plan: str, result: Any, stages: List[StageStats],
+                 wall: float):
+        self.plan = plan
+        self.result = result
+        self.stages = stages
+        self.wall = wall
+
+    def as_dicts(self) -> List[dict]:
+        return [s.as_dict() for s in self.stages]
+
+    def __str__(self) -> str:
+        def fmt(v, f="{}"):
+            return "-" if v is None else f.format(v)
+        width = max([len(s.kind) for s in self.stages] + [4])
+        lines = [self.plan.split("\n")[0], f"wall: {self.wall:.4f}s",
+                 f"  #  {'kind':<{width}}  {'time(s)':>9} {'rows':>9} "
+                 f"{'bytes':>11} {'memory':>11}  stage"]
+        for s in self.stages:
+            lines.append(
+                f"  {s.index:<2} {s.kind:<{width}}  "
+                f"{fmt(s.time, '{:.4f}'):>9} {fmt(s.rows):>9} "
+                f"{fmt(s.bytes):>11} {fmt(s.memory):>11}  {s.name}")
+        rest = self.plan.split("\n")[2 + len(self.stages):]
+        return "\n".join(lines + rest)
+
+    def __repr__(self) -> str:
+        return f"<Analysis of {len(self.stages)} stages wall={self.wall:.4f}s>"
+
+
+def analyze(pipe: Pipe, _input: Any = None, memory: bool = True
+            ) -> Analysis:
+    """Run the pipe with each stage measured, a stream result is
+    consumed into a list. With `memory`, allocations are traced by
+    `tracemalloc`, which slow down the python code a lot, times are more
+    accurate without it.
+
+    Stages run in worker processes or subinterpreters(chunked pipe with
+    'process' or 'interpreters' backend) can not be measured, only the
+    stages run in this interpreter are. The peak memory is only
+    meaningful for the stages run serially, it's None for the stages ran
+    at the same time in several threads(chunked pipe with 'thread'
+    backend and workers).
+    """
+    from .chunk import ChunkedPipe
+    stats, chain = [], []
+    in_workers = isinstance(pipe, ChunkedPipe) and \
+        pipe.backend != 'thread'
+    for idx, stage in enumerate(pipe._chain):
+        kind = stage_kind(stage)
+        s = StageStats(idx, stage_name(stage), kind)
+        stats.append(s)
+        if kind == 'chunk marker':
+            in_workers = False
+            # matched by identity, so not wrapped
+            chain.append(stage)
+            s.time = None
+        elif in_workers:
+            chain.append(stage)
+            s.time = None
+        else:
+            chain.append(_Metered(pipe, stage, s, memory))
+    p = pipe._new(chain, pipe._input)
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        res = p(_input)
+        if isinstance(res, IteratorABC):
+            res = list(res)
+        wall = time.perf_counter() - t0
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    for s in stats:
+        if s.time is not None:
+            s.time = max(s.time - s._inner, 0.0)
+        if not memory or s._overlapped:
+            s.memory = None
+    return Analysis(explain(pipe), res, stats, wall)
@@ -0,0 +1,158 @@
+"""Follow a growing file like `tail -F`, resume from a checkpoint."""
+
+from typing import Iterator, Optional, Tuple, Union
+import json
+import time
+import os
+
+from .io import FileType, universal_lines
+from .cancel import current_token
+
+
+def load_checkpoint(path: str) -> Optional[Tuple[int, int, int]]:
+    """Return (dev, inode, offset) saved in the checkpoint file."""
+    try:
+        with open(path) as f:
+            d = json.load(f)
+        return d['dev'], d['ino'], d['offset']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(path: str, dev: int, ino: int, offset: int):
+    """Write atomically, a crash never leave a broken checkpoint."""
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump({'dev': dev, 'ino': ino, 'offset': offset}, f)
+    os.replace(tmp, path)
+
+
+class _Followed(object):
+    """The file being followed and the offset of the next record."""
+
+    def __init__(self, fname: str, ftype: FileType):
+        self.fname = fname
+        self.ftype = ftype
+        self.fh = ftype.opener(fname, mode='rb')
+        st = os.fstat(self.fh.fileno())
+        self.dev, self.ino = st.st_dev, st.st_ino
+        self.pos = 0
+
+    def seek(self, pos: int):
+        self.fh.seek(pos)
+        self.pos = pos
+
+    def readline(self, partial: bool = False) -> Optional[bytes]:
+        """A complete line, or None. A partial line at the end is left
+        (the writer may be still writing it) unless `partial`."""
+        line = self.fh.readline()
+        if line and (line.endswith(b'\n') or partial):
+            self.pos += len(line)
+            return line
+        self.fh.seek(self.pos)
+        return None
+
+    def truncated(self) -> bool:
+        return os.fstat(self.fh.fileno()).st_size < self.pos
+
+    def rotated(self) -> bool:
+        """The name point to another file now(rotated or recreated)."""
+        try:
+            st = os.stat(self.fname)
+        except FileNotFoundError:
+            return False  # wait the new one being created
+        return (st.st_dev, st.st_ino) != (self.dev, self.ino)
+
+    def close(self):
+        self.fh.close()
+
+
+def follow_file(fname: str, ftype: FileType,
+                checkpoint: Optional[str] = None,
+                poll_interval: float = 0.5,
+                idle_timeout: Optional[float] = None,
+                checkpoint_interval: float = 1.0,
+                binary: bool = False,
+                encoding: str = 'utf-8') -> Iterator[Union[str, bytes]]:
+    """Yield the lines of the file, then the lines appended to it.
+
+    The file is polled every `poll_interval` seconds at the end. When it's
+    rotated(the name point to a new file), the rest of the old one is read,
+    then the new one from it's start. When it's truncated, read from start.
+
+    The offset after the consumed lines is saved to `checkpoint` at most
+    every `checkpoint_interval` seconds and when stopped, a restarted
+    follower continue from there(at least once, the lines consumed after
+    the last save are read again).
+
+    Stop when nothing new in `idle_timeout` seconds, or the pipe's cancel
+    token is cancelled. Text lines are split like `text_file` does
+    ('\\r\\n' and '\\r' are line ends too), a line is complete once it's
+    '\\n' is written.
+    """
+    if not (ftype.line_oriented and ftype.seekable):
+        raise ValueError(f"file type {ftype.name} can not be followed, "
+                         "it should be line oriented and seekable.")
+    # the token of the running pipe, the lines may be consumed later
+    return _follow(fname, ftype, checkpoint, poll_interval, idle_timeout,
+                   checkpoint_interval, binary, encoding, current_token())
+
+
+def _decoded(line: bytes, binary: bool, encoding: str) -> list:
+    # universal newlines like `text_file`
+    return [line] if binary else universal_lines(line.decode(encoding))
+
+
+def _follow(fname, ftype, checkpoint, poll_interval, idle_timeout,
+            checkpoint_interval, binary, encoding, token) -> Iterator:
+    f = _Followed(fname, ftype)
+    saved = load_checkpoint(checkpoint) if checkpoint else None
+    if saved is not None:
+        dev, ino, offset = saved
+        size = os.fstat(f.fh.fileno()).st_size
+        # another file(rotated) or truncated: start over
+        if (dev, ino) == (f.dev, f.ino) and offset <= size:
+            f.seek(offset)
+    last_save = time.monotonic()
+    last_data = time.monotonic()
+
+    def save():
+        if checkpoint:
+            save_checkpoint(checkpoint, f.dev, f.ino, f.pos)
+
+    try:
+        while True:
+            line = f.readline()
+            if line is not None:
+                yield from _decoded(line, binary, encoding)
+                now = time.monotonic()
+                last_data = now
+                if checkpoint and now - last_save >= checkpoint_interval:
+                    save()
+                    last_save = now
+                continue
+            # at the end
+            if f.rotated():
+                while True:  # the old file is complete
+                    line = f.readline(partial=True)
+                    if line is None:
+                        break
+                    yield from _decoded(line, binary, encoding)
+                f.close()
+                f = _Followed(fname, ftype)
+                save()
+                continue
+            if f.truncated():
+                f.seek(0)
+                continue
+            if idle_timeout is not None and \
+                    time.monotonic() - last_data >= idle_timeout:
+                return
+            if token is not None:
+                token.wait(poll_interval)
+                token.check()
+            else:
+                time.sleep(poll_interval)
+    finally:
+        save()
+        f.close()
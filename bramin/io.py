@@ -1,21 +1,33 @@
 import io
 import gzip
+import pickle
+from itertools import islice
 from typing import Callable, List, Iterable, Optional
 from collections import namedtuple
 import inspect
+import re
 
 
 class FileType(object):
+    """`line_oriented`: the records are the lines of the file.
+    `seekable`: the file opened in 'rb' mode can seek to any byte offset.
+    Files of the both can be read by byte range splits(see `bramin.split`).
+    """
+
     def __init__(self, name: str,
                  matcher: Callable[[str], bool],
                  opener: Callable,
                  reader: Callable,
-                 writer: Callable):
+                 writer: Callable,
+                 line_oriented: bool = False,
+                 seekable: bool = False):
         self.name = name
         self.matcher = matcher
         self.opener = opener
         self.reader = reader
         self.writer = writer
+        self.line_oriented = line_oriented
+        self.seekable = seekable
 
 
 class callable_file(object):
@@ -38,29 +50,50 @@ class callable_file(object):
 
     file_types: List[FileType] = []
 
-    def __init__(self, fname: str, *args, **kwargs):
+    def __init__(self, fname: str, *args,
+                 file_type: Optional[str] = None,
+                 follow: bool = False,
+                 checkpoint: Optional[str] = None,
+                 **kwargs):
+        """`file_type` select a registered type by name,
+        instead of matching the filename.
+
+        With `follow`, read the lines appended to the file continuously,
+        the offset is persisted in the `checkpoint` file if given,
+        kwargs are passed to `bramin.follow.follow_file`.
+        """
+        self._follow = (checkpoint, kwargs) if follow else None
         for ftype in reversed(self.file_types):
-            if ftype.matcher(fname):
+            matched = (ftype.name == file_type) if file_type \
+                else ftype.matcher(fname)
+            if matched:
                 self._args = (fname, args, kwargs)
                 self._ftype = ftype
                 break
         else:
             raise IOError(
-                f"Could not found any registered file type match {fname}")
+                f"Could not found any registered file type match {fname}"
+                + (f" named {file_type}" if file_type else ""))
 
     def __call__(self, contents: Optional[Iterable] = None):
         fname, args, kwargs = self._args
+        if self._follow is not None:
+            from .follow import follow_file
+            checkpoint, kwargs = self._follow
+            return follow_file(fname, self._ftype, checkpoint, **kwargs)
         mode = self._get_mode(self._ftype.opener, args, kwargs)
         if len(args) > 0:
             args = args[1:]
-        kwargs['mode'] = mode
+        kwargs = dict(kwargs, mode=mode)
 
         fh = self._ftype.opener(fname, *args, **kwargs)
         if 'r' in mode:  # read from file
             return self._read_file(fh)
         else:            # write to file
-            self._ftype.writer(fh, contents)
-            fh.close()
+            try:
+                self._ftype.writer(fh, contents)
+            finally:
+                fh.close()
             return fname
 
     @staticmethod
@@ -75,9 +108,20 @@ class callable_file(object):
         return mode
 
     def _read_file(self, fh) -> Iterable:
-        for rec in self._ftype.reader(fh):
-            yield rec
-        fh.close()
+        # close it even the reading is stopped early(or cancelled)
+        try:
+            for rec in self._ftype.reader(fh):
+                yield rec
+        finally:
+            fh.close()
+
+    def __repr__(self) -> str:
+        fname, args, kwargs = self._args
+        if self._follow is not None:
+            mode = 'follow'
+        else:
+            mode = self._get_mode(self._ftype.opener, args, kwargs)
+        return f"<callable_file {fname} {self._ftype.name} mode={mode}>"
 
     @classmethod
     def register(cls, file_type: FileType):
@@ -94,6 +138,21 @@ class callable_file(object):
                 break
 
 
+_LINES = re.compile(r'[^\n]*\n|[^\n]+')
+
+
+def universal_lines(line: str) -> List[str]:
+    """Split a line read in binary mode(then decoded) like `text_file`
+    does, '\\r\\n' and '\\r' are line ends too.
+
+    >>> universal_lines("a\\r\\nb\\rc\\n")
+    ['a\\n', 'b\\n', 'c\\n']
+    """
+    if '\r' not in line:
+        return [line]
+    return _LINES.findall(line.replace('\r\n', '\n').replace('\r', '\n'))
+
+
 def _write_text(fh, lines):
     for l in lines:
         fh.write(l)
@@ -104,17 +163,68 @@ text_file = FileType(
     lambda fname: True,
     open,
     lambda fh: fh,
-    _write_text
+    _write_text,
+    line_oriented=True,
+    seekable=True,
 )
 
 
 callable_file.register(text_file)
 
 
+def _write_gz_text(fh, lines):
+    w = io.TextIOWrapper(fh)
+    _write_text(w, lines)
+    w.flush()
+    # or the wrapper close the file when it's collected
+    w.detach()
+
+
 gzipped_text = FileType(
     "gzipped_text",
     lambda fname: fname.endswith('.gz'),
     gzip.open,
     lambda fh: io.TextIOWrapper(fh),
-    lambda fh, lines: _write_text(io.TextIOWrapper(fh), lines)
+    _write_gz_text,
+    line_oriented=True,
+)
+
+
+callable_file.register(gzipped_text)
+
+
+def _open_pickle_batches(fname: str, mode: str = 'rb',
+                         compresslevel: int = 1):
+    return gzip.open(fname, mode, compresslevel=compresslevel)
+
+
+def _read_pickle_batches(fh) -> Iterable:
+    while True:
+        try:
+            batch = pickle.load(fh)
+        except EOFError:
+            return
+        yield from batch
+
+
+def _write_pickle_batches(fh, records: Iterable, batch_size: int = 1024):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        pickle.dump(batch, fh, pickle.HIGHEST_PROTOCOL)
+
+
+# python objects pickled in batches into a gzip file(fast level),
+# used by the stages spill to temp files
+pickle_batches = FileType(
+    "pickle_batches",
+    lambda fname: False,  # only selected by name
+    _open_pickle_batches,
+    _read_pickle_batches,
+    _write_pickle_batches,
 )
+
+
+callable_file.register(pickle_batches)
@@ -0,0 +1,228 @@
+"""Combine the pipe's stream with other inputs: joins and sorted merge.
+
+The other inputs(sources) can be iterables, filenames, callables
+(like `callable_file`) or pipes, they are opened when the stage runs:
+
+    "orders.tsv" >> P | c(map, parse) \\
+        | hash_join(users, key=it[1], build_key=it[0]) | ...
+    "a.sorted" >> P | merge_sorted("b.sorted", "c.sorted") > "all.sorted" | END
+"""
+
+from typing import Any, Callable, Iterable, Iterator, Optional
+import heapq
+
+from .io import callable_file
+from .pipe import Pipe
+
+
+Source = Any  # iterable, filename, callable or pipe
+Combine = Callable[[Any, Any], Any]
+
+HOW = ('inner', 'left', 'right', 'outer')
+
+_END = object()
+
+
+def open_source(src: Source) -> Iterator:
+    """Iterator of a source, files and pipes are read at this time."""
+    if isinstance(src, str):
+        return iter(callable_file(src)())
+    elif isinstance(src, Pipe):
+        return iter(src(src._input))
+    elif callable(src):
+        return iter(src())
+    return iter(src)
+
+
+def _check_how(how: str):
+    if how not in HOW:
+        raise ValueError(f"how should be one of {HOW}, got {repr(how)}")
+
+
+class hash_join(object):
+    """Stage join the stream(the probe side) with the `build` source,
+    which is loaded into a hash table, only the build side is held in
+    the memory, the stream is probed record by record.
+
+    Yield `combine(left, right)`(a tuple by default) of the records have
+    equal keys, `key` is of the stream and `build_key`(same as `key` if
+    None) is of the build side. With `how` 'left'/'right'/'outer', the
+    unmatched records are yield with None as the other side, the
+    unmatched build records come after the stream is exhausted.
+
+    >>> users = [(1, 'ann'), (2, 'bob')]
+    >>> orders = [('x', 2), ('y', 1), ('z', 3)]
+    >>> list(hash_join(users, key=lambda o: o[1], build_key=lambda u: u[0])(orders))
+    [(('x', 2), (2, 'bob')), (('y', 1), (1, 'ann'))]
+    """
+
+    def __init__(self, build: Source, key: Callable[[Any], Any],
+                 build_key: Optional[Callable[[Any], Any]] = None,
+                 how: str = 'inner', combine: Combine = lambda l, r: (l, r)):
+        _check_how(how)
+        self.build = build
+        self.key = key
+        self.build_key = key if build_key is None else build_key
+        self.how = how
+        self.combine = combine
+
+    def _table(self) -> dict:
+        table = {}
+        key = self.build_key
+        for rec in open_source(self.build):
+            k = key(rec)
+            recs = table.get(k)
+            if recs is None:
+                table[k] = [rec]
+            else:
+                recs.append(rec)
+        return table
+
+    def __call__(self, records: Iterable) -> Iterator:
+        return self._join(iter(records))
+
+    def _join(self, records: Iterator) -> Iterator:
+        table = self._table()
+        key, combine = self.key, self.combine
+        keep_left = self.how in ('left', 'outer')
+        keep_right = self.how in ('right', 'outer')
+        matched = set()
+        get = table.get
+        for rec in records:
+            k = key(rec)
+            recs = get(k)
+            if recs is None:
+                if keep_left:
+                    yield combine(rec, None)
+                continue
+            if keep_right:
+                matched.add(k)
+            for r in recs:
+                yield combine(rec, r)
+        if keep_right:
+            for k, recs in table.items():
+                if k not in matched:
+                    for r in recs:
+                        yield combine(None, r)
+
+    def __repr__(self) -> str:
+        return f"<hash_join how={self.how}>"
+
+
+class merge_join(object):
+    """Stage join the stream with the `other` source, both sorted by
+    their keys(ascending). They are read in step, only the records of
+    `other` with the current key are held, so both can be far bigger
+    than the memory. Raise ValueError if an input is found not sorted.
+
+    Arguments are the same as `hash_join`.
+
+    >>> left = [(1, 'a'), (2, 'b'), (2, 'c'), (4, 'd')]
+    >>> right = [(2, 'x'), (3, 'y'), (4, 'z')]
+    >>> list(merge_join(right, key=lambda r: r[0], how='left')(left))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [((1, 'a'), None), ((2, 'b'), (2, 'x')), ((2, 'c'), (2, 'x')),
+     ((4, 'd'), (4, 'z'))]
+    """
+
+    def __init__(self, other: Source, key: Callable[[Any], Any],
+                 other_key: Optional[Callable[[Any], Any]] = None,
+                 how: str = 'inner', combine: Combine = lambda l, r: (l, r)):
+        _check_how(how)
+        self.other = other
+        self.key = key
+        self.other_key = key if other_key is None else other_key
+        self.how = how
+        self.combine = combine
+
+    def __call__(self, records: Iterable) -> Iterator:
+        return self._join(
+            _Keyed(iter(records), self.key, "stream"),
+            _Keyed(open_source(self.other), self.other_key, "other"))
+
+    def _join(self, left: "_Keyed", right: "_Keyed") -> Iterator:
+        combine = self.combine
+        keep_left = self.how in ('left', 'outer')
+        keep_right = self.how in ('right', 'outer')
+        left.next()
+        right.next()
+        while left.rec is not _END and right.rec is not _END:
+            if left.key < right.key:
+                if keep_left:
+                    yield combine(left.rec, None)
+                left.next()
+            elif right.key < left.key:
+                if keep_right:
+                    yield combine(None, right.rec)
+                right.next()
+            else:
+                k = left.key
+                group = [right.rec]
+                while right.next() is not _END and right.key == k:
+                    group.append(right.rec)
+                while True:
+                    for r in group:
+                        yield combine(left.rec, r)
+                    if left.next() is _END or left.key != k:
+                        break
+        while keep_left and left.rec is not _END:
+            yield combine(left.rec, None)
+            left.next()
+        while keep_right and right.rec is not _END:
+            yield combine(None, right.rec)
+            right.next()
+
+    def __repr__(self) -> str:
+        return f"<merge_join how={self.how}>"
+
+
+class _Keyed(object):
+    """Cursor of a sorted input, with the key of the current record."""
+
+    __slots__ = ('it', 'keyf', 'name', 'rec', 'key')
+
+    def __init__(self, it: Iterator, keyf: Callable, name: str):
+        self.it = it
+        self.keyf = keyf
+        self.name = name
+        self.rec = None
+        self.key = _END
+
+    def next(self) -> Any:
+        self.rec = rec = next(self.it, _END)
+        if rec is _END:
+            return rec
+        k = self.keyf(rec)
+        if self.key is not _END and k < self.key:
+            raise ValueError(
+                f"the {self.name} of merge_join is not sorted by key: "
+                f"{repr(k)} after {repr(self.key)}")
+        self.key = k
+        return rec
+
+
+class merge_sorted(object):
+    """Stage merge the sorted stream with other sorted `sources` into one
+    sorted stream(k-way merge), lazily, one record of each is held.
+    Equal records come in the order of the inputs, the stream first.
+    As the first stage(no input), only the sources are merged.
+
+    >>> list(merge_sorted([2, 5], [3, 4])([1, 6]))
+    [1, 2, 3, 4, 5, 6]
+    """
+
+    def __init__(self, *sources: Source,
+                 key: Optional[Callable[[Any], Any]] = None,
+                 reverse: bool = False):
+        self.sources = sources
+        self.key = key
+        self.reverse = reverse
+
+    def __call__(self, records: Optional[Iterable] = None) -> Iterator:
+        inputs = [open_source(s) for s in self.sources]
+        if records is not None:
+            inputs.insert(0, iter(records))
+        return heapq.merge(*inputs, key=self.key, reverse=self.reverse)
+
+    def __repr__(self) -> str:
+        return f"<merge_sorted of {len(self.sources)} sources>"
@@ -0,0 +1,173 @@
+"""Read many files(shards) concurrently as one stream of records."""
+
+from typing import Iterable, Iterator, List, Optional, Union
+from itertools import islice
+import glob
+import os
+
+from .io import callable_file
+from .executor import (
+    check_backend, worker_backend, start_worker, stop_worker, make_queue,
+    make_event, put_until,
+)
+from .pipeline import _get_until, _picklable_exc
+
+
+def expand(patterns: Union[str, Iterable[str]]) -> List[str]:
+    """Expand glob patterns(in order, each sorted), keep plain paths and
+    the existing files(even if their names look like a pattern).
+
+    >>> expand(["b.txt", "a.txt"])
+    ['b.txt', 'a.txt']
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    files = []
+    for pat in patterns:
+        if _is_pattern(pat):
+            matched = sorted(glob.glob(pat, recursive=True))
+            if not matched:
+                raise IOError(f"No file match {pat}")
+            files.extend(matched)
+        else:
+            files.append(pat)
+    return files
+
+
+def _reader(tasks, outq, stop, chunksize: int, file_type: Optional[str]):
+    """Worker body: read the files from `tasks`(a list of (idx, fname),
+    or a queue of them end with None), send the records in batches."""
+    if hasattr(tasks, 'get'):
+        tasks = iter(tasks.get, None)
+    idx = None
+    try:
+        for idx, fname in tasks:
+            if stop.is_set():
+                return
+            recs = callable_file(fname, file_type=file_type)()
+            try:
+                while True:
+                    batch = list(islice(recs, chunksize))
+                    if not batch:
+                        break
+                    if not put_until(outq, ('items', idx, batch), stop):
+                        return
+            finally:
+                recs.close()
+            put_until(outq, ('end', idx, None), stop)
+    except BaseException as e:
+        put_until(outq, ('error', idx, _picklable_exc(e)), stop)
+    finally:
+        put_until(outq, ('exit', None, None), stop)
+
+
+class multi_file(object):
+    """Read the files matched by glob patterns(or a list of paths),
+    at most `max_open` files are read at once, each by a thread or
+    process(`backend`), so the decompression of `.gz` shards run in
+    parallel.
+
+    When `ordered` the records are merged file by file in the expanded
+    order, else interleaved in the order they are read.
+
+    The pipe syntax use it for the glob and list inputs:
+
+        "logs/2026-10-*/part-*.gz" >> P | ...
+        multi_file("logs/*.gz", max_open=8, ordered=False) >> P | ...
+    """
+
+    def __init__(self, patterns: Union[str, Iterable[str]],
+                 max_open: Optional[int] = None,
+                 backend: str = 'thread',
+                 ordered: bool = True,
+                 chunksize: int = 1024,
+                 maxsize: int = 16,
+                 file_type: Optional[str] = None):
+        check_backend(backend)
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.patterns = list(patterns)
+        self.max_open = max_open or os.cpu_count() or 1
+        self.backend = backend
+        self.ordered = ordered
+        self.chunksize = chunksize
+        self.maxsize = maxsize
+        self.file_type = file_type
+
+    def __call__(self, contents: Optional[Iterable] = None) -> Iterator:
+        """Expand the patterns at each call, then read them."""
+        files = list(enumerate(expand(self.patterns)))
+        return self._read(files)
+
+    def _read(self, files: list) -> Iterator:
+        if not files:
+            return
+        backend = worker_backend(self.backend)
+        n = min(self.max_open, len(files))
+        stop = make_event(backend)
+        args = (stop, self.chunksize, self.file_type)
+        workers = []
+        if self.ordered:
+            # files are dealt to readers round-robin, a queue for each
+            queues = [make_queue(backend, self.maxsize) for _ in range(n)]
+            for w in range(n):
+                workers.append(start_worker(
+                    backend, _reader, (files[w::n], queues[w]) + args))
+        else:
+            tasks = make_queue(backend)
+            for f in files:
+                tasks.put(f)
+            for _ in range(n):
+                tasks.put(None)
+            queues = [make_queue(backend, self.maxsize)]
+            for w in range(n):
+                workers.append(start_worker(
+                    backend, _reader, (tasks, queues[0]) + args))
+        try:
+            if self.ordered:
+                for i in range(len(files)):
+                    yield from self._file_records(queues[i % n], stop)
+            else:
+                yield from self._interleaved(queues[0], stop, n)
+        finally:
+            stop.set()
+            for w in workers:
+                stop_worker(w)
+
+    @staticmethod
+    def _file_records(q, stop) -> Iterator:
+        while True:
+            kind, _, payload = _get_until(q, stop)
+            if kind == 'items':
+                yield from payload
+            elif kind == 'end':
+                return
+            elif kind == 'error':
+                raise payload
+
+    @staticmethod
+    def _interleaved(q, stop, n_workers: int) -> Iterator:
+        exited = 0
+        while exited < n_workers:
+            kind, _, payload = _get_until(q, stop)
+            if kind == 'items':
+                yield from payload
+            elif kind == 'exit':
+                exited += 1
+            elif kind == 'error':
+                raise payload
+
+    def __repr__(self) -> str:
+        return (f"<multi_file {self.patterns} max_open={self.max_open} "
+                f"{self.backend} ordered={self.ordered}>")
+
+
+def _is_pattern(path: str) -> bool:
+    # "data[1].txt" is a file if exists
+    return glob.has_magic(path) and not os.path.exists(path)
+
+
+def is_multi_input(obj) -> bool:
+    """Is the left operand of `>> P` more than one file?"""
+    return isinstance(obj, (multi_file, list, tuple)) or \
+        (isinstance(obj, str) and _is_pattern(obj))
@@ -0,0 +1,185 @@
+"""Optimizer passes over Pipe's call chain."""
+
+from typing import Callable, List, Optional, Tuple, Any
+from inspect import _empty
+
+from .curry import curry
+from .pipe import placeholder
+from ._utils import is_partial_like, get_callable_name
+
+
+Stage = Tuple[str, Optional[Callable]]  # ('map' | 'filter', func)
+
+
+def as_map_filter(stage: Callable) -> Optional[Stage]:
+    """Recognize the stage like `curry(map, f)`, `partial(filter, g)`,
+    which waiting for the only iterable.
+
+    return ('map', f) / ('filter', g) or None if it's not the case.
+    """
+    if isinstance(stage, curry):
+        if stage.func not in (map, filter):
+            return None
+        bids = list(stage._bindings.values())
+        func, iter_ = bids[0], bids[1]
+        if (func is _empty) or (iter_ is not _empty):
+            return None
+        if (stage.func is map) and bids[2]:  # extra iterables
+            return None
+    elif is_partial_like(stage):
+        if (stage.func not in (map, filter)) or stage.keywords:
+            return None
+        args = stage.args
+        if len(args) == 2 and args[1] is placeholder:  # c(map, f, it)
+            args = args[:1]
+        if len(args) != 1:
+            return None
+        func = args[0]
+    else:
+        return None
+    if (func is placeholder) or ((func is None) and (stage.func is map)):
+        return None
+    kind = 'map' if stage.func is map else 'filter'
+    return kind, func
+
+
+# sinks can be merged into the tail of a fused loop
+_sinks = {list: 'list', set: 'set'}
+
+
+class FusedLoop(object):
+    """Run a series of map/filter stages in one generated loop,
+    instead of one generator layer per stage.
+
+    >>> f = FusedLoop([('map', lambda x: x + 1), ('filter', placeholder > 2)])
+    >>> list(f(range(4)))
+    [3, 4]
+    """
+
+    def __init__(self, stages: List[Stage], sink: Optional[Callable] = None):
+        self.stages = stages
+        self.sink = sink
+        self._fn = self._compile()
+
+    def __call__(self, iterable):
+        return self._fn(iterable)
+
+    def _compile(self) -> Callable:
+        ns, body = {}, []
+        for idx, (kind, func) in enumerate(self.stages):
+            if func is None:  # filter(None, ...)
+                expr = '_x'
+            elif isinstance(func, placeholder):  # inline the expression
+                lines, expr, ns_ = func._codegen('_x', f'_s{idx}_')
+                body.extend(lines)
+                ns.update(ns_)
+            else:
+                ns[f'_f{idx}'] = func
+                expr = f'_f{idx}(_x)'
+            if kind == 'map':
+                body.append(f'_x = {expr}')
+            else:
+                body.append(f'if not {expr}: continue')
+        if self.sink is None:
+            head, tail, ret = [], ['yield _x'], []
+        else:
+            kind = _sinks[self.sink]
+            add = 'append' if kind == 'list' else 'add'
+            head = [f'_r = {kind}()', f'_add = _r.{add}']
+            tail, ret = ['_add(_x)'], ['return _r']
+        src = ["def _fused(_iter):"] + [f"    {l}" for l in head] + \
+            ["    for _x in _iter:"] + \
+            [f"        {l}" for l in body + tail] + \
+            [f"    {l}" for l in ret]
+        exec(compile("\n".join(src) + "\n", f"<fused {self!r}>", "exec"), ns)
+        return ns['_fused']
+
+    def __repr__(self) -> str:
+        def _repr(f):
+            if isinstance(f, placeholder):
+                return repr(f)
+            return get_callable_name(f) if f is not None else 'None'
+        names = [f"{kind}({_repr(f)})" for kind, f in self.stages]
+        if self.sink is not None:
+            names.append(self.sink.__name__)
+        return f"<fused {' -> '.join(names)}>"
+
+
+def fuse_loops(chain: List[Callable]) -> Tuple[List[Callable], List[str]]:
+    """Fuse the consecutive map/filter stages(and the following
+    list/set sink) in a call chain.
+
+    return (new chain, descriptions of applied fusions)
+    """
+    new, applied = [], []
+    idx = 0
+    while idx < len(chain):
+        run = []
+        while idx + len(run) < len(chain):
+            s = as_map_filter(chain[idx + len(run)])
+            if s is None:
+                break
+            run.append(s)
+        end = idx + len(run)
+        sink = None
+        if run and (end < len(chain)) and _is_sink(chain[end]):
+            sink = chain[end]
+        if len(run) + (sink is not None) >= 2:
+            fused = FusedLoop(run, sink)
+            new.append(fused)
+            applied.append(f"fused {repr(fused)[7:-1]} into one loop")
+            idx = end + (sink is not None)
+        else:
+            new.append(chain[idx])
+            idx += 1
+    return new, applied
+
+
+def _is_sink(func: Any) -> bool:
+    try:
+        return func in _sinks
+    except TypeError:  # unhashable
+        return False
+
+
+def push_down_filters(chain: List[Callable], grep: bool = False
+                      ) -> Tuple[List[Callable], List[str]]:
+    """Push the filters right after a file source into the reading(see
+    `bramin.pushdown`), as a `grep` command if `grep` and possible(the
+    filters are kept after it, grep only pre-selects the lines).
+
+    return (new chain, descriptions of applied push downs)
+    """
+    from .pushdown import (
+        as_pushable, pushable_source, filtered_file, grep_command,
+        check_grep,
+    )
+    from .subp import subp
+    if len(chain) < 2 or not pushable_source(chain[0]):
+        return chain, []
+    preds = []
+    for stage in chain[1:]:
+        s = as_map_filter(stage)
+        p = as_pushable(s[1]) if (s is not None and s[0] == 'filter') \
+            else None
+        if p is None:
+            break
+        preds.append(p)
+    source = chain[0]
+    cmd = grep_command(source, preds) if (grep and preds) else None
+    if cmd is None:
+        # only the leading predicates can be checked on bytes
+        n = 0
+        while n < len(preds) and preds[n].bytes_pred() is not None:
+            n += 1
+        preds = preds[:n]
+    if not preds:
+        return chain, []
+    fname = source._args[0]
+    desc = " and ".join(repr(p) for p in preds)
+    rest = chain[1 + len(preds):]
+    if cmd is not None:
+        return [subp(cmd, on_exit=check_grep)] + chain[1:], \
+            [f"pushed filter {desc} into `{cmd}`"]
+    return [filtered_file(source, preds)] + rest, \
+        [f"pushed filter {desc} into reading {fname}"]
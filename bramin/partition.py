@@ -0,0 +1,142 @@
+"""Route records to many output files by key."""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict, defaultdict
+import threading
+import weakref
+import os
+
+from .io import callable_file
+
+
+def _fd_limit() -> int:
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return 1024
+    if soft == resource.RLIM_INFINITY:
+        return 1 << 16
+    return soft
+
+
+def default_max_open() -> int:
+    """Leave most of the process's fd limit to others."""
+    return max(8, min(512, _fd_limit() // 4))
+
+
+def _close_all(pool: "OrderedDict[str, Any]"):
+    while pool:
+        _, fh = pool.popitem(last=False)
+        fh.close()
+
+
+class partition(object):
+    """Sink write each record(a line) to the file of it's key,
+    the path is `template.format(key=key(record))`.
+
+    Records are buffered by key and written in bulk. The opened files are
+    kept in a LRU pool of at most `max_open` handles, and reused by the
+    following calls. The calls until `close` are one run: a file is
+    truncated(`mode` 'w') only at the first time it's opened in the run,
+    then appended, by the following calls too(write a stream in
+    batches). Call `close`(or use it as a context manager) to close the
+    files and end the run, the next call truncate them again. They are
+    also closed when the sink is garbage collected.
+
+    >>> import tempfile
+    >>> d = tempfile.mkdtemp()
+    >>> sink = partition(d + "/{key}.txt", key=lambda l: l[0])
+    >>> [os.path.basename(f) for f in sink(["a1\\n", "b1\\n", "a2\\n"])]
+    ['a.txt', 'b.txt']
+    >>> sink.close()
+    >>> open(d + "/a.txt").read()
+    'a1\\na2\\n'
+    """
+
+    def __init__(self, template: str, key: Callable[[Any], Any],
+                 mode: str = 'w', max_open: Optional[int] = None,
+                 buffer_size: int = 8192,
+                 file_type: Optional[str] = None):
+        if mode not in ('w', 'a'):
+            raise ValueError(f"mode should be 'w' or 'a', got {repr(mode)}")
+        self.template = template
+        self.key = key
+        self.mode = mode
+        self.max_open = max_open or default_max_open()
+        self.buffer_size = buffer_size
+        self.file_type = file_type
+        self._lock = threading.Lock()
+        self._pool: "OrderedDict[str, Any]" = OrderedDict()
+        self._opened = set()  # paths opened in the current run
+        self._finalizer = weakref.finalize(self, _close_all, self._pool)
+
+    def appending(self) -> "partition":
+        """Same sink in append mode, used by `P | ... >> partition(...)`."""
+        return partition(self.template, self.key, 'a', self.max_open,
+                         self.buffer_size, self.file_type)
+
+    def path(self, key: Any) -> str:
+        k = str(key)
+        if os.sep in k or k in ('', '.', '..'):
+            raise ValueError(f"bad partition key: {repr(key)}")
+        return self.template.format(key=k)
+
+    def __call__(self, records: Iterable) -> List[str]:
+        """Write the records, return the paths written."""
+        written = set()
+        with self._lock:
+            buffers: Dict[Any, list] = defaultdict(list)
+            n = 0
+            for rec in records:
+                buffers[self.key(rec)].append(rec)
+                n += 1
+                if n >= self.buffer_size:
+                    self._write(buffers, written)
+                    n = 0
+            self._write(buffers, written)
+            for fh in self._pool.values():
+                fh.flush()
+        return sorted(written)
+
+    def _write(self, buffers: Dict[Any, list], written: set):
+        for key, recs in buffers.items():
+            path = self.path(key)
+            self._handle(path).writelines(recs)
+            written.add(path)
+        buffers.clear()
+
+    def _handle(self, path: str):
+        fh = self._pool.get(path)
+        if fh is not None:
+            self._pool.move_to_end(path)
+            return fh
+        if len(self._pool) >= self.max_open:
+            _, old = self._pool.popitem(last=False)
+            old.close()
+        mode = 'a' if path in self._opened else self.mode
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        ftype = callable_file(path, file_type=self.file_type)._ftype
+        if not ftype.line_oriented:
+            raise ValueError(f"file type {ftype.name} is not line oriented.")
+        fh = ftype.opener(path, mode=mode + 't')
+        self._opened.add(path)
+        self._pool[path] = fh
+        return fh
+
+    def close(self):
+        """Close the files, end the run."""
+        with self._lock:
+            _close_all(self._pool)
+            self._opened.clear()
+
+    def __enter__(self) -> "partition":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<partition {self.template} open={len(self._pool)}>"
@@ -7,7 +7,7 @@ def patch_op(obj, op):
     real = getattr(obj, op)
     @wraps(real)
     def fake(self, other):
-        if other is Pipe:
+        if other is Pipe or isinstance(other, Pipe):
             return NotImplemented
         else:
             return real(self, other)
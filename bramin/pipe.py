@@ -1,7 +1,9 @@
 from typing import (
-    Any, Optional, Union, Callable, List, Tuple, NewType
+    Any, Optional, Union, Callable, Iterator, List, Tuple, NewType
 )
+from collections.abc import Iterator as IteratorABC
 import types
+import weakref
 from copy import copy
 from functools import partial
 import operator
@@ -9,9 +11,12 @@ import operator
 from ._utils import (
     SpecialMethods,
     is_partial_like, replace_partial_args, format_partial,
-    Singleton, type_error, type_guard
+    Singleton, type_error, type_guard, hybridmethod
 )
 from .io import callable_file
+from .partition import partition
+from .writebehind import write_behind
+from .cancel import CancelToken, scope
 from .subp import subp
 
 
@@ -19,20 +24,25 @@ class EndMarker(metaclass=Singleton):
     def __init__(self, attach=None):
         self.attach = attach
 
-    def __ror__(self, left: str):
+    def __ror__(self, left):
         """Dealing with the problem caused by '|' operator's priority,
-        when redirect the stream to a file, like:
+        when redirect the stream to a file(or a partition sink), like:
 
         P | func1 | func2 > "target.txt" | END
         """
-        if not isinstance(left, str):
+        if not isinstance(left, (str,) + Sink):
             return NotImplemented
-        self.attach = left
-        return self
+        # END is shared by all threads, attach the target to a copy of it
+        end = copy(self)
+        end.attach = left
+        return end
 
 
 END = EndMarker()
 
+# sink objects can be the target of redirections, besides filenames
+Sink = (partition, write_behind)
+
 
 FuncList = List[Callable]
 
@@ -52,17 +62,46 @@ class CallChain(object):
         self._chain = invoke_chain if invoke_chain is not None else []
         self._input = _input
 
-    def __call__(self, _input=None):
+    def __call__(self, _input=None, *, timeout: Optional[float] = None,
+                 token: Optional[CancelToken] = None):
+        """Invoke the chain. With a `timeout`(seconds) or a cancel `token`,
+        raise `bramin.cancel.Cancelled` when cancelled, it's checked
+        between the stages and the elements of the streams."""
         if len(self._chain) <= 0:
             raise ValueError(
                 "There are at least one callable in invoke_chain.")
-        self._input = _input
-        res = self._input
+        if timeout is None and token is None:
+            return self._run(_input, None)
+        token = CancelToken(timeout, parent=token)
+        try:
+            with scope(token):
+                res = self._run(_input, token)
+                token.check()
+        except BaseException:
+            token.release()
+            raise
+        if isinstance(res, IteratorABC):
+            # deadline still apply when consuming the result
+            return token.guard(res, release=True)
+        token.release()
+        return res
+
+    def _run(self, _input: Any, token: Optional[CancelToken]) -> Any:
+        # execution state lives in local variables only,
+        # so one chain can be invoked from many threads concurrently.
+        res = _input
+        if token is None:
+            for func in self._chain:
+                res = self._process(func, res, _input)
+            return res
         for func in self._chain:
-            res = self._process(func, res)
+            token.check()
+            res = self._process(func, res, _input)
+            if isinstance(res, IteratorABC):
+                res = token.guard(res)
         return res
 
-    def _process(self, func: Callable, old: Any) -> Any:
+    def _process(self, func: Callable, old: Any, _input: Any) -> Any:
         return func(old)
 
     @type_guard
@@ -83,7 +122,14 @@ class MetaPipe(type):
         return self(_input=left)
 
     def __rrshift__(self, left):
+        """Read file(s) into the pipe: "a.txt" >> P, glob patterns
+        and lists are read concurrently by `multifile.multi_file`."""
+        from .multifile import multi_file, is_multi_input
         p = self()
+        if is_multi_input(left):
+            if not isinstance(left, multi_file):
+                left = multi_file(left)
+            return p | left
         return p | callable_file(left)
 
     def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
@@ -96,6 +142,13 @@ class MetaPipe(type):
 
 class Pipe(CallChain, metaclass=MetaPipe):
 
+    # descriptions of the optimizations applied to this pipe
+    optimizations: Tuple[str, ...] = ()
+
+    def _new(self, invoke_chain: FuncList, _input: Any) -> "Pipe":
+        """Create a pipe of same kind, subclasses carry their settings."""
+        return type(self)(invoke_chain, _input)
+
     @property
     def last(self) -> Optional[Callable]:
         if self._chain:
@@ -105,23 +158,23 @@ class Pipe(CallChain, metaclass=MetaPipe):
 
     def __or__(self, right: Union[Callable, EndMarker]):
         if right is placeholder:
-            ph = placeholder([lambda x:x])  # add an identity func
+            ph = placeholder()  # the identity node
             chain_ = self._chain + [ph]
-            p = type(self)(chain_, self._input)
+            p = self._new(chain_, self._input)
             return p
         elif isinstance(right, subp) and isinstance(self.last, subp):
             # concat two subp obj
             chain_ = self._chain[:-1]
             chain_.append(self.last | right)
-            p = type(self)(chain_, self._input)
+            p = self._new(chain_, self._input)
             return p
         elif isinstance(right, Pipe):  # concat two Pipe obj
             chain_ = self._chain+right._chain
-            p = type(self)(chain_, self._input)
+            p = self._new(chain_, self._input)
             return p
         elif callable(right):
             chain_ = self._chain + [right]
-            p = type(self)(chain_, self._input)
+            p = self._new(chain_, self._input)
             return p
         elif right is END:
             return self.__call__(self._input)
@@ -129,36 +182,126 @@ class Pipe(CallChain, metaclass=MetaPipe):
             raise type_error(f"{type(self)}.__or__",
                              Union[EndMarker, callable], type(right))
 
+    def __ror__(self, left):
+        """obj | (P | ...), pass obj into a configured pipe."""
+        return self._new(self._chain, left)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        import numpy as np
+        if ufunc is np.bitwise_or and inputs[-1] is self:
+            return self._new(self._chain, inputs[0])
+        else:
+            return NotImplemented
+
     @type_guard
-    def __rshift__(self, right: str) -> "Pipe":
-        chain_ = self._chain + [callable_file(right, 'a')]
-        p = type(self)(chain_, self._input)
+    def __rshift__(self, right: Union[str, partition, write_behind]
+                   ) -> "Pipe":
+        if isinstance(right, Sink):
+            sink = right.appending()
+        else:
+            sink = callable_file(right, 'a')
+        p = self._new(self._chain + [sink], self._input)
         return p
 
     @type_guard
-    def __gt__(self, right: Union[str, EndMarker]):
-        if right is END:  # case:   ... | func > "filename" | END
-            a = END.attach
+    def __gt__(self,
+               right: Union[str, partition, write_behind, EndMarker]):
+        if isinstance(right, EndMarker):  # case:   ... | func > "filename" | END
+            a = right.attach
             if a is None:
                 raise type_error(f"{type(self)}.__gt__", str, EndMarker)
-            elif not isinstance(a, str):
+            elif not isinstance(a, (str,) + Sink):
                 raise type_error(f"{type(self)}.__gt__", str, type(a))
-            p = type(self)(self._chain + [callable_file(a, 'w')], self._input)
+            p = self._new(self._chain + [self._sink(a)], self._input)
             return p(p._input)
         else:
-            p = type(self)(self._chain +
-                           [callable_file(right, 'w')], self._input)
+            p = self._new(self._chain + [self._sink(right)], self._input)
             return p
 
-    def _process(self, func: Callable, old: Any) -> Any:
+    @staticmethod
+    def _sink(target) -> Callable:
+        if isinstance(target, Sink):
+            return target
+        return callable_file(target, 'w')
+
+    def optimize(self, grep: bool = False) -> "Pipe":
+        """Return an equivalent pipe with the optimizer passes applied,
+        the `optimizations` attribute of it record what has been done.
+        With `grep`, filters pushed down into a file source are run
+        by `grep`(see `bramin.pushdown`).
+
+        >>> p = Pipe() | partial(map, placeholder + 1) | partial(filter, None) | list
+        >>> p.optimize().optimizations
+        ('fused map((_x_ + 1)) -> filter(None) -> list into one loop',)
+        """
+        from .optimize import fuse_loops, push_down_filters
+        chain_, pushed = push_down_filters(self._chain, grep)
+        chain_, fused = fuse_loops(chain_)
+        p = self._new(chain_, self._input)
+        p.optimizations = self.optimizations + tuple(pushed + fused)
+        return p
+
+    def explain(self) -> str:
+        """Describe the plan: the kind of each stage, the optimizations
+        applied and the execution mode, see `bramin.explain`.
+
+        >>> print((Pipe() | partial(map, placeholder + 1) | sum).explain())
+        mode: streaming
+          #  kind      stage
+          0  partial   map((_x_ + 1))  (stream)
+          1  function  sum
+        """
+        from .explain import explain
+        return explain(self)
+
+    def analyze(self, _input: Any = None, memory: bool = True):
+        """Run the pipe and measure the time, output rows/bytes and memory
+        of each stage, return a `bramin.explain.Analysis`,
+        it's `result` is the result of the pipe."""
+        from .explain import analyze
+        if _input is None:
+            _input = self._input
+        return analyze(self, _input, memory)
+
+    def pipelined(self, maxsize: int = 16, backend: str = 'thread',
+                  groups: Optional[List[int]] = None, chunksize: int = 16,
+                  **kwargs):
+        """Run stages concurrently in threads or processes connected by
+        bounded queues, see `bramin.pipeline.pipelined`."""
+        from .pipeline import pipelined
+        return pipelined(self, maxsize, backend, groups, chunksize, **kwargs)
+
+    @hybridmethod
+    def chunked(self, rows: int = 100_000, workers: Optional[int] = None,
+                backend: str = 'thread', ordered: bool = True,
+                cost: Optional[Callable] = None,
+                speculate: Optional[float] = None):
+        """Run the stages before `concat` on chunks of `rows` rows,
+        see `bramin.chunk.ChunkedPipe`. Work on both `P` and pipe objects:
+
+            df | P.chunked(rows=10**6) | f | g | concat | END
+        """
+        from .chunk import ChunkedPipe
+        if isinstance(self, type):
+            return ChunkedPipe(rows=rows, workers=workers, backend=backend,
+                               ordered=ordered, cost=cost,
+                               speculate=speculate)
+        return ChunkedPipe(list(self._chain), self._input, rows=rows,
+                           workers=workers, backend=backend, ordered=ordered,
+                           cost=cost, speculate=speculate)
+
+    def distributed(self, workers: List[Tuple[str, int]], **kwargs):
+        """Run the pipe on chunks of input in remote `bramin worker`s,
+        see `bramin.distributed.distributed`."""
+        from .distributed import distributed
+        return distributed(self, workers, **kwargs)
+
+    def _process(self, func: Callable, old: Any, _input: Any) -> Any:
         if isinstance(func, placeholder):
             # placeholder object
             new = placeholder._eval(func, old)
-        elif is_partial_like(func) and \
-            (placeholder in set(func.args) or
-             placeholder in set(func.keywords)):
+        elif is_partial_like(func) and _has_input_arg(func):
             # placeholder in the partial-like parameters
-            # because MetaPlaceHolder reloaded __eq__, shold convert args to set
             # replace placeholder to real pass-in
             func = replace_partial_args(func, placeholder, old)
             func = replace_partial_args(func, placeholder, old,
@@ -187,6 +330,13 @@ class Pipe(CallChain, metaclass=MetaPipe):
         return repr(self)
 
 
+def _has_input_arg(func: Callable) -> bool:
+    """Is there a bare placeholder in a partial-like object's arguments"""
+    # compare with identity, MetaPlaceHolder reloaded __eq__
+    return (any(a is placeholder for a in func.args) or
+            any(v is placeholder for v in func.keywords.values()))
+
+
 class MetaPlaceHolder(type):
     def __init__(ph, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -194,9 +344,9 @@ class MetaPlaceHolder(type):
 
         def make_mths(ph, op, tp, impl):
             def _mimic(self, *args, **kwargs):
-                f = partial(impl, ph, *args, **kwargs)
-                self._append(f)
-                return self
+                if (op == 'getattr') and _is_dunder(args[0]):
+                    raise AttributeError(args[0])
+                return ph._node(impl, (self,) + args, kwargs)
             return _mimic
         _assign_special_methods(ph, make_mths)
 
@@ -207,15 +357,18 @@ class MetaPlaceHolder(type):
         """Support numpy ndarray
         see:
         https://docs.scipy.org/doc/numpy-1.13.0/neps/ufunc-overrides.html"""
-        ph = self()
-        f = partial(ufunc, *inputs, **kwargs)
-        ph._append(f)
-        return ph
+        f = ufunc if method == '__call__' else getattr(ufunc, method)
+        return self._node(f, inputs, kwargs)
+
+
+def _is_dunder(name) -> bool:
+    return isinstance(name, str) and name.startswith('__') and name.endswith('__')
 
 
 def _assign_special_methods(obj, make_mimic):
     def filter_(name, tp):
-        black_list = ['or', 'ror', 'getattribute', 'setattr', 'delattr']
+        black_list = ['or', 'ror', 'getattribute', 'setattr', 'delattr',
+                      'setitem', 'delitem']
         if name in black_list:
             return False
         return True
@@ -226,48 +379,177 @@ def _assign_special_methods(obj, make_mimic):
         filter_,
         with_impl=True
     ):
+        if _impl is None:
+            continue
         setattr(obj, f"__{_op}__", make_mimic(obj, _op, _tp, _impl))
 
 
 def _make_meta_mths(obj, op, tp, impl):
     def _mimic(self, *args, **kwargs):
-        ph = self()
-        f = partial(impl, self, *args, **kwargs)
-        ph._append(f)
-        return ph
+        if (op == 'getattr') and _is_dunder(args[0]):
+            raise AttributeError(args[0])
+        return self._node(impl, (self,) + args, kwargs)
     return _mimic
 
 
 _assign_special_methods(MetaPlaceHolder, _make_meta_mths)
 
 
-class placeholder(CallChain, metaclass=MetaPlaceHolder):
+_op_symbols = {
+    operator.add: '+', operator.sub: '-', operator.mul: '*',
+    operator.matmul: '@', operator.truediv: '/', operator.floordiv: '//',
+    operator.mod: '%', operator.pow: '**', operator.lshift: '<<',
+    operator.rshift: '>>', operator.and_: '&', operator.xor: '^',
+    operator.lt: '<', operator.le: '<=', operator.eq: '==',
+    operator.ne: '!=', operator.gt: '>', operator.ge: '>=',
+}
+
+
+class placeholder(metaclass=MetaPlaceHolder):
+    """Immutable expression node, the class itself stands for the input.
+
+    Operating on a placeholder never modify it, but return a new node.
+    Nodes are hash-consed: build the same expression twice get the same
+    node, and sub-expressions used several times are evaluated only once:
+
+    >>> e = (placeholder + 1) * (placeholder + 1)
+    >>> e._func is operator.mul and e._args[0] is e._args[1]
+    True
+    >>> e(2)
+    9
+    """
+
+    __slots__ = ('_func', '_args', '_kwargs', '_fn', '__weakref__')
+
+    # structural key -> node, the node keeps the key's objects alive
+    _cache = weakref.WeakValueDictionary()
+
+    def __new__(cls, *args, **kwargs):
+        """placeholder() return the identity node"""
+        return cls._node(None, (), {})
+
+    @classmethod
+    def _node(cls, func: Optional[Callable], args: tuple, kwargs: dict) -> Any:
+        """Get(or create) the node of `func(*args, **kwargs)`."""
+        args = tuple(placeholder if _is_identity(a) else a for a in args)
+        kwargs = {k: (placeholder if _is_identity(v) else v)
+                  for k, v in kwargs.items()}
+        if (func is not None) and not (
+                any(_depends(a) for a in args) or
+                any(_depends(v) for v in kwargs.values())):
+            # constant folding, nothing depends on the input
+            return func(*args, **kwargs)
+        key = (_obj_key(func),
+               tuple(_obj_key(a) for a in args),
+               tuple((k, _obj_key(v)) for k, v in sorted(kwargs.items())))
+        node = cls._cache.get(key)
+        if node is None:
+            node = object.__new__(cls)
+            node._func = func
+            node._args = args
+            node._kwargs = kwargs
+            node._fn = None
+            node = cls._cache.setdefault(key, node)
+        return node
+
+    def __call__(self, _input=None):
+        fn = self._fn
+        if fn is None:
+            # compile lazily, racing threads compile the same thing
+            fn = self._fn = self._compile()
+        return fn(_input)
+
+    def _nodes(self) -> List["placeholder"]:
+        """All distinct nodes of this expression, in evaluation order."""
+        # post-order walk with an explicit stack, deep expressions(long
+        # chains of operations) do not hit the recursion limit
+        order, seen = [], {id(self)}
+        stack = [(self, _children(self))]
+        while stack:
+            n, children = stack[-1]
+            for a in children:
+                if id(a) not in seen:
+                    seen.add(id(a))
+                    stack.append((a, _children(a)))
+                    break
+            else:
+                stack.pop()
+                order.append(n)
+        return order
+
+    def _codegen(self, var: str = '_x', prefix: str = '_t'
+                 ) -> Tuple[List[str], str, dict]:
+        """Generate python statements evaluate this expression on `var`,
+        every distinct node computed once.
+
+        return (statements, result expression, namespace)"""
+        ns, names, lines = {}, {}, []
+
+        def ref(v):
+            if v is placeholder:
+                return var
+            elif isinstance(v, placeholder):
+                return names[id(v)]
+            else:
+                name = f"{prefix}c{len(ns)}"
+                ns[name] = v
+                return name
+
+        for idx, n in enumerate(self._nodes()):
+            if n._func is None:  # identity
+                names[id(n)] = var
+                continue
+            fname = f"{prefix}f{idx}"
+            ns[fname] = n._func
+            params = [ref(a) for a in n._args]
+            if n._kwargs:
+                kw = f"{prefix}k{idx}"
+                ns[kw] = tuple(n._kwargs)
+                vals = ", ".join([ref(v) for v in n._kwargs.values()])
+                params.append(f"**dict(zip({kw}, ({vals},)))")
+            names[id(n)] = f"{prefix}{idx}"
+            lines.append(f"{prefix}{idx} = {fname}({', '.join(params)})")
+        return lines, names[id(self)], ns
+
+    def _compile(self) -> Callable:
+        lines, res, ns = self._codegen()
+        body = "".join([f"    {l}\n" for l in lines])
+        src = f"def _ph(_x):\n{body}    return {res}\n"
+        exec(compile(src, f"<placeholder {self!r}>", "exec"), ns)
+        return ns['_ph']
 
     def __index__(self):
         return id(self)
 
-    def __repr__(self) -> str:
-        return f'<ph at {hex(id(self))}>'
+    def __setitem__(self, key, value):
+        raise TypeError("placeholder expression is immutable.")
 
-    def _process(self, func: Callable, old: Any) -> Any:
-        if is_partial_like(func):
-            # replace placeholder to real pass-in
-            func = replace_partial_args(func, placeholder, old,
-                                        match_func=lambda i, v, t: (i == 0) and v is t)
-            func = replace_partial_args(func, placeholder, self._input,
-                                        match_func=lambda i, v, t: (i > 0) and v is t)
-            if func.func is operator.getitem:
-                def _replace(v, r):
-                    return v(r) if len(v._chain) > 0 else old
-                func = replace_partial_args(
-                    func, placeholder, old,
-                    match_func=lambda i, v, t: isinstance(v, t),
-                    replace_func=_replace
-                )
-            new = func()
-        else:
-            new = func(old)
-        return new
+    def __delitem__(self, key):
+        raise TypeError("placeholder expression is immutable.")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        if self._func is None:
+            return (placeholder, ())
+        # pickled as a flat list of nodes, not nested
+        nodes = self._nodes()
+        idx = {id(n): i for i, n in enumerate(nodes)}
+
+        def ref(v):
+            return _NodeRef(idx[id(v)]) if isinstance(v, placeholder) else v
+
+        return (_rebuild, ([
+            (n._func, tuple(ref(a) for a in n._args),
+             {k: ref(v) for k, v in n._kwargs.items()})
+            for n in nodes],))
+
+    def __repr__(self) -> str:
+        return _format_node(self)
 
     @classmethod
     def _eval(cls, ph, _input):
@@ -277,6 +559,107 @@ class placeholder(CallChain, metaclass=MetaPlaceHolder):
             return ph
 
     def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
-        f = partial(ufunc, *inputs, **kwargs)
-        self._append(f)
-        return self
+        f = ufunc if method == '__call__' else getattr(ufunc, method)
+        return self._node(f, inputs, kwargs)
+
+
+def _is_identity(obj) -> bool:
+    return isinstance(obj, placeholder) and obj._func is None
+
+
+def _depends(obj) -> bool:
+    """Is the obj depends on the input?"""
+    return (obj is placeholder) or isinstance(obj, placeholder)
+
+
+def _obj_key(obj) -> tuple:
+    """Structural key of a node's component."""
+    if obj is placeholder:
+        return ('x',)
+    elif isinstance(obj, placeholder):
+        # nodes are hash-consed, identity is structural equality
+        return ('n', id(obj))
+    elif type(obj) is tuple:
+        return ('t', tuple(_obj_key(o) for o in obj))
+    elif type(obj) is slice:
+        return ('s', _obj_key(obj.start), _obj_key(obj.stop),
+                _obj_key(obj.step))
+    try:
+        hash(obj)
+    except TypeError:
+        # unhashable, the node holding it keep the id valid
+        return ('i', id(obj))
+    if type(obj) in (float, complex):
+        # 0.0 == -0.0, but they are not the same constant
+        return ('f', type(obj), repr(obj))
+    return ('c', type(obj), obj)
+
+
+def _children(n) -> Iterator:
+    """The sub-expressions of node `n`."""
+    for a in n._args + tuple(n._kwargs.values()):
+        if isinstance(a, placeholder):
+            yield a
+
+
+class _NodeRef(object):
+    """Index of a node in the pickled list of nodes."""
+    __slots__ = ('idx',)
+
+    def __init__(self, idx: int):
+        self.idx = idx
+
+    def __reduce__(self):
+        return (_NodeRef, (self.idx,))
+
+
+def _rebuild(nodes: list) -> placeholder:
+    built = []
+
+    def get(v):
+        return built[v.idx] if isinstance(v, _NodeRef) else v
+
+    for func, args, kwargs in nodes:
+        built.append(placeholder._node(
+            func, tuple(get(a) for a in args),
+            {k: get(v) for k, v in kwargs.items()}))
+    return built[-1]
+
+
+def _format_node(n) -> str:
+    # format the sub-expressions first, without recursion
+    done = {}
+    for node in n._nodes():
+        done[id(node)] = _format_one(node, done)
+    return done[id(n)]
+
+
+def _format_one(n, done: dict) -> str:
+    def fmt(v):
+        if v is placeholder or _is_identity(v):
+            return repr(placeholder)
+        elif isinstance(v, placeholder):
+            res = done.get(id(v))
+            return _format_node(v) if res is None else res
+        elif type(v) is slice:
+            return ":".join(
+                ["" if i is None else fmt(i) for i in (v.start, v.stop)] +
+                ([] if v.step is None else [fmt(v.step)]))
+        else:
+            return repr(v)
+    func, args = n._func, n._args
+    if func is None:
+        return repr(placeholder)
+    if (func in _op_symbols) and len(args) == 2:
+        return f"({fmt(args[0])} {_op_symbols[func]} {fmt(args[1])})"
+    rev = getattr(func, 'func', None)
+    if (rev in _op_symbols) and len(args) == 2:  # reversed operator
+        return f"({fmt(args[1])} {_op_symbols[rev]} {fmt(args[0])})"
+    if func is getattr and len(args) == 2:
+        return f"{fmt(args[0])}.{args[1]}"
+    if func is operator.getitem:
+        return f"{fmt(args[0])}[{fmt(args[1])}]"
+    params = [fmt(a) for a in args] + \
+        [f"{k}={fmt(v)}" for k, v in n._kwargs.items()]
+    fname = getattr(func, '__name__', repr(func))
+    return f"{fname}({', '.join(params)})"
@@ -0,0 +1,327 @@
+"""Pipelined execution: stages run concurrently like a unix pipeline."""
+
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+from collections.abc import Iterator as IteratorABC
+import pickle
+import queue
+import time
+
+from .executor import (
+    check_backend, worker_backend, start_worker, stop_worker, make_queue,
+    make_event, put_until, qsize,
+)
+from .subp import collect_stats
+from .cancel import CancelToken
+from . import shm
+
+
+class _Stopped(Exception):
+    """The run is stopped by downstream."""
+
+
+def _get_until(q, stop, poll: float = 0.1):
+    while True:
+        try:
+            return q.get(timeout=poll)
+        except queue.Empty:
+            if stop.is_set():
+                raise _Stopped()
+
+
+def _picklable_exc(exc: BaseException) -> BaseException:
+    try:
+        pickle.dumps(exc)
+        return exc
+    except Exception:
+        return RuntimeError(f"{type(exc).__name__}: {exc}")
+
+
+class _Channel(object):
+    """One end of the bounded queue between two stages.
+
+    Messages are tuples: ('items', list) ('scalar', value)
+    ('end', stats) ('error', exception). In process backend they are
+    pickled before put, so the errors come out synchronously, and big
+    ndarrays are sent through shared memory(when `shm_prefix` is given).
+    """
+
+    def __init__(self, q, stop, backend: str,
+                 shm_prefix: Optional[str] = None,
+                 shm_min_bytes: int = shm.MIN_BYTES):
+        self.q = q
+        self.stop = stop
+        self.pickled = (backend == 'process')
+        self.shm_prefix = shm_prefix
+        self.shm_min_bytes = shm_min_bytes
+        self.wait = 0.0     # time blocked on the queue
+        self.depths = []    # sampled queue depth at each put
+
+    def put(self, msg) -> bool:
+        if self.pickled:
+            if self.shm_prefix is not None:
+                msg = shm.share(msg, self.shm_prefix, self.shm_min_bytes)
+            msg = pickle.dumps(msg, pickle.HIGHEST_PROTOCOL)
+        self.depths.append(qsize(self.q))
+        t = time.perf_counter()
+        ok = put_until(self.q, msg, self.stop)
+        self.wait += time.perf_counter() - t
+        return ok
+
+    def get(self):
+        t = time.perf_counter()
+        msg = _get_until(self.q, self.stop)
+        self.wait += time.perf_counter() - t
+        if self.pickled:
+            msg = pickle.loads(msg)
+            if self.shm_prefix is not None:
+                msg = shm.restore(msg)
+        return msg
+
+
+def _receive(ch: _Channel, upstream_stats: list) -> Any:
+    """Turn the messages from upstream back into the stage's input:
+    the value itself, or an iterator over the streamed items."""
+    kind, payload = ch.get()
+    if kind == 'scalar':
+        value = payload
+        kind, payload = ch.get()
+        if kind == 'error':
+            raise payload
+        upstream_stats.extend(payload)
+        return value
+    elif kind == 'error':
+        raise payload
+    return _iter_channel(ch, kind, payload, upstream_stats)
+
+
+def _iter_channel(ch: _Channel, kind, payload, upstream_stats) -> Iterator:
+    while True:
+        if kind == 'items':
+            yield from payload
+        elif kind == 'end':
+            upstream_stats.extend(payload)
+            return
+        else:  # error
+            raise payload
+        kind, payload = ch.get()
+
+
+def _is_stream(obj) -> bool:
+    """Only iterators are streamed downstream, other objects(list, str,
+    DataFrame ...) are passed as a whole to keep the stage semantic."""
+    return isinstance(obj, IteratorABC)
+
+
+def _run_stage(stage: Callable, idx: int, _input: Any,
+               inq, outq, stop, backend: str, chunksize: int,
+               shm_args: tuple = (), token: Optional[CancelToken] = None):
+    """Worker body: apply a stage(group) to the upstream, send downstream.
+    `token` is only given in thread backend."""
+    t0 = time.perf_counter()
+    out = _Channel(outq, stop, backend, *shm_args)
+    inp = _Channel(inq, stop, backend, *shm_args) if inq is not None else None
+    upstream_stats, n_out = [], 0
+    try:
+        if inp is not None:
+            _input = _receive(inp, upstream_stats)
+        with collect_stats() as procs:
+            res = stage(_input) if token is None \
+                else stage(_input, token=token)
+            if _is_stream(res):
+                buf = []
+                for item in res:
+                    buf.append(item)
+                    if len(buf) >= chunksize:
+                        n_out += len(buf)
+                        if not out.put(('items', buf)):
+                            raise _Stopped()
+                        buf = []
+                if buf:
+                    n_out += len(buf)
+                    if not out.put(('items', buf)):
+                        raise _Stopped()
+            else:
+                n_out = 1
+                if not out.put(('scalar', res)):
+                    raise _Stopped()
+        wall = time.perf_counter() - t0
+        stats = _stage_stats(stage, idx, wall, inp, out, n_out, procs)
+        out.put(('end', upstream_stats + [stats]))
+    except _Stopped:
+        if backend == 'process':
+            # nobody will read it, do not wait the queue's flushing at exit
+            outq.cancel_join_thread()
+    except BaseException as e:
+        out.put(('error', _picklable_exc(e)))
+
+
+def _stage_stats(stage, idx: int, wall: float,
+                 inp: Optional[_Channel], out: Optional[_Channel],
+                 n_out: int, procs: list = ()) -> dict:
+    wait = (inp.wait if inp else 0.0) + (out.wait if out else 0.0)
+    busy = max(wall - wait, 0.0)
+    depths = [d for d in (out.depths if out else []) if d >= 0]
+    stats = {
+        'stage': idx,
+        'name': repr(stage),
+        'items_out': n_out,
+        'wall': wall,
+        'busy': busy,
+        'occupancy': busy / wall if wall > 0 else 0.0,
+        'queue_max': max(depths) if depths else 0,
+        'queue_mean': sum(depths) / len(depths) if depths else 0.0,
+    }
+    # resource usage of the external commands run by the stage
+    if procs:
+        stats['subp'] = [s.as_dict() for s in procs]
+    return stats
+
+
+class pipelined(object):
+    """Run a pipe's stages concurrently, each stage(or group of stages)
+    in it's own thread or process, connected by bounded queues.
+
+    Stages returning iterators are streamed downstream element by element
+    (sent in chunks of `chunksize`), so the throughput of the whole pipe
+    approach the slowest stage instead of the sum of all stages.
+    Other return values are passed downstream as a whole.
+    The last group runs in the caller's thread.
+
+    With process backend, ndarrays(also columns of DataFrame/Series) larger
+    than `shm_min_bytes` are moved through shared memory instead of
+    pickling, set it to None to disable.
+
+    The stats of each run(one dict per stage group) are passed to
+    `on_stats`, given here or to the call.
+
+    >>> from bramin import P
+    >>> stats = []
+    >>> p = pipelined(P | (lambda xs: (x + 1 for x in xs)) | sum,
+    ...               on_stats=stats.append)
+    >>> p(range(10))
+    55
+    >>> [s['items_out'] for s in stats[0]]
+    [10, 1]
+    """
+
+    def __init__(self, pipe, maxsize: int = 16,
+                 backend: str = 'thread',
+                 groups: Optional[Sequence[int]] = None,
+                 chunksize: int = 16,
+                 shm_min_bytes: Optional[int] = shm.MIN_BYTES,
+                 on_stats: Optional[Callable[[List[dict]], Any]] = None):
+        check_backend(backend)
+        self.pipe = pipe
+        self.maxsize = maxsize
+        self.backend = backend
+        self.chunksize = chunksize
+        self.shm_min_bytes = shm_min_bytes
+        self.stages = self._split(pipe, groups)
+        self.on_stats = on_stats
+
+    @staticmethod
+    def _split(pipe, groups: Optional[Sequence[int]]) -> list:
+        chain_ = pipe._chain
+        if groups is None:
+            groups = [1] * len(chain_)
+        if sum(groups) != len(chain_) or any(g <= 0 for g in groups):
+            raise ValueError(
+                f"groups {list(groups)} does not cover {len(chain_)} stages.")
+        stages, start = [], 0
+        for g in groups:
+            stages.append(type(pipe)(chain_[start:start+g]))
+            start += g
+        return stages
+
+    def __call__(self, _input=None, *, timeout: Optional[float] = None,
+                 token: Optional[CancelToken] = None,
+                 on_stats: Optional[Callable[[List[dict]], Any]] = None):
+        """Run it, with a `timeout` or cancel `token` like `Pipe.__call__`,
+        the workers are stopped when it's cancelled. `on_stats` of this
+        run replace the one of the object."""
+        if on_stats is None:
+            on_stats = self.on_stats
+        if _input is None:
+            _input = self.pipe._input
+        n = len(self.stages)
+        if n == 1:
+            return self.stages[0](_input, timeout=timeout, token=token)
+        if timeout is not None or token is not None:
+            token = CancelToken(timeout, parent=token)
+        backend = worker_backend(self.backend)
+        stop = make_event(backend)
+        queues = [make_queue(backend, self.maxsize) for _ in range(n - 1)]
+        shm_args = ()
+        if backend == 'process' and self.shm_min_bytes is not None:
+            shm_args = (shm.new_prefix(), self.shm_min_bytes)
+        workers = []
+        for k in range(n - 1):
+            inq = queues[k - 1] if k > 0 else None
+            workers.append(start_worker(
+                backend, _run_stage,
+                (self.stages[k], k, _input if k == 0 else None,
+                 inq, queues[k], stop, backend, self.chunksize, shm_args,
+                 token if backend == 'thread' else None)))
+        unregister = token.on_cancel(stop.set) if token is not None \
+            else None
+
+        def cleanup():
+            stop.set()
+            for w in workers:
+                stop_worker(w)
+            if shm_args:  # segments not consumed because of early stop
+                shm.cleanup(shm_args[0])
+            if token is not None:
+                unregister()
+                token.release()
+
+        t0 = time.perf_counter()
+        inp = _Channel(queues[-1], stop, backend, *shm_args)
+        upstream_stats = []
+        try:
+            last = self.stages[-1]
+            upstream = _receive(inp, upstream_stats)
+            # the output of the subp calls may be consumed later, their
+            # stats are added to `procs` at exit
+            with collect_stats() as procs:
+                res = last(upstream) if token is None \
+                    else last(upstream, token=token)
+        except _Stopped:
+            cleanup()
+            token.check()  # only stopped by the token
+            raise
+        except BaseException:
+            cleanup()
+            raise
+        if _is_stream(res):
+            return self._stream(res, cleanup, t0, inp, upstream_stats,
+                                token, procs, on_stats)
+        cleanup()
+        self._finish(t0, inp, upstream_stats, 1, procs, on_stats)
+        return res
+
+    def _stream(self, res, cleanup, t0, inp, upstream_stats, token, procs,
+                on_stats):
+        n = 0
+        try:
+            for item in res:
+                n += 1
+                yield item
+            self._finish(t0, inp, upstream_stats, n, procs, on_stats)
+        except _Stopped:
+            token.check()
+            raise
+        finally:
+            cleanup()
+
+    def _finish(self, t0, inp, upstream_stats, n_out, procs, on_stats):
+        if on_stats is None:
+            return
+        wall = time.perf_counter() - t0
+        last = _stage_stats(self.stages[-1], len(self.stages) - 1,
+                            wall, inp, None, n_out, procs)
+        on_stats(upstream_stats + [last])
+
+    def __repr__(self) -> str:
+        stages = " | ".join([repr(s) for s in self.stages])
+        return f"<pipelined({self.backend}) {stages}>"
@@ -0,0 +1,254 @@
+"""Filters can be pushed down into the file reading.
+
+Predicates built by `startswith`, `contains`, `matches`(or the placeholder
+expression `it[:n] == s`) can also be checked on the raw bytes of lines,
+or by `grep`. `Pipe.optimize` use them to filter the lines of a file
+before they are decoded into python strings:
+
+    p = "huge.tsv.gz" >> P | c(filter, startswith("chr1")) | ...
+    p.optimize()             # filter raw bytes in the reader
+    p.optimize(grep=True)    # or run `gzip -dc huge.tsv.gz | grep ...`
+
+The lines are split like `text_file` does(universal newlines), the raw
+lines with a '\r' are decoded and checked as strings. `grep` only
+pre-selects the raw lines, the filters are checked again after it.
+"""
+
+from typing import Any, Callable, List, Optional
+from subprocess import CalledProcessError
+import operator
+import codecs
+import locale
+import shlex
+import re
+
+from .pipe import placeholder
+from .io import callable_file, universal_lines
+
+
+class _pred(object):
+    """Line predicate, also usable on the raw bytes of the line."""
+
+    def bytes_pred(self) -> Optional[Callable[[bytes], bool]]:
+        """Equivalent predicate on utf-8 bytes, None if there is not."""
+        return None
+
+    def grep_args(self) -> Optional[List[str]]:
+        """Arguments of `LC_ALL=C grep` select(at least) the raw lines
+        contain a line selected by the predicate, once '\r' is treated
+        as a line end."""
+        return None
+
+
+class startswith(_pred):
+    """
+    >>> list(filter(startswith("chr1"), ["chr1\\t1\\n", "chr2\\t1\\n"]))
+    ['chr1\\t1\\n']
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def __call__(self, line: str) -> bool:
+        return line.startswith(self.prefix)
+
+    def bytes_pred(self):
+        return _bind(bytes.startswith, self.prefix.encode())
+
+    def grep_args(self):
+        if '\n' in self.prefix or '\r' in self.prefix:
+            return None
+        return ['-E', '-e', '(^|\r)' + _ere_escape(self.prefix)]
+
+    def __repr__(self) -> str:
+        return f"startswith({self.prefix!r})"
+
+
+class contains(_pred):
+    def __init__(self, sub: str):
+        self.sub = sub
+
+    def __call__(self, line: str) -> bool:
+        return self.sub in line
+
+    def bytes_pred(self):
+        # utf-8 is self-synchronizing, substring of chars <=> of bytes
+        return _bind(bytes.__contains__, self.sub.encode())
+
+    def grep_args(self):
+        if '\n' in self.sub or '\r' in self.sub or not self.sub:
+            return None
+        return ['-F', '-e', self.sub]
+
+    def __repr__(self) -> str:
+        return f"contains({self.sub!r})"
+
+
+# the regex syntax behave the same on str/bytes and in `grep -E`:
+# printable ascii literals, classes of them(not negated, they would match
+# a part of a multi-bytes char), groups, '|', anchors and greedy '*+?'.
+# No '.', escapes, '{', '(?...)', lazy or possessive quantifiers.
+_PORTABLE_REGEX = re.compile(r"""
+    (?: [ !"#%&',\-/-;<=>@-Z_`-z~\t]     # literal
+      | \[ [ !"#%&',\-/-;<=>@-Z_`-z~]+ \]  # class
+      | [()|^$]
+      | (?<![(|^$*+?]) [*+?] (?![*+?])  # quantifier, on something
+    )*""", re.X)
+
+
+class matches(_pred):
+    """Line matches the regex(`re.search`)."""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self._re = re.compile(pattern, flags)
+
+    def __call__(self, line: str) -> bool:
+        return self._re.search(line) is not None
+
+    def _portable(self) -> bool:
+        return self.flags == 0 and \
+            _PORTABLE_REGEX.fullmatch(self.pattern) is not None
+
+    def bytes_pred(self):
+        if not self._portable():
+            return None
+        search = re.compile(self.pattern.encode()).search
+        return lambda b: search(b) is not None
+
+    def grep_args(self):
+        if not self._portable():
+            return None
+        # the anchors also match around a '\r'
+        pattern = self.pattern.replace('^', '(^|\r)').replace('$', '(\r|$)')
+        return ['-E', '-e', pattern]
+
+    def __repr__(self) -> str:
+        return f"matches({self.pattern!r})"
+
+
+def _bind(method: Callable, arg: Any) -> Callable[[bytes], bool]:
+    return lambda b: method(b, arg)
+
+
+def _ere_escape(s: str) -> str:
+    return re.sub(r'([.\[\]()*+?{}|^$\\])', r'\\\1', s)
+
+
+def as_pushable(pred: Any) -> Optional[_pred]:
+    """Return the predicate can be pushed down, recognize the placeholder
+    expression `it[:n] == s` as `startswith(s)`.
+
+    >>> as_pushable(placeholder[:4] == "chr1")
+    startswith('chr1')
+    """
+    if isinstance(pred, _pred):
+        return pred
+    if isinstance(pred, placeholder) and pred._func is operator.eq:
+        left, right = pred._args
+        if isinstance(right, placeholder):
+            left, right = right, left
+        if isinstance(left, placeholder) and isinstance(right, str) and \
+                left._func is operator.getitem and \
+                left._args[0] is placeholder:
+            s = left._args[1]
+            if isinstance(s, slice) and s.start in (None, 0) and \
+                    s.step is None and s.stop == len(right):
+                return startswith(right)
+    return None
+
+
+def pushable_source(stage: Any) -> bool:
+    """A callable_file reading a line oriented file in utf-8, without
+    other opener arguments(`errors`, `newline` ... change the lines)."""
+    if not isinstance(stage, callable_file) or stage._follow is not None:
+        return False
+    fname, args, kwargs = stage._args
+    mode = stage._get_mode(stage._ftype.opener, args, kwargs)
+    if not (('r' in mode) and stage._ftype.line_oriented) or len(args) > 1:
+        return False
+    extra = {k: v for k, v in kwargs.items() if k != 'mode'}
+    encoding = extra.pop('encoding', None)
+    if extra:
+        return False
+    if encoding is None:  # decoded in the locale's encoding
+        encoding = locale.getpreferredencoding(False)
+    return _is_utf8(encoding)
+
+
+def _is_utf8(encoding: str) -> bool:
+    try:
+        return codecs.lookup(encoding).name == 'utf-8'
+    except LookupError:
+        return False
+
+
+class filtered_file(object):
+    """Read the lines of a file, only the lines pass all the predicates
+    (checked on raw bytes) are decoded. The lines with a '\r' are split
+    like in `text_file`, and checked after decoding."""
+
+    def __init__(self, source: callable_file, preds: List[_pred],
+                 encoding: str = 'utf-8'):
+        self.source = source
+        self.preds = preds
+        self.encoding = encoding
+        self._checks = [p.bytes_pred() for p in preds]
+
+    def __call__(self, _=None):
+        fname = self.source._args[0]
+        fh = self.source._ftype.opener(fname, mode='rb')
+        return self._read(fh)
+
+    def _read(self, fh):
+        checks, encoding = self._checks, self.encoding
+        try:
+            if len(checks) == 1:
+                check = checks[0]
+                for line in fh:
+                    if b'\r' in line:
+                        yield from self._split_check(line)
+                    elif check(line):
+                        yield line.decode(encoding)
+            else:
+                for line in fh:
+                    if b'\r' in line:
+                        yield from self._split_check(line)
+                    elif all(c(line) for c in checks):
+                        yield line.decode(encoding)
+        finally:
+            fh.close()
+
+    def _split_check(self, line: bytes):
+        for line_ in universal_lines(line.decode(self.encoding)):
+            if all(p(line_) for p in self.preds):
+                yield line_
+
+    def __repr__(self) -> str:
+        preds = " and ".join(repr(p) for p in self.preds)
+        return f"<filtered_file {self.source._args[0]} where {preds}>"
+
+
+def check_grep(stats):
+    """`on_exit` of the grep command, exit status 1 is no line selected,
+    2 is an error(file not found ...)."""
+    if stats.returncode is not None and stats.returncode >= 2:
+        raise CalledProcessError(stats.returncode, stats.cmd)
+
+
+def grep_command(source: callable_file, preds: List[_pred]) -> Optional[str]:
+    """Shell command output the raw lines of the file may pass the
+    predicates(see `_pred.grep_args`)."""
+    args = [p.grep_args() for p in preds]
+    if any(a is None for a in args):
+        return None
+    fname = shlex.quote(source._args[0])
+    name = source._ftype.name
+    greps = [f"LC_ALL=C grep {' '.join(shlex.quote(x) for x in a)}"
+             for a in args]
+    if name == 'gzipped_text':
+        return " | ".join([f"gzip -dc -- {fname}"] + greps)
+    elif name == 'text':
+        return " | ".join([f"{greps[0]} -- {fname}"] + greps[1:])
+    return None
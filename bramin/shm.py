@@ -0,0 +1,193 @@
+"""Move ndarrays(and DataFrame/Series columns) between processes through
+shared memory segments, only a small descriptor is pickled.
+
+The producer copy the array into a new segment and hand it over,
+the consumer maps the segment and unlinks it's name immediately,
+so the memory is freed once the last array viewing it is gone.
+"""
+
+from typing import Any, Optional
+from multiprocessing import shared_memory
+import itertools
+import mmap
+import glob
+import sys
+import os
+import uuid
+
+
+MIN_BYTES = 1 << 16  # smaller arrays are cheaper to pickle
+_SHM_DIR = '/dev/shm'
+
+_counter = itertools.count()
+
+
+def new_prefix() -> str:
+    """Segment name prefix of one run, used for cleaning up."""
+    return f"bramin_{uuid.uuid4().hex[:12]}_"
+
+
+class SharedArray(object):
+    """Descriptor of an ndarray placed in a shared memory segment."""
+
+    __slots__ = ('name', 'shape', 'dtype', 'nbytes')
+
+    def __init__(self, name: str, shape: tuple, dtype: str, nbytes: int):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.nbytes = nbytes
+
+    def __getstate__(self):
+        return (self.name, self.shape, self.dtype, self.nbytes)
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype, self.nbytes = state
+
+    def __repr__(self) -> str:
+        return f"<SharedArray {self.name} {self.dtype}{list(self.shape)}>"
+
+
+class SharedFrame(object):
+    """Descriptor of a pandas DataFrame/Series, numeric columns are shared."""
+
+    __slots__ = ('kind', 'columns', 'index', 'names')
+
+    def __init__(self, kind: str, columns: list, index: Any, names: list):
+        self.kind = kind
+        self.columns = columns
+        self.index = index
+        self.names = names
+
+    def __getstate__(self):
+        return (self.kind, self.columns, self.index, self.names)
+
+    def __setstate__(self, state):
+        self.kind, self.columns, self.index, self.names = state
+
+
+def _create_segment(name: str, size: int) -> shared_memory.SharedMemory:
+    try:  # python >= 3.13
+        return shared_memory.SharedMemory(
+            name=name, create=True, size=size, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        # the consumer own the segment, stop our resource tracker unlink it
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _share_array(arr, prefix: str) -> SharedArray:
+    import numpy as np
+    name = f"{prefix}{os.getpid()}_{next(_counter)}"
+    shm = _create_segment(name, arr.nbytes)
+    view = np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)
+    view[...] = arr
+    del view
+    shm.close()
+    return SharedArray(name, arr.shape, arr.dtype.str, arr.nbytes)
+
+
+def _restore_array(desc: SharedArray):
+    import numpy as np
+    path = os.path.join(_SHM_DIR, desc.name)
+    if os.path.isdir(_SHM_DIR):
+        fd = os.open(path, os.O_RDWR)
+        try:
+            mm = mmap.mmap(fd, desc.nbytes)
+        finally:
+            os.close(fd)
+        # the mapping keeps the memory, freed with the last array use it
+        os.unlink(path)
+        return np.ndarray(desc.shape, np.dtype(desc.dtype), buffer=mm)
+    else:  # no /dev/shm, fallback to copy
+        shm = shared_memory.SharedMemory(name=desc.name)
+        arr = np.ndarray(desc.shape, np.dtype(desc.dtype),
+                         buffer=shm.buf).copy()
+        shm.close()
+        shm.unlink()
+        return arr
+
+
+def _is_shareable(arr, min_bytes: int) -> bool:
+    return (arr.nbytes >= min_bytes) and (not arr.dtype.hasobject) \
+        and arr.dtype.kind not in 'OV'
+
+
+def share(obj: Any, prefix: str, min_bytes: int = MIN_BYTES) -> Any:
+    """Replace the big ndarrays(also in DataFrame, Series, list, tuple
+    and dict) in obj with shared memory descriptors."""
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    tp = type(obj)
+    if tp in (list, tuple):
+        return tp([share(o, prefix, min_bytes) for o in obj])
+    elif tp is dict:
+        return {k: share(v, prefix, min_bytes) for k, v in obj.items()}
+    elif np is not None and tp is np.ndarray:
+        if _is_shareable(obj, min_bytes):
+            return _share_array(obj, prefix)
+        return obj
+    elif pd is not None and isinstance(obj, (pd.DataFrame, pd.Series)):
+        return _share_frame(obj, prefix, min_bytes)
+    return obj
+
+
+def _share_frame(obj, prefix: str, min_bytes: int):
+    import numpy as np
+    import pandas as pd
+    if isinstance(obj, pd.Series):
+        kind, names, cols = 'series', [obj.name], [obj]
+    else:
+        kind, names = 'frame', list(obj.columns)
+        cols = [obj.iloc[:, i] for i in range(obj.shape[1])]
+    shared, any_shared = [], False
+    for col in cols:
+        if isinstance(col.dtype, np.dtype):
+            arr = col.to_numpy(copy=False)
+            if _is_shareable(arr, min_bytes):
+                shared.append(_share_array(arr, prefix))
+                any_shared = True
+                continue
+        shared.append(col)
+    if not any_shared:
+        return obj
+    return SharedFrame(kind, shared, obj.index, names)
+
+
+def restore(obj: Any) -> Any:
+    """Reverse of `share`, arrays are mapped without copying."""
+    tp = type(obj)
+    if tp in (list, tuple):
+        return tp([restore(o) for o in obj])
+    elif tp is dict:
+        return {k: restore(v) for k, v in obj.items()}
+    elif tp is SharedArray:
+        return _restore_array(obj)
+    elif tp is SharedFrame:
+        return _restore_frame(obj)
+    return obj
+
+
+def _restore_frame(desc: SharedFrame):
+    import pandas as pd
+    cols = []
+    for c in desc.columns:
+        if type(c) is SharedArray:
+            c = pd.Series(_restore_array(c), index=desc.index, copy=False)
+        cols.append(c)
+    if desc.kind == 'series':
+        return cols[0].rename(desc.names[0])
+    df = pd.DataFrame(dict(enumerate(cols)), index=desc.index, copy=False)
+    df.columns = desc.names
+    return df
+
+
+def cleanup(prefix: str):
+    """Unlink the segments of a run never restored by a consumer."""
+    for path in glob.glob(os.path.join(_SHM_DIR, glob.escape(prefix) + '*')):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,188 @@
+"""Sort streams larger than the memory.
+
+The records are collected into runs of about `memory_limit` bytes, each
+run is sorted and spilled to a compressed temp file, then the runs are
+merged lazily. The merged stream is the same as `sorted`(it's stable).
+
+    "huge.txt" >> P | sort_stream(key=lambda l: l.split('\\t')[1]) > "out.txt" | END
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+from itertools import chain
+import tempfile
+import weakref
+import shutil
+import heapq
+import shlex
+import re
+import sys
+import os
+
+from .io import callable_file
+from .executor import check_backend, pmap
+from .subp import subp
+
+
+# a key definition of GNU sort, and it's ordering options
+_KEY_OPTS = re.compile(r'(-k\s*|--key=)[\d.,]+([bdfghinMRrV]*)')
+
+
+def _size(rec: Any) -> int:
+    # shallow, plus the slot in the run list
+    return sys.getsizeof(rec) + 8
+
+
+class sort_stream(object):
+    """Stage sort a stream like `sorted(records, key, reverse)`, with the
+    records held in memory bounded by `memory_limit` bytes(estimated by
+    `sys.getsizeof`, shallow).
+
+    A stream fit in the memory is just sorted. Else it's cut into runs,
+    which are sorted and spilled to the `tmpdir` as gzip files(`pickle_batches`), with
+    `workers` the runs are sorted and compressed by a pool of `backend`
+    'process' or 'thread'. At most `fan_in` runs are merged at once,
+    more runs are merged in several passes. The temp files are removed
+    when the merged stream is exhausted or closed.
+
+    With `gnu`, the lines(str or bytes, ending with a newline) are sorted
+    by GNU `sort` with `LC_ALL=C`, same order as the default key,
+    `gnu_args` are extra options of it like "-t, -k2,2n". Then `key`
+    can't be used, and `workers` is passed to `--parallel`.
+
+    >>> s = sort_stream(memory_limit=1000)
+    >>> list(s(iter(range(100, 0, -1)))) == list(range(1, 101))
+    True
+    """
+
+    def __init__(self, key: Optional[Callable[[Any], Any]] = None,
+                 reverse: bool = False,
+                 memory_limit: int = 256 << 20,
+                 workers: Optional[int] = None,
+                 backend: str = 'process',
+                 tmpdir: Optional[str] = None,
+                 fan_in: int = 64,
+                 gnu: bool = False,
+                 gnu_args: str = ''):
+        check_backend(backend)
+        if gnu and key is not None:
+            raise ValueError("key can't be used by GNU sort, use gnu_args.")
+        if fan_in < 2:
+            raise ValueError(f"fan_in should be at least 2, got {fan_in}")
+        self.key = key
+        self.reverse = reverse
+        self.memory_limit = memory_limit
+        self.workers = workers
+        self.backend = backend
+        self.tmpdir = tmpdir
+        self.fan_in = fan_in
+        self.gnu = gnu
+        self.gnu_args = gnu_args
+
+    def __call__(self, records: Iterable) -> Iterator:
+        if self.gnu:
+            return self._gnu_sort(records)
+        records = iter(records)
+        limit = self.memory_limit
+        if self.workers is not None:
+            # each worker holds a run, and one is being filled
+            limit //= self.workers + 1
+        first = self._take_run(records, limit)
+        if first[1]:  # exhausted, fit in the memory
+            return iter(sorted(first[0], key=self.key, reverse=self.reverse))
+        return self._external_sort(chain(first[0], records), limit)
+
+    @staticmethod
+    def _take_run(records: Iterator, limit: int):
+        """return (run, is the stream exhausted)"""
+        run, size = [], 0
+        for rec in records:
+            run.append(rec)
+            size += _size(rec)
+            if size >= limit:
+                return run, False
+        return run, True
+
+    def _runs(self, records: Iterator, limit: int) -> Iterator[List]:
+        while True:
+            run, end = self._take_run(records, limit)
+            if run:
+                yield run
+            if end:
+                break
+
+    def _external_sort(self, records: Iterator, limit: int) -> Iterator:
+        d = tempfile.mkdtemp(prefix="bramin-sort-", dir=self.tmpdir)
+        try:
+            jobs = ((run, os.path.join(d, f"run{i}.gz"))
+                    for i, run in enumerate(self._runs(records, limit)))
+            if self.workers is None:
+                runs = [self._spill(job) for job in jobs]
+            else:
+                runs = list(pmap(self._spill, jobs, self.workers,
+                                 self.backend, max_pending=self.workers))
+        except BaseException:
+            shutil.rmtree(d, ignore_errors=True)
+            raise
+        merged = self._merged(d, runs)
+        # also removed if the merged stream is never read, or dropped
+        weakref.finalize(merged, shutil.rmtree, d, ignore_errors=True)
+        return merged
+
+    def _spill(self, job) -> str:
+        run, path = job
+        run.sort(key=self.key, reverse=self.reverse)
+        return callable_file(path, 'wb', file_type='pickle_batches')(run)
+
+    def _merge(self, runs: List[str]) -> Iterator:
+        # heapq.merge is stable: equal records come in the order of runs
+        readers = [callable_file(r, 'rb', file_type='pickle_batches')()
+                   for r in runs]
+        return heapq.merge(*readers, key=self.key, reverse=self.reverse)
+
+    def _merged(self, d: str, runs: List[str]) -> Iterator:
+        try:
+            n = 0
+            while len(runs) > self.fan_in:
+                merged = []
+                for i in range(0, len(runs), self.fan_in):
+                    group = runs[i:i+self.fan_in]
+                    path = os.path.join(d, f"merged{n}.gz")
+                    n += 1
+                    callable_file(path, 'wb', file_type='pickle_batches')(
+                        self._merge(group))
+                    for r in group:
+                        os.remove(r)
+                    merged.append(path)
+                runs = merged
+            yield from self._merge(runs)
+        finally:
+            shutil.rmtree(d, ignore_errors=True)
+
+    def gnu_command(self) -> str:
+        opts = [f"-S {max(self.memory_limit // 1024, 1)}K", "-s"]
+        if self.workers is not None:
+            opts.append(f"--parallel={self.workers}")
+        if self.tmpdir is not None:
+            opts.append(f"-T {shlex.quote(self.tmpdir)}")
+        opts.append("--compress-program=gzip")
+        args = self.gnu_args
+        if self.reverse:
+            opts.append("-r")
+            # keys with their own ordering options ignore the global -r
+            args = _KEY_OPTS.sub(
+                lambda m: m.group(0) + ('r' if m.group(2) else ''), args)
+        if args:
+            opts.append(args)
+        return f"LC_ALL=C sort {' '.join(opts)}"
+
+    def _gnu_sort(self, records: Iterable) -> Iterator:
+        records = iter(records)
+        first = next(records, None)
+        if first is None:
+            return iter([])
+        return subp(self.gnu_command())(chain([first], records))
+
+    def __repr__(self) -> str:
+        if self.gnu:
+            return f"<sort_stream `{self.gnu_command()}`>"
+        return f"<sort_stream memory_limit={self.memory_limit}>"
@@ -0,0 +1,116 @@
+"""Read one big line-oriented file in parallel by byte range splits.
+
+Like the input splits of Hadoop, a file is cut into byte ranges, each
+split read the lines start in it's range: a split skip the partial line
+at it's start(it belongs to the previous split), and read the line
+cross it's end to the end. So the splits can be read independently,
+by different processes, and together they read every line exactly once.
+
+    split_file("big.txt", workers=8) | parse | list | concat | END
+"""
+
+from typing import Iterator, List, Optional, Union
+from functools import partial
+import os
+
+from .io import callable_file, FileType, universal_lines
+
+
+DEFAULT_SPLIT_SIZE = 64 << 20
+
+
+class FileSplit(object):
+    """Byte range [start, end) of a file."""
+
+    __slots__ = ('fname', 'start', 'end', 'file_type')
+
+    def __init__(self, fname: str, start: int, end: int,
+                 file_type: Optional[str] = None):
+        self.fname = fname
+        self.start = start
+        self.end = end
+        self.file_type = file_type
+
+    def __getstate__(self):
+        return (self.fname, self.start, self.end, self.file_type)
+
+    def __setstate__(self, state):
+        self.fname, self.start, self.end, self.file_type = state
+
+    def __repr__(self) -> str:
+        return f"<FileSplit {self.fname}[{self.start}:{self.end}]>"
+
+
+def _splittable_type(fname: str, file_type: Optional[str]) -> FileType:
+    ftype = callable_file(fname, file_type=file_type)._ftype
+    if not (ftype.line_oriented and ftype.seekable):
+        raise ValueError(
+            f"file type {ftype.name} of {fname} can not be split, "
+            "it should be line oriented and seekable.")
+    return ftype
+
+
+def file_splits(fname: str, split_size: int = DEFAULT_SPLIT_SIZE,
+                n_splits: Optional[int] = None,
+                file_type: Optional[str] = None) -> List[FileSplit]:
+    """Cut a file into splits of `split_size` bytes(or `n_splits` splits).
+    Only the size of the file is read, the lines are aligned by readers.
+    """
+    _splittable_type(fname, file_type)
+    size = os.path.getsize(fname)
+    if n_splits is not None:
+        split_size = -(-size // max(n_splits, 1))
+    if split_size <= 0:
+        split_size = 1
+    return [FileSplit(fname, s, min(s + split_size, size), file_type)
+            for s in range(0, size, split_size)] or \
+        [FileSplit(fname, 0, 0, file_type)]
+
+
+def read_split(split: FileSplit, binary: bool = False,
+               encoding: str = 'utf-8') -> Iterator[Union[str, bytes]]:
+    """Read the lines start in the split's byte range. The text lines are
+    split like in `text_file`(universal newlines)."""
+    ftype = _splittable_type(split.fname, split.file_type)
+    fh = ftype.opener(split.fname, mode='rb')
+    try:
+        pos = split.start
+        if pos > 0:
+            # the line cross start belongs to the previous split,
+            # if the byte before start is a newline, this skips nothing.
+            fh.seek(pos - 1)
+            pos += len(fh.readline()) - 1
+        while pos < split.end:
+            line = fh.readline()
+            if not line:
+                break
+            pos += len(line)
+            if binary:
+                yield line
+            else:
+                yield from universal_lines(line.decode(encoding))
+    finally:
+        fh.close()
+
+
+def split_file(fname: str, split_size: int = DEFAULT_SPLIT_SIZE,
+               workers: Optional[int] = None, backend: str = 'process',
+               ordered: bool = True, n_splits: Optional[int] = None,
+               file_type: Optional[str] = None, binary: bool = False):
+    """A chunked pipe(see `bramin.chunk.ChunkedPipe`) start with reading
+    the splits of the file, the following stages until `concat` run on
+    each split in the worker processes.
+
+    Results of a split are sent back from the workers, so the stages
+    should turn the lines into a picklable value, for example `list`
+    or a count, instead of leaving an iterator.
+
+    `workers` is the number of CPUs by default.
+    """
+    from .pipe import Pipe
+    if workers is None:
+        workers = os.cpu_count() or 1
+    splits = file_splits(fname, split_size, n_splits, file_type)
+    reader = partial(read_split, binary=binary) if binary else read_split
+    p = Pipe.chunked(workers=workers, backend=backend, ordered=ordered)
+    return p._new([reader], splits)
@@ -1,93 +1,308 @@
-from typing import Union, Optional, Iterable, Tuple
+from typing import Union, Optional, Iterable, Iterator, Tuple, Callable, Any
 from subprocess import Popen, PIPE
 from functools import partial
 from itertools import tee
 from threading import Thread
-import types
+from contextvars import ContextVar
+from contextlib import contextmanager
+import signal
 import io
+import time
+import sys
+import os
 
 from ._utils import (type_error, type_guard)
+from .cancel import CancelToken, current_token
 
 Popen_ = partial(Popen, shell=True)
 
 
 ByteOrStr = Union[str, bytes]
 ProcessInput = Union[Iterable[ByteOrStr], ByteOrStr]
+# where the child's stderr go: a function called with each line,
+# or a file-like object with `write`. None for inherit the parent's.
+StderrSink = Union[None, Callable[[ByteOrStr], Any], Any]
+
+
+class ProcessStats(object):
+    """Resource usage of one finished `subp` call.
+    maxrss is in bytes, cpu times are None if the platform has no wait4.
+    """
+
+    __slots__ = ('cmd', 'pid', 'returncode', 'wall', 'utime', 'stime',
+                 'maxrss', 'bytes_in', 'bytes_out', 'bytes_err')
+
+    def __init__(self, cmd: str, pid: int, returncode: int, wall: float,
+                 utime: Optional[float] = None,
+                 stime: Optional[float] = None,
+                 maxrss: Optional[int] = None,
+                 bytes_in: int = 0, bytes_out: int = 0, bytes_err: int = 0):
+        self.cmd = cmd
+        self.pid = pid
+        self.returncode = returncode
+        self.wall = wall
+        self.utime = utime
+        self.stime = stime
+        self.maxrss = maxrss
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.bytes_err = bytes_err
+
+    @property
+    def cpu(self) -> Optional[float]:
+        if self.utime is None:
+            return None
+        return self.utime + self.stime
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self) -> str:
+        return (f"<ProcessStats '{self.cmd}' exit={self.returncode} "
+                f"wall={self.wall:.3f}s cpu={self.cpu} maxrss={self.maxrss} "
+                f"in={self.bytes_in} out={self.bytes_out}>")
+
+
+# lists collecting the stats of the subp calls, see `collect_stats`
+_collector: ContextVar[Optional[list]] = ContextVar(
+    'bramin_subp_stats', default=None)
+
+
+@contextmanager
+def collect_stats():
+    """Collect the `ProcessStats` of the subp calls made in the block(in
+    this context) into a list, the profiling hook used by `pipelined`.
+
+    >>> with collect_stats() as procs:
+    ...     out = list(subp("echo hi")())
+    >>> [s.cmd for s in procs]
+    ['echo hi']
+    """
+    procs = []
+    ctx = _collector.set(procs)
+    try:
+        yield procs
+    finally:
+        _collector.reset(ctx)
+
+
+class _CountingReader(io.RawIOBase):
+    """Raw reader count the bytes read from the underlying file."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.n = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self.fh.readinto1(b)  # what's available, do not wait for more
+        if n:
+            self.n += n
+        return n
+
+    def close(self):
+        self.fh.close()
+        super().close()
+
+
+def _maxrss_bytes(ru) -> int:
+    # linux report it in kilobytes, macOS in bytes
+    return ru.ru_maxrss if sys.platform == 'darwin' else ru.ru_maxrss * 1024
+
+
+def _reap(p: Popen) -> Tuple[int, Any]:
+    """Wait the child, return (returncode, rusage or None)."""
+    if not hasattr(os, 'wait4') or p.returncode is not None:
+        return p.wait(), None
+    try:
+        _, status, ru = os.wait4(p.pid, 0)
+    except ChildProcessError:  # already reaped by Popen(poll in terminate)
+        return p.wait(), None
+    p.returncode = os.waitstatus_to_exitcode(status)  # Popen won't wait it
+    return p.returncode, ru
+
+
+def _kill_group(p: Popen, sig: int = signal.SIGKILL):
+    """Kill the process group led by the child, if not reaped yet."""
+    if p.returncode is not None:
+        return
+    try:
+        os.killpg(p.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
 
 
 class subp(object):
-    def __init__(self, cmd: str):
+    """Run a shell command as a stage, stream the input into it's stdin
+    and it's stdout lines out.
+
+    The command's process group is killed when the running pipe's
+    cancel token is cancelled(see `bramin.cancel`).
+
+    Each finished call pass it's `ProcessStats` to `on_exit` if given
+    (and to the `collect_stats` blocks). When `stderr` is given, stderr
+    lines are streamed into it by a thread, so a chatty command never
+    blocks.
+
+    >>> stats = []
+    >>> p = subp("grep 1", on_exit=stats.append)
+    >>> list(p("1\\n2\\n11\\n"))
+    ['1\\n', '11\\n']
+    >>> stats[0].returncode, stats[0].bytes_out
+    (0, 5)
+    """
+
+    def __init__(self, cmd: str, stderr: StderrSink = None,
+                 on_exit: Optional[Callable[[ProcessStats], Any]] = None):
         self.cmd = cmd
-        self.text_mode = True
+        self.stderr = stderr
+        self.on_exit = on_exit
+
+    def _derive(self, cmd: str) -> 'subp':
+        return subp(cmd, self.stderr, self.on_exit)
 
     @type_guard
     def __or__(self, right: 'subp') -> 'subp':
         """Allow compose(concat) subp with '|'"""
         cmd = self.cmd + " | " + right.cmd
-        return subp(cmd)
+        return self._derive(cmd)
 
     @type_guard
     def __gt__(self, right: str) -> 'subp':
         """Allow redirect output to file."""
         cmd = self.cmd + " > " + right
-        return subp(cmd)
+        return self._derive(cmd)
 
     @type_guard
     def __rshift__(self, right: str) -> 'subp':
         """Allow redirect in append mode."""
         cmd = self.cmd + " >> " + right
-        return subp(cmd)
+        return self._derive(cmd)
 
     def __call__(self, input_: Optional[ProcessInput] = None) -> Iterable[ByteOrStr]:
-        cmd = self.cmd
-        t = None
+        # keep per-call state local, a subp obj may be shared between threads
+        text_mode = True
 
-        # dispatch Popen according to input type
+        # dispatch according to input type, all inputs are streamed by
+        # a writer thread, never communicate() because it reap the child.
         if input_ is None:
-            p = Popen_(cmd, stdout=PIPE)
-            stdout = self._fh_wrapper(p.stdout)
+            lines = None
         elif isinstance(input_, Iterable) and (not isinstance(input_, (str, bytes))):
-            input_, elm_tp = self._get_elm_type(input_)
+            lines, elm_tp = self._get_elm_type(input_)
             if elm_tp is bytes:
-                self.text_mode = False
+                text_mode = False
             elif elm_tp is not str:
                 raise self._subp_tp_err(Iterable[elm_tp])
-            p = Popen_(cmd, stdin=PIPE, stdout=PIPE)
-            # write the stdin using another thread, for non-blocking IO
-            stdin = self._fh_wrapper(p.stdin)
-
-            def write_to_stdin(p):
-                for line in input_:
-                    stdin.write(line)
-                stdin.close()
-            t = Thread(target=write_to_stdin, args=(p,))
-            t.start()
-            stdout = self._fh_wrapper(p.stdout)
         elif type(input_) is str:
-            p = Popen_(cmd, stdin=PIPE, stdout=PIPE)
-            _o, _ = p.communicate(input=input_.encode('utf-8'))
-            stdout = io.StringIO(_o.decode('utf-8'))
+            lines = [input_]
         elif type(input_) is bytes:
-            self.text_mode = False
-            p = Popen_(cmd, stdin=PIPE, stdout=PIPE)
-            _o, _ = p.communicate(input=input_)
-            stdout = io.BytesIO(_o)
+            text_mode = False
+            lines = [input_]
         else:
             raise self._subp_tp_err(type(input_))
+        # the token of the running pipe, the output may be consumed later
+        return self._run(lines, text_mode, current_token(), _collector.get())
 
-        for line in stdout:
-            yield line
+    def _run(self, lines: Optional[Iterable[ByteOrStr]],
+             text_mode: bool,
+             token: Optional[CancelToken],
+             collector: Optional[list]) -> Iterator[ByteOrStr]:
+        t0 = time.perf_counter()
+        # in it's own process group, so all processes of the shell
+        # command can be killed when cancelled.
+        p = Popen_(self.cmd, stdout=PIPE,
+                   stdin=PIPE if lines is not None else None,
+                   stderr=PIPE if self.stderr is not None else None,
+                   start_new_session=(token is not None))
+        unregister = None
+        if token is not None:
+            unregister = token.on_cancel(lambda: _kill_group(p))
+        counts = {'in': 0, 'err': 0}
+        errors = []
+        threads = []
+        if lines is not None:
+            threads.append(Thread(
+                target=self._write_stdin,
+                args=(p.stdin, lines, text_mode, counts, errors),
+                daemon=True))
+        if self.stderr is not None:
+            threads.append(Thread(
+                target=self._pump_stderr,
+                args=(p.stderr, self.stderr, text_mode, counts, errors),
+                daemon=True))
+        for t in threads:
+            t.start()
 
-        if t:
-            t.join()
-        p.terminate()
+        counter = _CountingReader(p.stdout)
+        stdout = io.BufferedReader(counter)
+        if text_mode:  # universal newlines
+            stdout = io.TextIOWrapper(stdout)
+        finished = False
+        try:
+            yield from stdout
+            finished = True
+        finally:
+            stdout.close()
+            if not finished:  # consumer stopped early
+                if token is not None:
+                    _kill_group(p, signal.SIGTERM)
+                else:
+                    p.terminate()
+            for t in threads:
+                t.join()
+            if unregister is not None:
+                unregister()
+            returncode, ru = _reap(p)
+            stats = ProcessStats(
+                self.cmd, p.pid, returncode, time.perf_counter() - t0,
+                bytes_in=counts['in'], bytes_out=counter.n,
+                bytes_err=counts['err'])
+            if ru is not None:
+                stats.utime, stats.stime = ru.ru_utime, ru.ru_stime
+                stats.maxrss = _maxrss_bytes(ru)
+            if collector is not None:
+                collector.append(stats)
+            if self.on_exit is not None:
+                self.on_exit(stats)
+        if token is not None:
+            token.check()
+        if errors:
+            raise errors[0]
 
-    def _fh_wrapper(self, fh):
-        """wrap the file handler if in text_mode."""
-        if self.text_mode:
-            return io.TextIOWrapper(fh)
-        else:
-            return fh
+    @staticmethod
+    def _write_stdin(fh, lines: Iterable[ByteOrStr], text_mode: bool,
+                     counts: dict, errors: list):
+        try:
+            for line in lines:
+                data = line.encode('utf-8') if text_mode else line
+                fh.write(data)
+                counts['in'] += len(data)
+        except BrokenPipeError:  # the child exit without read all input
+            pass
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                fh.close()
+            except BrokenPipeError:
+                pass
+
+    @staticmethod
+    def _pump_stderr(fh, sink: StderrSink, text_mode: bool,
+                     counts: dict, errors: list):
+        write = sink if callable(sink) else sink.write
+        try:
+            for line in fh:
+                counts['err'] += len(line)
+                write(line.decode('utf-8', 'replace') if text_mode else line)
+        except BaseException as e:
+            errors.append(e)
+            for _ in fh:  # keep draining, or the child may block
+                pass
+        finally:
+            fh.close()
 
     @classmethod
     def _subp_tp_err(cls, tp):
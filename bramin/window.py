@@ -0,0 +1,241 @@
+"""Windowed aggregation of streams, for the follow/streaming pipes.
+
+    "events.log" >> P | c(map, parse) \\
+        | window(60, event_time=it['ts'], key=it['user'], agg=count(),
+                 lateness=5) \\
+        | c(map, alert) | END
+
+Records are assigned to windows by their event time(or the arrival time
+if `event_time` is None), and aggregated incrementally by the combinable
+aggregators of `bramin.aggregate`, only the states of the open windows
+are kept. The watermark is the largest event time seen minus `lateness`,
+a window is closed(emitted then evicted) when the watermark pass it's
+end, records arrive after all their windows closed are late.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from collections import namedtuple
+import heapq
+import math
+import time
+
+from .aggregate import Aggregations, agg_list, agg_result, count
+
+
+WindowResult = namedtuple('WindowResult', ['start', 'end', 'key', 'value'])
+
+
+class _Windowed(object):
+    """Common parts of the window stages."""
+
+    def __init__(self, event_time: Optional[Callable[[Any], float]],
+                 key: Optional[Callable[[Any], Any]],
+                 agg: Optional[Aggregations], lateness: float,
+                 on_late: Optional[Callable[[Any], Any]]):
+        if lateness < 0:
+            raise ValueError(f"lateness should be >= 0, got {lateness}")
+        self.event_time = event_time
+        self.key = key
+        self.agg = count() if agg is None else agg
+        self.aggs = agg_list(self.agg)
+        self.lateness = lateness
+        self.on_late = on_late
+
+    def _time(self, rec: Any) -> float:
+        if self.event_time is None:
+            return time.time()
+        return self.event_time(rec)
+
+    def _init(self) -> list:
+        return [a.init() for a in self.aggs]
+
+    def _add(self, states: list, rec: Any):
+        for i, a in enumerate(self.aggs):
+            states[i] = a.add(states[i], rec if a.of is None else a.of(rec))
+
+    def _merge(self, a: list, b: list) -> list:
+        for i, agg in enumerate(self.aggs):
+            a[i] = agg.merge(a[i], b[i])
+        return a
+
+    def _result(self, start: float, end: float, key: Any,
+                states: list) -> WindowResult:
+        return WindowResult(start, end, key,
+                            agg_result(self.agg, self.aggs, states))
+
+    def _late(self, rec: Any):
+        if self.on_late is not None:
+            self.on_late(rec)
+
+
+class window(_Windowed):
+    """Stage aggregate the records in tumbling windows of `size`(time
+    units of `event_time`), or sliding windows of `size` every `slide`.
+    Windows are aligned to the multiples of `slide`.
+
+    Yield `WindowResult(start, end, key, value)` of each window and key
+    (`key` is None if not keyed), in the order they are closed. Late
+    records are dropped, or passed to `on_late`. The windows still open
+    are emitted at the end of the stream. With `slide` > `size`, the
+    records between two windows are dropped(they are not late).
+
+    >>> events = [(1, 'a'), (2, 'b'), (11, 'a'), (3, 'a'), (25, 'b')]
+    >>> for w in window(10, event_time=lambda e: e[0], lateness=5)(events):
+    ...     print(w)
+    WindowResult(start=0, end=10, key=None, value=3)
+    WindowResult(start=10, end=20, key=None, value=1)
+    WindowResult(start=20, end=30, key=None, value=1)
+    """
+
+    def __init__(self, size: float, slide: Optional[float] = None,
+                 event_time: Optional[Callable[[Any], float]] = None,
+                 key: Optional[Callable[[Any], Any]] = None,
+                 agg: Optional[Aggregations] = None,
+                 lateness: float = 0,
+                 on_late: Optional[Callable[[Any], Any]] = None):
+        super().__init__(event_time, key, agg, lateness, on_late)
+        slide = size if slide is None else slide
+        if size <= 0 or slide <= 0:
+            raise ValueError("size and slide should be positive.")
+        self.size = size
+        self.slide = slide
+
+    def __call__(self, records: Iterable) -> Iterator[WindowResult]:
+        return self._run(iter(records))
+
+    def _run(self, records: Iterator) -> Iterator[WindowResult]:
+        size, slide, keyf = self.size, self.slide, self.key
+        windows: Dict[float, Dict[Any, list]] = {}  # start -> key -> states
+        starts: List[float] = []  # heap of the open windows' starts
+        watermark = -math.inf
+        for rec in records:
+            t = self._time(rec)
+            if t - self.lateness > watermark:
+                watermark = t - self.lateness
+                while starts and starts[0] + size <= watermark:
+                    yield from self._emit(heapq.heappop(starts), windows)
+            # the windows contain t, from the latest start
+            s = math.floor(t / slide) * slide
+            if s + size <= t:  # in the gap between windows
+                continue
+            k = None if keyf is None else keyf(rec)
+            assigned = False
+            while s + size > t:
+                if s + size <= watermark:  # this and the earlier closed
+                    break
+                table = windows.get(s)
+                if table is None:
+                    table = windows[s] = {}
+                    heapq.heappush(starts, s)
+                states = table.get(k)
+                if states is None:
+                    states = table[k] = self._init()
+                self._add(states, rec)
+                assigned = True
+                s -= slide
+            if not assigned:
+                self._late(rec)
+        while starts:
+            yield from self._emit(heapq.heappop(starts), windows)
+
+    def _emit(self, start: float, windows: dict) -> Iterator[WindowResult]:
+        for k, states in windows.pop(start).items():
+            yield self._result(start, start + self.size, k, states)
+
+    def __repr__(self) -> str:
+        return f"<window size={self.size} slide={self.slide}>"
+
+
+class _Session(object):
+    __slots__ = ('start', 'last', 'states', 'alive')
+
+    def __init__(self, start: float, states: list):
+        self.start = start
+        self.last = start
+        self.states = states
+        self.alive = True
+
+
+class session_window(_Windowed):
+    """Stage aggregate the records in session windows: a session of a key
+    ends when no record in `gap` time, [first event, last event + gap).
+    Out of order records may join(and merge) sessions, until they are
+    closed by the watermark. Other arguments are the same as `window`.
+
+    >>> events = [(1, 'a'), (2, 'b'), (4, 'a'), (20, 'a'), (9, 'b')]
+    >>> for w in session_window(5, event_time=lambda e: e[0],
+    ...                         key=lambda e: e[1], lateness=10)(events):
+    ...     print(w)
+    WindowResult(start=2, end=7, key='b', value=1)
+    WindowResult(start=1, end=9, key='a', value=2)
+    WindowResult(start=9, end=14, key='b', value=1)
+    WindowResult(start=20, end=25, key='a', value=1)
+    """
+
+    def __init__(self, gap: float,
+                 event_time: Optional[Callable[[Any], float]] = None,
+                 key: Optional[Callable[[Any], Any]] = None,
+                 agg: Optional[Aggregations] = None,
+                 lateness: float = 0,
+                 on_late: Optional[Callable[[Any], Any]] = None):
+        super().__init__(event_time, key, agg, lateness, on_late)
+        if gap <= 0:
+            raise ValueError(f"gap should be positive, got {gap}")
+        self.gap = gap
+
+    def __call__(self, records: Iterable) -> Iterator[WindowResult]:
+        return self._run(iter(records))
+
+    def _run(self, records: Iterator) -> Iterator[WindowResult]:
+        gap, keyf = self.gap, self.key
+        sessions: Dict[Any, List[_Session]] = {}  # open sessions of keys
+        ends: list = []  # heap of (end, seq, key, session), lazily updated
+        seq = 0
+        watermark = -math.inf
+        for rec in records:
+            t = self._time(rec)
+            if t - self.lateness > watermark:
+                watermark = t - self.lateness
+                yield from self._close(ends, sessions, watermark)
+            k = None if keyf is None else keyf(rec)
+            opened = sessions.setdefault(k, [])
+            near = [s for s in opened
+                    if s.start - gap < t < s.last + gap]
+            if not near and t + gap <= watermark:
+                self._late(rec)
+                if not opened:
+                    del sessions[k]
+                continue
+            if near:
+                sess = near[0]
+                for other in near[1:]:  # the record bridge them
+                    sess.start = min(sess.start, other.start)
+                    sess.last = max(sess.last, other.last)
+                    self._merge(sess.states, other.states)
+                    other.alive = False
+                    opened.remove(other)
+                sess.start = min(sess.start, t)
+                sess.last = max(sess.last, t)
+            else:
+                sess = _Session(t, self._init())
+                opened.append(sess)
+            self._add(sess.states, rec)
+            seq += 1
+            heapq.heappush(ends, (sess.last + gap, seq, k, sess))
+        yield from self._close(ends, sessions, math.inf)
+
+    def _close(self, ends: list, sessions: dict,
+               watermark: float) -> Iterator[WindowResult]:
+        while ends and ends[0][0] <= watermark:
+            end, _, k, sess = heapq.heappop(ends)
+            if not sess.alive or sess.last + self.gap != end:
+                continue  # merged or extended, a newer entry exists
+            sess.alive = False
+            opened = sessions[k]
+            opened.remove(sess)
+            if not opened:
+                del sessions[k]
+            yield self._result(sess.start, end, k, sess.states)
+
+    def __repr__(self) -> str:
+        return f"<session_window gap={self.gap}>"
@@ -0,0 +1,114 @@
+"""File sink write(and compress) in a background thread."""
+
+from typing import Iterable, List, Optional
+from threading import Thread
+from queue import Queue
+import os
+
+from .io import callable_file
+
+
+_END = object()
+
+
+class write_behind(object):
+    """Sink with double buffering: the pipe fills one buffer while a writer
+    thread writes(compresses) the other, so writing overlap with the
+    computation of the upstream stages.
+
+    A buffer is handed over when it hold `buffer_size` characters(or
+    bytes), the pipe waits only if the writer is still busy with the
+    previous one, so at most two buffers are in memory. When the call
+    return, all are written and closed, and synced to disk when `fsync`.
+    Errors of the writer are raised in the caller.
+
+        P | f > write_behind("out.txt.gz") | END
+
+    >>> import tempfile
+    >>> fname = tempfile.mktemp(suffix=".txt")
+    >>> write_behind(fname, buffer_size=4)(["ab\\n", "cd\\n", "e\\n"]) == fname
+    True
+    >>> open(fname).read()
+    'ab\\ncd\\ne\\n'
+    """
+
+    def __init__(self, fname: str, mode: str = 'w',
+                 buffer_size: int = 1 << 20, fsync: bool = True,
+                 file_type: Optional[str] = None):
+        if mode not in ('w', 'a'):
+            raise ValueError(f"mode should be 'w' or 'a', got {repr(mode)}")
+        self.fname = fname
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.file_type = file_type
+        # check the type at construction, like callable_file
+        self._ftype = callable_file(fname, file_type=file_type)._ftype
+
+    def appending(self) -> "write_behind":
+        """Same sink in append mode, used by `P | ... >> write_behind(...)`.
+        """
+        return write_behind(self.fname, 'a', self.buffer_size,
+                            self.fsync, self.file_type)
+
+    def __call__(self, contents: Iterable) -> str:
+        fh = self._ftype.opener(self.fname, mode=self.mode)
+        q = Queue()  # at most one buffer in it, see `_hand_over`
+        errors: List[BaseException] = []
+        t = Thread(target=self._writer, args=(fh, q, errors), daemon=True)
+        t.start()
+        try:
+            buf, size = [], 0
+            for rec in contents:
+                buf.append(rec)
+                size += len(rec)
+                if size >= self.buffer_size:
+                    self._hand_over(q, buf)
+                    if errors:
+                        break
+                    buf, size = [], 0
+            else:
+                if buf:
+                    self._hand_over(q, buf)
+        finally:
+            q.put(_END)
+            t.join()
+            fh.close()
+        if errors:
+            raise errors[0]
+        if self.fsync:
+            self._sync()
+        return self.fname
+
+    @staticmethod
+    def _hand_over(q: Queue, buf: list):
+        # wait the previous buffer written, the full one is taken by the
+        # writer and the next one is filled: double buffer
+        q.join()
+        q.put(buf)
+
+    def _writer(self, fh, q: Queue, errors: List[BaseException]):
+        write = self._ftype.writer
+        while True:
+            buf = q.get()
+            try:
+                if buf is _END:
+                    break
+                if errors:  # keep draining, so the producer never blocks
+                    continue
+                write(fh, buf)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                q.task_done()
+
+    def _sync(self):
+        # after close, so the trailer of compressed files is synced too
+        fd = os.open(self.fname, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __repr__(self) -> str:
+        return f"<write_behind {self.fname} mode={self.mode}>"
@@ -54,6 +54,9 @@ setup(
     zip_safe=False,
     package_dir={'bramin': 'bramin'},
     install_requires=get_install_requires(),
+    entry_points={
+        'console_scripts': ['bramin=bramin.__main__:main'],
+    },
     license='BSD-3-Clause',
     classifiers=[
         'Natural Language :: English',
@@ -0,0 +1,109 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import random
+from collections import Counter
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.aggregate import (
+    group_by, count, total, minimum, maximum, mean, distinct,
+    count_distinct
+)
+
+
+def records(n=20_000, n_keys=500, seed=0):
+    rnd = random.Random(seed)
+    return [(f"k{rnd.randrange(n_keys)}", rnd.randrange(100))
+            for _ in range(n)]
+
+
+def expected(recs):
+    res = {}
+    for k, v in recs:
+        res.setdefault(k, []).append(v)
+    return {k: {'n': len(vs), 'sum': sum(vs), 'min': min(vs),
+                'max': max(vs), 'mean': sum(vs) / len(vs),
+                'set': set(vs), 'nd': len(set(vs))}
+            for k, vs in res.items()}
+
+
+def all_aggs(of):
+    return {'n': count(), 'sum': total(of), 'min': minimum(of),
+            'max': maximum(of), 'mean': mean(of), 'set': distinct(of),
+            'nd': count_distinct(of)}
+
+
+def second(r):
+    return r[1]
+
+
+class twice(total):
+    """Override add only, the inline of total must not be used."""
+
+    def add(self, state, value):
+        return state + 2 * value
+
+
+def test_count():
+    recs = records()
+    ref = Counter(k for k, _ in recs)
+    assert dict(group_by(it[0], count())(recs)) == ref
+    assert dict(group_by(lambda r: r[0], count())(iter(recs))) == ref
+
+
+@pytest.mark.parametrize("of", [it[1], second])
+def test_aggregations(of):
+    recs = records()
+    res = dict(group_by(it[0], all_aggs(of), chunksize=999)(recs))
+    assert res == expected(recs)
+    # order of first seen
+    assert list(res) == list(dict.fromkeys(k for k, _ in recs))
+
+
+def test_result_shapes():
+    recs = [('a', 1), ('b', 2), ('a', 3)]
+    assert list(group_by(it[0], total(it[1]))(recs)) == [('a', 4), ('b', 2)]
+    assert list(group_by(it[0], [count(), twice(it[1])])(recs)) == \
+        [('a', (2, 8)), ('b', (1, 4))]
+    with pytest.raises(TypeError):
+        group_by(it[0], [sum])
+    with pytest.raises(TypeError):
+        group_by(it[0], {})
+
+
+@pytest.mark.parametrize("aggs", [count(), 'all'])
+def test_spill(tmp_path, aggs):
+    recs = records(n_keys=5000)
+    aggs = all_aggs(second) if aggs == 'all' else aggs
+    g = group_by(it[0], aggs, memory_limit=50_000, chunksize=1000,
+                 tmpdir=str(tmp_path))
+    res = g(recs)
+    first = next(res)
+    assert len(os.listdir(tmp_path)) == 1  # spilled
+    res = dict([first] + list(res))
+    if isinstance(aggs, count):
+        assert res == Counter(k for k, _ in recs)
+    else:
+        assert res == expected(recs)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("backend", ['thread', 'process'])
+def test_workers(backend):
+    recs = records()
+    g = group_by(it[0], all_aggs(it[1]), workers=2, backend=backend,
+                 chunksize=3000)
+    assert dict(g(recs)) == expected(recs)
+    g = group_by(it[0], count(), workers=2, backend=backend,
+                 chunksize=3000, memory_limit=20_000)
+    assert dict(g(recs)) == Counter(k for k, _ in recs)
+
+
+def test_in_pipe():
+    lines = [f"{k}\t{v}\n" for k, v in records(1000)]
+    res = lines | P | c(map, str.split) \
+        | group_by(it[0], total(lambda r: int(r[1]))) | dict | END
+    assert res == {k: v['sum'] for k, v in expected(records(1000)).items()}
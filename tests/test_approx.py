@@ -0,0 +1,133 @@
+import sys
+sys.path.insert(0, '.')
+import random
+from collections import Counter
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.executor import pmap
+from bramin.aggregate import group_by
+from bramin.approx import (
+    BloomFilter, HyperLogLog, Reservoir, CountMinSketch, TopK,
+    dedup, count_distinct, sample, top_k, approx_distinct, hash64
+)
+
+
+def ids(n, n_distinct, seed=0):
+    rnd = random.Random(seed)
+    return [f"id{rnd.randrange(n_distinct)}" for _ in range(n)]
+
+
+def test_hash_stable():
+    import subprocess
+    assert hash64("abc") == hash64(b"abc") != hash64("abd")
+    # same in another interpreter, with another hash seed
+    out = subprocess.check_output(
+        [sys.executable, "-c",
+         "from bramin.approx import hash64; print(hash64('abc'))"],
+        env={'PYTHONHASHSEED': '123', 'PYTHONPATH': '.'})
+    assert int(out) == hash64("abc")
+
+
+@pytest.mark.parametrize("approx", [False, True])
+def test_dedup(approx):
+    data = ids(20000, 3000)
+    res = data | P | dedup(approx=approx, capacity=3000, error_rate=0.01) \
+        | list | END
+    exact = list(dict.fromkeys(data))
+    if approx:
+        # no duplicates, only a few unique ones lost as false positives
+        assert len(set(res)) == len(res)
+        assert set(res) <= set(exact)
+        assert len(res) >= 0.98 * len(exact)
+    else:
+        assert res == exact
+    assert list(dedup(key=it[0])(["ab", "ac", "b"])) == ["ab", "b"]
+
+
+def test_bloom_merge():
+    a, b = BloomFilter(1000, 0.01), BloomFilter(1000, 0.01)
+    for i in range(500):
+        a.add(i)
+        b.add(i + 500)
+    a.merge(b)
+    assert all(i in a for i in range(1000))
+    with pytest.raises(ValueError):
+        a.merge(BloomFilter(10))
+
+
+def test_count_distinct():
+    data = ids(50000, 20000)
+    est = data | P | count_distinct() | END
+    n = len(set(data))
+    assert abs(est - n) < 0.05 * n
+    assert count_distinct(p=10)(range(10)) == 10  # linear counting
+
+
+def test_hll_merge_in_workers():
+    def sketch(chunk):
+        h = HyperLogLog(12)
+        h.update(chunk)
+        return h
+
+    chunks = [range(i, i + 30000) for i in range(0, 100000, 20000)]
+    total = HyperLogLog(12)
+    for h in pmap(sketch, chunks, workers=2, backend='process'):
+        total.merge(h)
+    assert abs(total.count() - 110000) < 0.06 * 110000
+
+
+def test_sample():
+    res = range(1000) | P | sample(10, seed=1) | END
+    assert len(res) == len(set(res)) == 10 and set(res) <= set(range(1000))
+    assert sorted(sample(10)(range(5))) == list(range(5))
+    # each item has the same chance
+    counts = Counter()
+    for seed in range(2000):
+        r = Reservoir(4, seed=seed)
+        for part in (range(10), range(10, 30), range(30, 40)):
+            r.update(part)
+        counts.update(r.items)
+    assert all(120 < counts[i] < 280 for i in range(40))
+
+
+def test_reservoir_merge():
+    counts = Counter()
+    for seed in range(2000):
+        a, b = Reservoir(4, seed=seed), Reservoir(4, seed=seed + 9999)
+        a.update(range(8))
+        b.update(range(8, 40))
+        a.merge(b)
+        assert a.n == 40 and len(a.items) == 4
+        counts.update(a.items)
+    assert all(120 < counts[i] < 280 for i in range(40))
+
+
+def test_top_k():
+    rnd = random.Random(0)
+    data = [f"hot{i}" for i in range(5) for _ in range(300 * (i + 1))] + \
+        ids(20000, 5000)
+    rnd.shuffle(data)
+    res = data | P | top_k(5, width=1024) | END
+    assert [x for x, _ in res] == [f"hot{i}" for i in range(4, -1, -1)]
+    real = Counter(data)
+    assert all(est >= real[x] for x, est in res)  # never under count
+
+
+def test_top_k_merge():
+    a, b = TopK(2), TopK(2)
+    a.update("aaab")
+    b.update("bbbc")
+    assert a.merge(b).items() == [('b', 4), ('a', 3)]
+    cms = CountMinSketch(64, 3)
+    cms.add("x", 5)
+    assert cms.merge(cms).estimate("x") == 10
+
+
+def test_approx_distinct_agg():
+    recs = [(i % 3, i) for i in range(3000)]
+    res = dict(group_by(it[0], approx_distinct(it[1]), workers=2,
+                        backend='thread', chunksize=500)(recs))
+    assert all(abs(v - 1000) < 100 for v in res.values())
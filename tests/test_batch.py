@@ -0,0 +1,51 @@
+import sys
+sys.path.insert(0, '.')
+import time
+
+import pytest
+
+from bramin import *
+from bramin.batch import batch, unbatch, batched
+
+
+def slow_source(n, delay):
+    for i in range(n):
+        time.sleep(delay)
+        yield i
+
+
+class TestBatch(object):
+    def test_by_size(self):
+        assert list(batch(3)(range(7))) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert list(batch(3)([])) == []
+
+    def test_by_latency(self):
+        # source produce one element per 0.05s, batch could not be filled
+        batches = list(batch(100, timeout=0.02)(slow_source(4, 0.05)))
+        assert list(unbatch(batches)) == [0, 1, 2, 3]
+        assert len(batches) > 1
+        assert list(batch(2, timeout=1)(range(5))) == [[0, 1], [2, 3], [4]]
+
+    def test_error(self):
+        def bad():
+            yield 1
+            raise KeyError("x")
+        with pytest.raises(KeyError):
+            list(batch(10, timeout=0.1)(bad()))
+
+    def test_in_pipe(self):
+        pipe = P | batch(4) | unbatch | list
+        assert pipe(range(10)) == list(range(10))
+
+    def test_batched(self):
+        calls = []
+
+        def double(xs):
+            calls.append(len(xs))
+            return [x * 2 for x in xs]
+
+        pipe = P | batched(double, max_size=4) | list
+        assert pipe(range(10)) == [x * 2 for x in range(10)]
+        assert calls == [4, 4, 2]
+        with pytest.raises(ValueError):
+            list(batched(lambda xs: xs[:1], 2)(range(4)))
@@ -0,0 +1,114 @@
+import sys
+sys.path.insert(0, '.')
+import time
+import threading
+import itertools
+
+import pytest
+
+from bramin import *
+from bramin.cancel import (
+    CancelToken, Cancelled, DeadlineExceeded, current_token
+)
+from bramin.subp import subp
+from bramin.io import callable_file
+from bramin.pipeline import pipelined
+
+
+def slow_count(xs):
+    for x in itertools.count():
+        time.sleep(0.01)
+        yield x
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split()[2] != 'Z'  # not reaped by init
+    except FileNotFoundError:
+        return False
+
+
+def test_no_timeout():
+    p = P | (lambda x: x + 1)
+    assert p(1, timeout=10) == 2
+
+
+def test_deadline_between_elements():
+    p = P | slow_count | list
+    t = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        p(None, timeout=0.2)
+    assert time.monotonic() - t < 2
+
+
+def test_deadline_on_result_stream():
+    res = (P | slow_count)(None, timeout=0.2)
+    with pytest.raises(DeadlineExceeded):
+        for _ in res:
+            pass
+
+
+def test_cancel_token():
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    with pytest.raises(Cancelled):
+        (P | slow_count | list)(None, token=token)
+
+
+def test_parent_token():
+    parent = CancelToken(timeout=10)
+    child = CancelToken(timeout=100, parent=parent)
+    assert child.deadline == parent.deadline
+    parent.cancel()
+    assert child.cancelled
+    with pytest.raises(Cancelled):
+        child.check()
+
+
+def test_current_token():
+    seen = []
+    p = P | (lambda x: seen.append(current_token()))
+    p(1, timeout=5)
+    p(1)
+    assert isinstance(seen[0], CancelToken) and seen[1] is None
+
+
+def test_subp_killed():
+    # the background sleep is in the same process group, killed too
+    out = []
+    t = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        (P | subp("sleep 30 & echo $!; wait")
+         | (lambda ls: out.extend(ls)))(None, timeout=0.5)
+    assert time.monotonic() - t < 5
+    time.sleep(0.1)
+    assert not _alive(int(out[0]))
+
+
+def test_file_closed_when_stopped():
+    fname = "/tmp/bramin_test_cancel.txt"
+    with open(fname, 'w') as f:
+        f.write("1\n2\n3\n")
+    opened = []
+
+    def opener(name, mode='r'):
+        fh = open(name, mode)
+        opened.append(fh)
+        return fh
+    f = callable_file(fname)
+    f._ftype = type(f._ftype)('t', None, opener, lambda fh: fh, None)
+    lines = f()
+    next(lines)
+    lines.close()
+    assert opened[0].closed
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_pipelined_timeout(backend):
+    p = pipelined(P | slow_count | (lambda xs: (x + 1 for x in xs)) | list,
+                  backend=backend)
+    t = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        p(None, timeout=0.3)
+    assert time.monotonic() - t < 5
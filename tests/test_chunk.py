@@ -0,0 +1,128 @@
+import sys
+sys.path.insert(0, '.')
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bramin import *
+from bramin.chunk import (
+    ChunkedPipe, concat, unchunk, read_chunks, write_chunks
+)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'a': np.arange(100), 'b': np.arange(100) * 0.5})
+
+
+def even_rows(d):
+    return d[d.a % 2 == 0]
+
+
+def test_same_as_whole(df):
+    expect = df | P | even_rows | END
+    res = df | P.chunked(rows=7) | even_rows | (it * 2) | concat | END
+    pd.testing.assert_frame_equal(res, expect * 2)
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_parallel(df, backend):
+    p = P.chunked(rows=10, workers=2, backend=backend) | even_rows | concat
+    res = df | p | END
+    pd.testing.assert_frame_equal(res, even_rows(df))
+
+
+def test_chunk_sizes(df):
+    sizes = df | P.chunked(rows=30) | len | END
+    assert list(sizes) == [30, 30, 30, 10]
+    # stages after concat run on the whole result
+    assert (df | P.chunked(rows=30) | len | concat | sum | END) == 100
+
+
+def test_ndarray():
+    a = np.arange(10)
+    res = a | P.chunked(rows=3) | it + 1 | concat | END
+    assert (res == a + 1).all()
+
+
+def test_settings_kept():
+    p = P.chunked(rows=5, workers=2) | even_rows | concat
+    assert isinstance(p, ChunkedPipe)
+    assert (p.rows, p.workers) == (5, 2)
+    p2 = (P | even_rows).chunked(rows=3)
+    assert p2.rows == 3 and p2._chain == [even_rows]
+    with pytest.raises(ValueError):
+        P.chunked(rows=0)
+
+
+def test_concat():
+    assert concat([[1], iter([2, 3])]) == [1, 2, 3]
+    assert concat([]) == []
+
+
+def test_csv_chunks(df, tmp_path):
+    fname = str(tmp_path / "a.csv")
+    df | P.chunked(rows=30) | even_rows | unchunk | write_chunks(fname) \
+        | END
+    chunks = list(read_chunks(fname, rows=20))
+    assert [len(c) for c in chunks] == [20, 20, 10]
+    res = read_chunks(fname, rows=20) | P.chunked() | (lambda d: d.b.sum()) \
+        | concat | sum | END
+    assert res == even_rows(df).b.sum()
+
+
+def test_parquet_chunks(df, tmp_path):
+    pytest.importorskip('pyarrow')
+    fname = str(tmp_path / "a.parquet")
+    df | P.chunked(rows=30) | unchunk | write_chunks(fname) | END
+    res = read_chunks(fname, rows=40) | P.chunked() | even_rows | concat | END
+    pd.testing.assert_frame_equal(res.reset_index(drop=True),
+                                  even_rows(df).reset_index(drop=True))
+
+
+def test_cost_split():
+    from bramin.chunk import split_rows
+    a = np.arange(100)
+    sizes = [len(c) for c in split_rows(a, 10, cost=lambda x: x + 1)]
+    assert sum(sizes) == 100 and len(sizes) == 10
+    assert sizes[0] > sizes[-1]  # heavy rows in smaller chunks
+    # one hot row, the others are not piled into one huge chunk
+    sizes = [len(c) for c in split_rows(a, 10, cost=lambda x: x == 50)]
+    assert max(sizes) <= 40
+    df = pd.DataFrame({'n': np.r_[np.ones(90), np.full(10, 100.0)]})
+    res = list(df | P.chunked(rows=10, cost=it['n']) | len | END)
+    assert sum(res) == 100 and res[-9:] == [1] * 9
+    with pytest.raises(ValueError):
+        list(split_rows(a, 10, cost=lambda x: x[:5]))
+
+
+def test_speculate(df):
+    p = P.chunked(rows=10, workers=2, speculate=2) | even_rows | concat
+    pd.testing.assert_frame_equal(df | p | END, even_rows(df))
+
+
+def test_speculate_process(tmp_path):
+    import time
+    marker = str(tmp_path / "started")
+
+    def slow_once(a):
+        # the first attempt of a chunk stalls
+        if a[0] == 30_000:
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+                time.sleep(3)
+            except FileExistsError:
+                pass
+        time.sleep(0.02)
+        return a * 2  # big, returned through shared memory
+
+    a = np.arange(200_000)
+    p = P.chunked(rows=10_000, workers=3, backend='process', speculate=3) \
+        | slow_once | concat
+    t = time.perf_counter()
+    res = a | p | END
+    # the straggler is not waited
+    assert time.perf_counter() - t < 2
+    assert (res == a * 2).all()
@@ -0,0 +1,155 @@
+import sys
+sys.path.insert(0, '.')
+import threading
+import time
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.dag import DAG
+
+
+def counted(counter, func):
+    def f(*args):
+        counter.append(1)
+        return func(*args)
+    return f
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_shared_once(tmp_path, stream):
+    src = tmp_path / "data.tsv"
+    src.write_text("".join(f"k{i % 3}\t{i}\n" for i in range(1000)))
+    out = tmp_path / "even.tsv"
+    parsed = []
+    g = DAG()
+    g.node('rows', counted(parsed, lambda: str(src) >> P
+                           | c(map, str.split) | END))
+    g.node('total', P | c(map, lambda r: int(r[1])) | sum, 'rows')
+    g.node('keys', P | c(map, it[0]) | set, 'rows')
+    g.node('export', P | c(filter, lambda r: int(r[1]) % 2 == 0)
+           | c(map, lambda r: '\t'.join(r) + '\n') > str(out), 'rows')
+    res = g.run(stream=stream)
+    assert parsed == [1]
+    assert res['total'] == sum(range(1000))
+    assert res['keys'] == {'k0', 'k1', 'k2'}
+    assert len(out.read_text().splitlines()) == 500
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_outputs(stream):
+    g = DAG().node('xs', lambda: iter(range(10)))
+    g.node('sq', P | c(map, it ** 2), 'xs')
+    g.node('n', lambda xs: sum(1 for _ in xs), 'xs')
+    # iterator outputs with other consumers are collected
+    assert g.run(['xs', 'n'], stream=stream) == {'xs': list(range(10)),
+                                                 'n': 10}
+    assert list(g.run('sq', stream=stream)) == [x ** 2 for x in range(10)]
+
+
+def test_sources():
+    g = DAG().node('a', [1, 2]).node('b', range(3) | P | sum)
+    g.node('c', lambda a, b: a + [b], 'a', 'b')
+    assert g.run('c') == [1, 2, 3]
+    assert g.sinks() == ['c']
+
+
+def test_concurrent():
+    # independent nodes overlap
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait_others():
+        barrier.wait()
+        return 1
+
+    g = DAG()
+    for name in "abc":
+        g.node(name, wait_others)
+    g.node('sum', lambda *xs: sum(xs), 'a', 'b', 'c')
+    assert g.run('sum', workers=3) == 3
+    barrier.reset()
+    assert g.run('sum', stream=True) == 3
+
+
+def test_bounded_stream():
+    """A huge stream is consumed by two nodes without being held."""
+    produced = []
+
+    def source():
+        for i in range(100_000):
+            produced.append(i)
+            yield i
+
+    seen = []
+
+    def watch(xs):
+        for x in xs:
+            # the producer is at most (maxsize + 2) chunks ahead
+            seen.append(len(produced) - x)
+        return 'done'
+
+    g = DAG().node('xs', source).node('w', watch, 'xs')
+    g.node('s', sum, 'xs')
+    res = g.run(stream=True, maxsize=4, chunksize=100)
+    assert res == {'w': 'done', 's': sum(range(100_000))}
+    assert max(seen) <= 7 * 100
+
+
+def test_partial_consumer():
+    g = DAG().node('xs', lambda: iter(range(10 ** 6)))
+    g.node('first', next, 'xs').node('n', lambda xs: sum(1 for _ in xs), 'xs')
+    t = time.perf_counter()
+    assert g.run(stream=True, maxsize=2) == {'first': 0, 'n': 10 ** 6}
+    assert time.perf_counter() - t < 10
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_errors(stream):
+    def bad():
+        yield 1
+        raise KeyError('boom')
+
+    g = DAG().node('xs', bad)
+    g.node('a', list, 'xs').node('b', sum, 'xs')
+    with pytest.raises(KeyError):
+        g.run(stream=stream)
+    with pytest.raises(KeyError):
+        DAG().node('a', 1, 'missing')
+    with pytest.raises(ValueError):
+        DAG().node('a', 1).node('a', 2)
+    with pytest.raises(TypeError):
+        DAG().node('a', 1).node('b', 2, 'a')
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_lazy_intermediate(stream):
+    g = DAG().node('src', lambda: iter(range(1, 11)))
+    g.node('up', c(map, lambda x: x), 'src').node('total', sum, 'up')
+    g.node('n', lambda xs: sum(1 for _ in xs), 'src')
+    assert g.run(stream=stream) == {'total': 55, 'n': 10}
+    # a chain of lazy nodes with one consumer each
+    g = DAG().node('src', lambda: iter(range(1, 11)))
+    g.node('a', c(map, it * 2), 'src').node('b', c(filter, it > 4), 'a')
+    g.node('total', sum, 'b')
+    assert g.run('total', stream=stream) == 104
+
+
+def test_ignored_input():
+    g = DAG().node('src', lambda: iter(range(10 ** 5)))
+    g.node('skip', lambda xs: 'ignored', 'src').node('s', sum, 'src')
+    g.node('lazy_skip', c(map, str), 'src')
+    g.node('skip2', lambda xs: 'ignored', 'lazy_skip')
+    res = g.run(stream=True, maxsize=2, chunksize=10, timeout=20)
+    assert res == {'skip': 'ignored', 's': sum(range(10 ** 5)),
+                   'skip2': 'ignored'}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_timeout(stream):
+    from bramin.cancel import DeadlineExceeded
+    g = DAG().node('slow', lambda: time.sleep(2))
+    t = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        g.run(stream=stream, timeout=0.2)
+    assert time.perf_counter() - t < 1
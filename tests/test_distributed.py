@@ -0,0 +1,68 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import operator
+from functools import partial
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.distributed import distributed, spawn_local_workers, RemoteError
+
+
+AUTHKEY = b'bramin-test'
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def die_once(marker, chunk):
+    """Kill the worker process the first time it's called."""
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return [x * 10 for x in chunk]
+
+
+@pytest.fixture
+def workers():
+    env = {'PYTHONPATH': os.pathsep.join(
+        [os.path.dirname(TESTS_DIR), TESTS_DIR])}
+    procs, addrs = spawn_local_workers(2, AUTHKEY, env)
+    yield addrs
+    for p in procs:
+        p.kill()
+        p.wait()
+
+
+class TestDistributed(object):
+    def test_ordered(self, workers):
+        pipe = P | c(map, it * 2) | list
+        d = distributed(pipe, workers, chunksize=7, authkey=AUTHKEY)
+        assert list(d(range(100))) == [x * 2 for x in range(100)]
+
+    def test_unordered(self, workers):
+        pipe = P | partial(map, operator.neg) | list
+        d = distributed(pipe, workers, chunksize=3, authkey=AUTHKEY,
+                        ordered=False)
+        assert sorted(d(range(50))) == sorted(-x for x in range(50))
+        d = distributed(P | sum, workers, chunksize=10, authkey=AUTHKEY,
+                        flatten=False)
+        assert list(d(range(30))) == [45, 145, 245]
+
+    def test_worker_death(self, workers, tmp_path):
+        marker = str(tmp_path / "died")
+        pipe = P | partial(die_once, marker)
+        d = distributed(pipe, workers, chunksize=5, authkey=AUTHKEY)
+        assert list(d(range(20))) == [x * 10 for x in range(20)]
+        assert os.path.exists(marker)
+
+    def test_error(self, workers):
+        pipe = P | c(map, partial(operator.truediv, 1)) | list
+        d = distributed(pipe, workers, chunksize=5, authkey=AUTHKEY)
+        with pytest.raises(ZeroDivisionError):
+            list(d(range(10)))
+
+    def test_no_worker(self):
+        d = distributed(P | list, [('127.0.0.1', 1)], authkey=AUTHKEY)
+        with pytest.raises(RemoteError):
+            list(d(range(10)))
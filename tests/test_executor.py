@@ -0,0 +1,106 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import time
+import itertools
+
+import numpy as np
+import pytest
+
+from bramin.executor import pmap
+
+
+def double(x):
+    return x * 2
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_pmap(backend):
+    assert list(pmap(double, range(20), 3, backend)) == \
+        [x * 2 for x in range(20)]
+
+
+def test_unordered():
+    def f(x):
+        time.sleep(0.05 if x == 0 else 0)
+        return x
+    res = list(pmap(f, range(4), workers=4, ordered=False))
+    assert sorted(res) == [0, 1, 2, 3] and res[-1] == 0
+
+
+def test_bounded_infinite_input():
+    res = pmap(double, itertools.count(), workers=2, max_pending=4)
+    assert list(itertools.islice(res, 5)) == [0, 2, 4, 6, 8]
+    res.close()
+
+
+def test_shm_arrays():
+    a = np.arange(1 << 16, dtype='f8')
+    res, = pmap(double, [a], 2, 'process', shm_min_bytes=1024)
+    assert (res == a * 2).all()
+
+
+def test_interpreters_backend():
+    from bramin.executor import pool_backend, HAS_INTERPRETERS
+    assert list(pmap(double, range(20), 3, 'interpreters')) == \
+        [x * 2 for x in range(20)]
+    # lambdas can't be shared with subinterpreters, run in processes
+    assert pool_backend('interpreters', lambda x: x) == 'process'
+    assert list(pmap(lambda x: x + 1, range(5), 2, 'interpreters')) == \
+        [1, 2, 3, 4, 5]
+    assert pool_backend('interpreters', double) == \
+        ('interpreters' if HAS_INTERPRETERS else 'process')
+    with pytest.raises(ValueError):
+        pmap(double, range(3), 2, 'fibers').__next__()
+
+
+def test_interpreters_in_pipes():
+    from bramin import P, it, END
+    from bramin.chunk import concat
+    from bramin.pipeline import pipelined
+    res = np.arange(100) | P.chunked(rows=10, workers=2,
+                                     backend='interpreters') \
+        | it * 2 | concat | END
+    assert (res == np.arange(100) * 2).all()
+    p = pipelined(P | (lambda xs: (x + 1 for x in xs)) | sum,
+                  backend='interpreters')
+    assert p(range(10)) == 55
+
+
+def slow_once(arg):
+    """Sleep long in the first attempt of item 3 only."""
+    x, marker = arg
+    if x == 3:
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+            time.sleep(3)
+        except FileExistsError:
+            pass
+    time.sleep(0.02)
+    return x * 2
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+@pytest.mark.parametrize('ordered', [True, False])
+def test_speculate(tmp_path, backend, ordered):
+    marker = str(tmp_path / "started")
+    items = [(x, marker) for x in range(20)]
+    t = time.perf_counter()
+    res = list(pmap(slow_once, items, 3, backend, ordered=ordered,
+                    speculate=3))
+    assert time.perf_counter() - t < 2
+    assert (res if ordered else sorted(res)) == [x * 2 for x in range(20)]
+
+
+def test_speculate_errors():
+    def fail(x):
+        if x == 2:
+            raise KeyError(x)
+        return x
+    with pytest.raises(KeyError):
+        list(pmap(fail, range(10), 2, speculate=2))
+    with pytest.raises(ValueError):
+        pmap(double, range(3), speculate=0.5)
+    res = pmap(double, itertools.count(), workers=2, speculate=2)
+    assert list(itertools.islice(res, 5)) == [0, 2, 4, 6, 8]
+    res.close()
@@ -0,0 +1,105 @@
+import sys
+sys.path.insert(0, '.')
+import time
+from functools import partial
+
+import numpy as np
+from toolz import curry as c
+
+from bramin import *
+from bramin.subp import subp
+from bramin.chunk import concat
+from bramin.explain import stage_kind, execution_mode, Analysis
+
+
+def slow_inc(x):
+    time.sleep(0.001)
+    return x + 1
+
+
+def gen_lines(n):
+    for i in range(n):
+        yield f"{i}\n"
+
+
+def test_stage_kinds(tmp_path):
+    fname = str(tmp_path / "a.txt")
+    assert stage_kind(it + 1) == 'placeholder'
+    assert stage_kind(partial(map, str)) == 'partial'
+    assert stage_kind(curry(map)(str)) == 'curry'
+    assert stage_kind(subp("cat")) == 'subp'
+    assert stage_kind(sorted) == 'function'
+    p = P | sorted > fname
+    assert stage_kind(p._chain[-1]) == 'file sink'
+    open(fname, 'w').close()
+    p = fname >> P | list
+    assert stage_kind(p._chain[0]) == 'file source'
+
+
+def test_explain(tmp_path):
+    fname = str(tmp_path / "a.txt")
+    with open(fname, 'w') as f:
+        f.writelines(gen_lines(10))
+    p = fname >> P | c(map, str.strip) | c(filter, it != '3') | list
+    plan = p.explain()
+    assert plan.startswith("mode: streaming")
+    assert "file source" in plan and "map(str.strip)" in plan
+    assert "optimizations" not in plan
+    plan = p.optimize().explain()
+    assert "fused loop" in plan
+    assert "optimizations:\n  - fused map(str.strip)" in plan
+    assert execution_mode(P | sorted | sum) == 'serial'
+    assert execution_mode(P.chunked(rows=10, workers=2) | sum) == \
+        'chunked(rows=10), parallel thread x2'
+
+
+def test_analyze():
+    p = P | c(map, slow_inc) | c(filter, it % 2 == 0) | list | sum
+    a = p.analyze(range(100))
+    assert isinstance(a, Analysis)
+    assert a.result == p(range(100))
+    mapped, filtered, to_list, total = a.stages
+    assert mapped.rows == 100 and filtered.rows == 50
+    assert to_list.rows == 50 and total.rows == 1
+    # the sleeping is in the map stage, not the consumers pulling it
+    assert mapped.time >= 0.1
+    assert filtered.time < mapped.time and to_list.time < mapped.time
+    assert to_list.memory > 0
+    assert 0.1 <= a.wall
+    text = str(a)
+    assert "rows" in text and "map(slow_inc)" in text
+
+
+def test_analyze_bytes():
+    a = (P | gen_lines | list).analyze(5, memory=False)
+    assert a.result == list(gen_lines(5))
+    assert [s.bytes for s in a.stages] == [10, 10]
+    assert all(s.memory is None for s in a.stages)
+    a = (P | np.arange | it * 2).analyze(10)
+    assert a.stages[1].bytes == 80 and a.stages[1].rows == 10
+
+
+def test_analyze_chunked():
+    p = np.arange(100) | P.chunked(rows=10) | it + 1 | concat | np.sum
+    a = p.analyze()
+    assert a.result == p | END
+    head, marker, total = a.stages
+    assert head.rows == 100 and head.bytes == 800  # summed over the chunks
+    assert marker.time is None
+    assert total.rows == 1
+
+
+def test_analyze_concurrent_memory():
+    def slow_double(a):
+        time.sleep(0.02)
+        return a * 2
+
+    p = np.arange(100) | P.chunked(rows=10, workers=4) | slow_double \
+        | concat | np.sum
+    a = p.analyze()
+    head, _, total = a.stages
+    # the peak of stages ran in several threads at once is not reliable
+    assert head.memory is None and head.time is not None
+    assert total.memory is not None
+    p = np.arange(100) | P.chunked(rows=10) | slow_double | concat | np.sum
+    assert p.analyze().stages[0].memory is not None
@@ -0,0 +1,87 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import time
+import threading
+
+import pytest
+
+from bramin import *
+from bramin.io import callable_file
+from bramin.cancel import DeadlineExceeded
+
+
+def append(fname, text):
+    with open(fname, 'a') as f:
+        f.write(text)
+
+
+def follower(fname, **kwargs):
+    kwargs.setdefault('poll_interval', 0.02)
+    kwargs.setdefault('idle_timeout', 0.3)
+    return callable_file(fname, follow=True, **kwargs)()
+
+
+def test_follow_appended(tmp_path):
+    fname = str(tmp_path / "a.log")
+    append(fname, "1\n2\n")
+
+    def writer():
+        for i in range(3, 6):
+            time.sleep(0.05)
+            append(fname, f"{i}\n")
+        append(fname, "6")  # not complete yet
+    threading.Thread(target=writer).start()
+    assert list(follower(fname)) == [f"{i}\n" for i in range(1, 6)]
+
+
+def test_newlines(tmp_path):
+    fname = str(tmp_path / "crlf.log")
+    with open(fname, 'wb') as f:
+        f.write(b"1\r\n2\r3\n4\r\n5\r")
+    assert list(follower(fname)) == ["1\n", "2\n", "3\n", "4\n"]
+    assert list(follower(fname, binary=True)) == [b"1\r\n", b"2\r3\n",
+                                                  b"4\r\n"]
+
+
+def test_checkpoint(tmp_path):
+    fname = str(tmp_path / "a.log")
+    ckpt = str(tmp_path / "a.ckpt")
+    append(fname, "1\n2\n3\n")
+    lines = follower(fname, checkpoint=ckpt)
+    assert [next(lines), next(lines)] == ["1\n", "2\n"]
+    lines.close()
+    append(fname, "4\n")
+    assert list(follower(fname, checkpoint=ckpt)) == ["3\n", "4\n"]
+    assert list(follower(fname, checkpoint=ckpt)) == []
+
+
+def test_rotation(tmp_path):
+    fname = str(tmp_path / "a.log")
+    append(fname, "1\n")
+    lines = follower(fname)
+    assert next(lines) == "1\n"
+    append(fname, "2\n")
+    os.rename(fname, fname + ".1")
+    append(fname, "3\n")
+    assert list(lines) == ["2\n", "3\n"]
+
+
+def test_truncation(tmp_path):
+    fname = str(tmp_path / "a.log")
+    ckpt = str(tmp_path / "a.ckpt")
+    append(fname, "1\n2\n")
+    assert len(list(follower(fname, checkpoint=ckpt))) == 2
+    with open(fname, 'w') as f:
+        f.write("3\n")
+    assert list(follower(fname, checkpoint=ckpt)) == ["3\n"]
+
+
+def test_cancel(tmp_path):
+    fname = str(tmp_path / "a.log")
+    append(fname, "1\n")
+    p = P | callable_file(fname, follow=True, poll_interval=10) | list
+    t = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        p(None, timeout=0.2)
+    assert time.monotonic() - t < 2
@@ -18,10 +18,13 @@ def lines():
 
 
 def test_unregistered():
+    saved = list(callable_file.file_types)
     callable_file.unregister('text')
-    with pytest.raises(IOError):
-        f = callable_file(tmp_text, 'w')
-    callable_file.register(text_file)
+    try:
+        with pytest.raises(IOError):
+            f = callable_file(tmp_text, 'w')
+    finally:  # keep the order, the later registered are matched first
+        callable_file.file_types[:] = saved
 
 
 def test_read_text():
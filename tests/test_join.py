@@ -0,0 +1,81 @@
+import sys
+sys.path.insert(0, '.')
+import random
+from itertools import product
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.join import hash_join, merge_join, merge_sorted, open_source
+
+
+def rows(n, n_keys, tag, seed):
+    rnd = random.Random(seed)
+    return sorted((rnd.randrange(n_keys), f"{tag}{i}") for i in range(n))
+
+
+def nested_loop(left, right, how):
+    res = [(l, r) for l, r in product(left, right) if l[0] == r[0]]
+    if how in ('left', 'outer'):
+        res += [(l, None) for l in left if all(l[0] != r[0] for r in right)]
+    if how in ('right', 'outer'):
+        res += [(None, r) for r in right if all(l[0] != r[0] for l in left)]
+    return sorted(res, key=repr)
+
+
+@pytest.mark.parametrize("how", ['inner', 'left', 'right', 'outer'])
+@pytest.mark.parametrize("join", [hash_join, merge_join])
+def test_joins(join, how):
+    left, right = rows(300, 100, 'l', 0), rows(200, 120, 'r', 1)
+    res = iter(left) | P | join(right, key=it[0], how=how) | list | END
+    assert sorted(res, key=repr) == nested_loop(left, right, how)
+
+
+def test_merge_join_lazy():
+    # both sides are infinite, only the current key is held
+    def evens():
+        i = 0
+        while True:
+            yield i
+            i += 2
+
+    def threes():
+        i = 0
+        while True:
+            yield i
+            i += 3
+
+    res = merge_join(threes, key=lambda x: x)(evens())
+    assert [next(res) for _ in range(4)] == [(0, 0), (6, 6), (12, 12), (18, 18)]
+
+
+def test_merge_join_unsorted():
+    with pytest.raises(ValueError, match="other of merge_join is not sorted"):
+        list(merge_join([3, 1], key=lambda x: x)([1, 2, 3]))
+
+
+def test_combine_and_keys():
+    users = [{'id': 1, 'name': 'ann'}, {'id': 2, 'name': 'bob'}]
+    orders = [('x', 2), ('y', 1), ('z', 2)]
+    j = hash_join(users, key=it[1], build_key=it['id'],
+                  combine=lambda o, u: (o[0], u['name']))
+    assert list(j(orders)) == [('x', 'bob'), ('y', 'ann'), ('z', 'bob')]
+    with pytest.raises(ValueError):
+        hash_join(users, key=it[1], how='cross')
+
+
+def test_sources(tmp_path):
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    a.write_text("1\n4\n7\n")
+    b.write_text("2\n5\n8\n")
+    res = P | merge_sorted(str(a), str(b), ["3\n", "6\n"]) | list | END
+    assert res == [f"{i}\n" for i in range(1, 9)]
+    assert list(open_source(str(b) >> P | c(map, int))) == [2, 5, 8]
+    # the stream comes first among the equal records
+    res = [(1, 's')] | P | merge_sorted([(1, 'o')], key=it[0]) | list | END
+    assert res == [(1, 's'), (1, 'o')]
+    # a file as the build side
+    res = ["5\n", "9\n"] | P | hash_join(str(b), key=str.strip) | list | END
+    assert res == [("5\n", "5\n")]
+    assert list(merge_sorted([2], reverse=True)([3, 1])) == [3, 2, 1]
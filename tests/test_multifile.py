@@ -0,0 +1,84 @@
+import sys
+sys.path.insert(0, '.')
+import gzip
+
+import pytest
+
+from bramin import *
+from bramin.io import callable_file
+from bramin.multifile import multi_file, expand
+
+
+@pytest.fixture
+def shards(tmp_path):
+    # gzip text files are read without registering it
+    files = []
+    for i in range(5):
+        fname = tmp_path / f"part-{i}.txt.gz"
+        with gzip.open(fname, 'wt') as f:
+            for j in range(300):
+                f.write(f"{i} {j}\n")
+        files.append(str(fname))
+    return files
+
+
+def all_lines(files):
+    lines = []
+    for fname in files:
+        with gzip.open(fname, 'rt') as f:
+            lines.extend(f)
+    return lines
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_ordered(shards, backend):
+    f = multi_file(shards[0][:-9] + "*.txt.gz", max_open=2,
+                   backend=backend, chunksize=7)
+    assert list(f()) == all_lines(shards)
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_interleaved(shards, backend):
+    f = multi_file(shards, max_open=3, backend=backend, ordered=False)
+    assert sorted(f()) == sorted(all_lines(shards))
+
+
+def test_pipe_syntax(shards):
+    pattern = shards[0].replace("part-0", "part-*")
+    n = pattern >> P | (lambda ls: sum(1 for _ in ls)) | END
+    assert n == 1500
+    assert (shards[:2] >> P | list | END) == all_lines(shards[:2])
+    f = multi_file(pattern, max_open=2, ordered=False)
+    assert len(f >> P | list | END) == 1500
+
+
+def test_early_stop(shards):
+    lines = multi_file(shards, max_open=2, chunksize=1, maxsize=1)()
+    assert next(lines) == "0 0\n"
+    lines.close()
+
+
+def test_errors(shards, tmp_path):
+    with pytest.raises(IOError):
+        expand(str(tmp_path / "nothing-*.gz"))
+    f = multi_file(shards + [str(tmp_path / "missing.gz")], max_open=2)
+    with pytest.raises(FileNotFoundError):
+        list(f())
+
+
+def test_literal_path_with_magic(tmp_path):
+    fname = tmp_path / "data[1].txt"
+    fname.write_text("a\nb\n")
+    assert str(fname) >> P | list | END == ["a\n", "b\n"]
+    assert expand([str(fname)]) == [str(fname)]
+    # a pattern if the file does not exist
+    (tmp_path / "data1.txt").write_text("c\n")
+    fname.unlink()
+    assert str(fname) >> P | list | END == ["c\n"]
+
+
+def test_glob_gz(shards):
+    assert callable_file(shards[0])._ftype.name == 'gzipped_text'
+    pattern = shards[0].replace("part-0", "part-*")
+    res = pattern >> P | sorted | END
+    assert res == sorted(all_lines(shards))
@@ -0,0 +1,53 @@
+import sys
+sys.path.insert(0, '.')
+from functools import partial
+
+from toolz import curry as c
+
+from bramin import *
+from bramin.optimize import as_map_filter, fuse_loops, FusedLoop
+
+
+def inc(x):
+    return x + 1
+
+
+def is_odd(x):
+    return x % 2 == 1
+
+
+class TestOptimize(object):
+    def test_recognize(self):
+        assert as_map_filter(c(map, inc)) == ('map', inc)
+        assert as_map_filter(c(map, inc, it)) == ('map', inc)
+        assert as_map_filter(partial(filter, is_odd)) == ('filter', is_odd)
+        assert as_map_filter(curry(map)(inc)) == ('map', inc)
+        assert as_map_filter(curry(filter, is_odd)) == ('filter', is_odd)
+        assert as_map_filter(c(map, inc, [1])) is None
+        assert as_map_filter(curry(map, inc, [1], [2])) is None
+        assert as_map_filter(inc) is None
+        pred = it > 1
+        assert as_map_filter(c(filter, pred)) == ('filter', pred)
+
+    def test_fuse(self):
+        pipe = P | c(map, inc) | c(filter, is_odd) | curry(map, it * 2) | list
+        opt = pipe.optimize()
+        assert len(opt._chain) == 1
+        assert isinstance(opt._chain[0], FusedLoop)
+        assert opt(range(10)) == pipe(range(10)) == [2, 6, 10, 14, 18]
+        assert len(opt.optimizations) == 1
+        assert "map(inc) -> filter(is_odd)" in opt.optimizations[0]
+
+    def test_fuse_streaming(self):
+        pipe = P | c(map, inc) | c(filter, it % 3 == 0) | sum
+        opt = pipe.optimize()
+        assert len(opt._chain) == 2
+        assert opt(range(100)) == pipe(range(100))
+
+    def test_not_fused(self):
+        pipe = P | c(map, inc) | sorted | c(filter, is_odd) | tuple
+        chain, applied = fuse_loops(pipe._chain)
+        assert applied == []
+        assert chain == pipe._chain
+        pipe = P | c(map, inc) | c(filter, None) | set
+        assert pipe.optimize()(range(-2, 2)) == {-1, 1, 2}
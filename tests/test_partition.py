@@ -0,0 +1,107 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import gzip
+
+import pytest
+
+from bramin import *
+from bramin.io import callable_file, gzipped_text
+from bramin.partition import partition
+
+
+def records(n=100):
+    return [f"{i % 7}\t{i}\n" for i in range(n)]
+
+
+def by_key(recs):
+    res = {}
+    for r in recs:
+        res.setdefault(r.split('\t')[0], []).append(r)
+    return res
+
+
+def first_col(line):
+    return line.split('\t')[0]
+
+
+def read(path):
+    with open(path) as f:
+        return f.readlines()
+
+
+def test_routing(tmp_path):
+    tmpl = str(tmp_path / "out" / "{key}.tsv")
+    with partition(tmpl, first_col) as sink:
+        paths = sink(records())
+    assert len(paths) == 7
+    for k, recs in by_key(records()).items():
+        assert read(tmpl.format(key=k)) == recs
+
+
+def test_lru_pool(tmp_path):
+    tmpl = str(tmp_path / "{key}.tsv")
+    sink = partition(tmpl, first_col, max_open=2, buffer_size=3)
+    sink(records())
+    assert len(sink._pool) <= 2
+    sink.close()
+    for k, recs in by_key(records()).items():
+        assert read(tmpl.format(key=k)) == recs
+
+
+def test_reuse_handles(tmp_path):
+    tmpl = str(tmp_path / "{key}.tsv")
+    sink = partition(tmpl, first_col)
+    sink(records(7))
+    handles = dict(sink._pool)
+    sink(records(7))
+    assert all(sink._pool[p] is fh for p, fh in handles.items())
+    # flushed at the end of each call
+    assert read(tmpl.format(key=0)) == ["0\t0\n", "0\t0\n"]
+    sink.close()
+
+
+def test_rerun(tmp_path):
+    tmpl = str(tmp_path / "{key}.tsv")
+    sink = partition(tmpl, first_col, max_open=2)
+    # the calls before close are one run, appended even after eviction
+    sink(records(7))
+    sink(records(7))
+    sink.close()
+    assert read(tmpl.format(key=0)) == ["0\t0\n"] * 2
+    # a new run truncates the files
+    with sink:
+        sink(records(7))
+    assert read(tmpl.format(key=0)) == ["0\t0\n"]
+    assert read(tmpl.format(key=6)) == ["6\t6\n"]
+
+
+def test_gzip(tmp_path):
+    callable_file.register(gzipped_text)
+    try:
+        tmpl = str(tmp_path / "{key}.tsv.gz")
+        with partition(tmpl, first_col, max_open=3) as sink:
+            sink(records())
+        for k, recs in by_key(records()).items():
+            with gzip.open(tmpl.format(key=k), 'rt') as f:
+                assert f.readlines() == recs
+    finally:
+        callable_file.unregister('gzipped_text')
+
+
+def test_pipe_syntax(tmp_path):
+    tmpl = str(tmp_path / "{key}.tsv")
+    sink = partition(tmpl, first_col)
+    paths = records() | P | sorted > sink | END
+    assert len(paths) == 7
+    sink.close()
+    p = (P | sorted) >> partition(tmpl, first_col)
+    p(records())
+    p.last.close()
+    assert read(tmpl.format(key=0)) == sorted(by_key(records())['0']) * 2
+
+
+def test_bad_key(tmp_path):
+    sink = partition(str(tmp_path / "{key}.tsv"), lambda l: "../x")
+    with pytest.raises(ValueError):
+        sink(["a\n"])
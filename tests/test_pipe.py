@@ -130,3 +130,34 @@ class TestPipe(object):
         pipe = P | subp(f"cat {tmp_f}") | subp("grep 1") | list
         assert pipe._chain[0].cmd == f"cat {tmp_f} | grep 1"
         assert pipe()[:2] == ["1\n", "10\n"]
+
+
+class TestConcurrency(object):
+    def test_shared_pipe_in_threads(self):
+        import sys
+        from concurrent.futures import ThreadPoolExecutor
+        pipe = P | c(map, it * 2 + it) | list
+
+        def run(i):
+            return pipe(range(i, i + 20)) == [3 * x for x in range(i, i + 20)]
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # force frequent thread switching
+        try:
+            with ThreadPoolExecutor(16) as ex:
+                assert all(ex.map(run, range(3000)))
+        finally:
+            sys.setswitchinterval(interval)
+
+    def test_concurrent_redirect(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def run(i):
+            fname = str(tmp_path / f"{i}.txt")
+            [f"{i}\n"] | P | it > fname | END
+            with open(fname) as f:
+                return f.read() == f"{i}\n"
+
+        with ThreadPoolExecutor(16) as ex:
+            assert all(ex.map(run, range(1000)))
+        assert END.attach is None
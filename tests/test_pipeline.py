@@ -0,0 +1,91 @@
+import sys
+sys.path.insert(0, '.')
+import time
+import itertools
+
+import pytest
+
+from bramin import *
+from bramin.pipeline import pipelined
+
+
+def slow(delay):
+    def stage(xs):
+        for x in xs:
+            time.sleep(delay)
+            yield x + 1
+    return stage
+
+
+@pytest.fixture(params=['thread', 'process'])
+def backend(request):
+    return request.param
+
+
+class TestPipelined(object):
+    def test_result(self, backend):
+        pipe = P | slow(0) | (lambda xs: (x * 2 for x in xs)) | list
+        got = []
+        p = pipe.pipelined(backend=backend, maxsize=2, chunksize=3,
+                           on_stats=got.append)
+        assert p(range(20)) == pipe(range(20))
+        [stats] = got
+        assert [s['items_out'] for s in stats] == [20, 20, 1]
+        for s in stats:
+            assert 0 <= s['occupancy'] <= 1
+            assert s['queue_max'] <= 2
+
+    def test_overlap(self):
+        pipe = P | slow(0.005) | slow(0.005) | slow(0.005) | list
+        p = pipe.pipelined(chunksize=1)
+        t0 = time.perf_counter()
+        assert p(range(60)) == list(range(3, 63))
+        # serial run need 0.9s
+        assert time.perf_counter() - t0 < 0.7
+
+    def test_scalar_stage(self, backend):
+        pipe = P | sorted | len | str
+        assert pipe.pipelined(backend=backend)([3, 1, 2]) == "3"
+
+    def test_groups(self):
+        pipe = P | slow(0) | slow(0) | sum
+        p = pipe.pipelined(groups=[2, 1])
+        assert len(p.stages) == 2
+        assert p(range(10)) == 65
+        with pytest.raises(ValueError):
+            pipe.pipelined(groups=[1, 1])
+
+    def test_lazy_output(self, backend):
+        pipe = P | slow(0) | (lambda xs: itertools.islice(xs, 3))
+        p = pipe.pipelined(backend=backend)
+        assert list(p(itertools.count())) == [1, 2, 3]
+
+    def test_error(self, backend):
+        pipe = P | (lambda xs: (1 / x for x in xs)) | list
+        with pytest.raises(ZeroDivisionError):
+            pipe.pipelined(backend=backend)([1, 0])
+
+
+def test_subp_stats():
+    from bramin.subp import subp
+    got = []
+    p = pipelined(P | subp("cat") | list)
+    assert p(["a\n", "b\n"], on_stats=got.append) == ["a\n", "b\n"]
+    procs = got[0][0]['subp']
+    assert procs[0]['cmd'] == "cat" and procs[0]['bytes_out'] == 4
+
+
+def test_concurrent_stats():
+    # each call get it's own stats, nothing kept on the object
+    from concurrent.futures import ThreadPoolExecutor
+    p = pipelined(P | (lambda xs: (x for x in xs)) | list)
+
+    def run(n):
+        got = []
+        p(range(n), on_stats=got.append)
+        return got[0][-1]['items_out'], got[0][0]['items_out']
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(run, range(1, 17))) == \
+            [(1, n) for n in range(1, 17)]
+    assert not hasattr(p, 'last_stats')
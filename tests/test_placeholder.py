@@ -1,97 +1,77 @@
 import sys
 sys.path.insert(0, '.')
 import operator
+import pickle
+
+import pytest
 
 from bramin.pipe import placeholder
 
 
 class TestPlaceHolder(object):
     def test_instance_numeric_left_ops(self):
-        ph = placeholder()
-        ph / 3 * 2 + 1
-        assert ph._chain[0].func is operator.truediv
-        assert ph._chain[1].func is operator.mul
-        assert ph._chain[2].func is operator.add
+        ph = placeholder() / 3 * 2 + 1
+        assert ph._func is operator.add
+        assert ph._args[0]._func is operator.mul
+        assert ph._args[0]._args[0]._func is operator.truediv
         assert ph(3) == 3.0
-        ph = placeholder()
-        ph // 3 * 2 + 1
-        assert ph._chain[0].func is operator.floordiv
+        ph = placeholder() // 3 * 2 + 1
+        assert ph._args[0]._args[0]._func is operator.floordiv
         assert ph(3) == 3
 
     def test_instance_numeric_right_ops(self):
-        ph = placeholder()
-        3 * ph
+        ph = 3 * placeholder()
         assert ph(1) == 3
-        ph = placeholder()
-        3 / ph
+        ph = 3 / placeholder()
         assert ph(1) == 3.0
+        ph = 1 >> placeholder()
+        assert ph(1) == 0
+        ph = placeholder() & 1
+        assert ph(3) == 1
 
     def test_instance_container_ops(self):
-        ph = placeholder()
-        ph[1]
+        ph = placeholder()[1]
         assert ph([1, 2, 3]) == 2
         ph = placeholder()
-        ph[1] = 'a'
-        l = [1, 2, 3]
-        ph(l)
-        assert l[1] == 'a'
-        #ph = placeholder()
-        #import ipdb; ipdb.set_trace()
-        # len(ph)
-        #assert ph(range(10)) == 10
-        ph = placeholder()
-        reversed(ph)
+        with pytest.raises(TypeError):
+            ph[1] = 'a'
+        ph = reversed(placeholder())
         assert list(ph([1, 2, 3])) == [3, 2, 1]
-        #ph = placeholder()
-        #import ipdb; ipdb.set_trace()
-        #1 in ph
-        #assert ph([1,2,3]) == True
-        #ph = placeholder()
-        #g = (i for i in ph)
-        # ph([1,2,3])
-        #assert list(g) == [1,2,3]
 
     def test_instance_compare_ops(self):
-        ph = placeholder()
-        ph > 1
+        ph = placeholder() > 1
         assert ph(2) is True
         assert ph(1) is False
-        ph = placeholder()
-        ph < 0
+        ph = placeholder() < 0
         assert ph(-1) is True
         assert ph(1) is False
-        ph = placeholder()
-        ph == 0
+        ph = placeholder() == 0
         assert ph(0) is True
         assert ph(-1) is False
-        ph = placeholder()
-        ph >= 0
+        ph = placeholder() >= 0
         assert ph(0) is True
         assert ph(-1) is False
-        ph = placeholder()
-        ph <= 0
+        ph = placeholder() <= 0
         assert ph(0) is True
         assert ph(1) is False
 
     def test_instance_attr_access_ops(self):
         class A:
             a = 1
-        ph = placeholder()
-        #import ipdb; ipdb.set_trace()
-        ph.a
+        ph = placeholder().a
         assert ph(A) == 1
         assert ph(A()) == 1
 
-    def test_multiple_instance(self):
+    def test_shared_input(self):
         ph1 = placeholder()
         ph2 = placeholder()
         ph3 = placeholder()
-        ph1 + 1 + 2 * ph2 + ph3
-        assert ph1(1)(1)(38) == 42
+        ph = ph1 + 1 + 2 * ph2 + ph3
+        assert ph(1) == 5
 
     def test_class_ops(self):
         ph = placeholder + 1
-        assert ph._chain[0].func is operator.add
+        assert ph._func is operator.add
         assert ph(1) == 2
 
         class A:
@@ -102,4 +82,67 @@ class TestPlaceHolder(object):
 
     def test_class_make_multiple_instance(self):
         ph = placeholder + 1 + placeholder * 2
-        assert ph(1)(2) == 6
+        assert ph(1) == 4
+
+    def test_immutable(self):
+        base = placeholder + 1
+        e1 = base * 2
+        e2 = base - 1
+        assert base(1) == 2
+        assert e1(1) == 4
+        assert e2(1) == 1
+
+    def test_hash_consing(self):
+        assert (placeholder.x + 1) is (placeholder.x + 1)
+        assert placeholder() is placeholder()
+        assert (placeholder() + 1) is (placeholder + 1)
+        assert (placeholder + 1) is not (placeholder + 1.0)
+        assert type((placeholder + 1.0)(1)) is float
+
+    def test_common_subexpression(self):
+        n_access = []
+
+        class A:
+            @property
+            def x(self):
+                n_access.append(1)
+                return 2
+
+        e = (placeholder.x + 1) * (placeholder.x + 1)
+        assert e(A()) == 9
+        assert len(n_access) == 1
+
+    def test_signed_zero(self):
+        # equal constants behave differently, not merged
+        assert (placeholder * -0.0) is not (placeholder * 0.0)
+        assert str((placeholder * -0.0)(1.0)) == "-0.0"
+        assert str((placeholder * 0.0)(1.0)) == "0.0"
+        assert (placeholder + 1j) is (placeholder + 1j)
+        assert (placeholder * 0.5) is (placeholder * 0.5)
+
+    def test_constant_folding(self):
+        assert placeholder._node(operator.add, (1, 2), {}) == 3
+
+    def test_unhashable_constant(self):
+        lst = [10, 20]
+        e = placeholder + lst
+        assert e([1]) == [1, 10, 20]
+        assert (placeholder + [10, 20]) is not e
+
+    def test_pickle(self):
+        e = (placeholder[0] + 1) * 2
+        assert pickle.loads(pickle.dumps(e)) is e
+        assert pickle.loads(pickle.dumps(placeholder())) is placeholder()
+
+    def test_repr(self):
+        assert repr(placeholder.a[1:2] + 1) == "(_x_.a[1:2] + 1)"
+        assert repr(2 - placeholder) == "(2 - _x_)"
+
+    def test_deep_chain(self):
+        # no recursion limit on long chains of operations
+        e = placeholder
+        for i in range(3000):
+            e = e + 1 if i % 2 else e.real * 1
+        assert e(5) == 1505
+        assert repr(e).startswith("(" * 100)
+        assert pickle.loads(pickle.dumps(e)) is e
@@ -0,0 +1,158 @@
+import sys
+sys.path.insert(0, '.')
+import gzip
+import shutil
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.io import callable_file, gzipped_text
+from bramin.subp import subp
+from bramin.optimize import push_down_filters
+from bramin.pushdown import (
+    startswith, contains, matches, as_pushable, filtered_file
+)
+
+
+LINES = [f"chr{i % 3 + 1}\t{i}\tgène{i % 2}\n" for i in range(50)]
+
+
+@pytest.fixture
+def tsv(tmp_path):
+    fname = str(tmp_path / "a.tsv")
+    with open(fname, 'w') as f:
+        f.writelines(LINES)
+    return fname
+
+
+@pytest.fixture
+def tsv_gz(tmp_path):
+    callable_file.register(gzipped_text)
+    fname = str(tmp_path / "a.tsv.gz")
+    with gzip.open(fname, 'wt') as f:
+        f.writelines(LINES)
+    yield fname
+    callable_file.unregister('gzipped_text')
+
+
+def second_col(line):
+    return int(line.split('\t')[1])
+
+
+def test_as_pushable():
+    assert repr(as_pushable(it[:4] == "chr1")) == "startswith('chr1')"
+    assert repr(as_pushable("chr1" == it[:4])) == "startswith('chr1')"
+    assert as_pushable(it[:3] == "chr1") is None
+    assert as_pushable(it[1:4] == "hr1") is None
+    assert as_pushable(it > "chr1") is None
+    assert as_pushable(second_col) is None
+
+
+@pytest.mark.parametrize("pred", [
+    startswith("chr1"), it[:4] == "chr1", contains("gène1"),
+    matches("^chr[12]\t1"),
+])
+def test_push_into_reader(tsv, pred):
+    pipe = tsv >> P | c(filter, pred) | c(map, second_col) | list
+    opt = pipe.optimize()
+    assert isinstance(opt._chain[0], filtered_file)
+    assert "into reading" in opt.optimizations[0]
+    assert opt() == pipe() == [second_col(l) for l in LINES if pred(l)]
+
+
+def test_several_filters(tsv):
+    pipe = tsv >> P | c(filter, startswith("chr2")) \
+        | c(filter, contains("gène0")) | c(filter, lambda l: l[-2] == '0') \
+        | list
+    chain, applied = push_down_filters(pipe._chain)
+    assert isinstance(chain[0], filtered_file)
+    assert len(chain) == 3  # the lambda is kept
+    assert "startswith('chr2') and contains('gène0')" in applied[0]
+    assert pipe.optimize()() == pipe()
+
+
+def test_not_pushed(tsv):
+    # '.' may match a part of a multi-bytes char
+    pipe = tsv >> P | c(filter, matches("g.ne")) | list
+    assert push_down_filters(pipe._chain) == (pipe._chain, [])
+    # not the same syntax in grep -E
+    for pattern in ["(?i)chr", "chr1+?", "chr1{1}", "chr[]1]", "x\\d",
+                    "[^c]hr", "chr1*+"]:
+        assert matches(pattern).bytes_pred() is None
+        assert matches(pattern).grep_args() is None
+    pipe = tsv >> P | c(map, str.upper) | c(filter, startswith("CHR1")) | list
+    assert push_down_filters(pipe._chain)[1] == []
+    pipe = P | c(filter, startswith("chr1")) | list
+    assert push_down_filters(pipe._chain)[1] == []
+    assert pipe.optimize()(LINES) == [l for l in LINES if l[:4] == "chr1"]
+
+
+@pytest.mark.skipif(shutil.which("grep") is None, reason="no grep")
+def test_grep(tsv):
+    pipe = tsv >> P | c(filter, it[:4] == "chr3") \
+        | c(filter, matches("ne1$")) | list
+    opt = pipe.optimize(grep=True)
+    assert isinstance(opt._chain[0], subp)
+    assert "into `LC_ALL=C grep" in opt.optimizations[0]
+    assert opt() == pipe() != []
+
+
+def test_not_utf8(tmp_path):
+    fname = str(tmp_path / "latin1.txt")
+    with open(fname, 'w', encoding='latin-1') as f:
+        f.write("café 1\nthé 2\n")
+    for src in [callable_file(fname, 'r', encoding='latin-1'),
+                callable_file(fname, 'r', errors='replace')]:
+        pipe = P | src | c(filter, contains('caf')) | list
+        assert push_down_filters(pipe._chain)[1] == []
+        assert pipe.optimize(grep=True)() == pipe()
+    pipe = P | callable_file(fname, encoding='latin-1') \
+        | c(filter, contains('café')) | list
+    assert pipe.optimize()() == pipe() == ['café 1\n']
+    # utf-8 given explicitly is still pushed down
+    pipe = P | callable_file(fname, encoding='UTF8') \
+        | c(filter, contains('x')) | list
+    assert push_down_filters(pipe._chain)[1] != []
+
+
+CRLF = ["chr1\t1\r\n", "x\rchr1\t2\r", "chr2\t3\rchr1\t4\n", "chr1\t5\r"]
+
+
+@pytest.mark.parametrize("grep", [False, True])
+@pytest.mark.parametrize("pred", [
+    startswith("chr1"), contains("1\t"), matches("^chr1\t[24]$"),
+    matches("2$"),
+])
+def test_newlines(tmp_path, grep, pred):
+    fname = str(tmp_path / "crlf.tsv")
+    with open(fname, 'wb') as f:
+        f.write("".join(CRLF).encode())
+    pipe = fname >> P | c(filter, pred) | list
+    opt = pipe.optimize(grep=grep)
+    assert opt.optimizations
+    assert opt() == pipe() != []
+
+
+@pytest.mark.skipif(shutil.which("grep") is None, reason="no grep")
+def test_grep_error(tsv):
+    import os
+    from subprocess import CalledProcessError
+    opt = (tsv >> P | c(filter, startswith("chr1")) | list).optimize(grep=True)
+    os.remove(tsv)
+    with pytest.raises(CalledProcessError):
+        opt()
+
+
+@pytest.mark.skipif(shutil.which("gzip") is None, reason="no gzip")
+def test_grep_gz(tsv_gz):
+    pipe = tsv_gz >> P | c(filter, startswith("chr1")) | c(map, second_col) \
+        | list
+    opt = pipe.optimize(grep=True)
+    assert "gzip -dc" in opt.optimizations[0]
+    assert opt() == pipe() == list(range(0, 50, 3))
+    # fall back to filter in the reader
+    pipe = tsv_gz >> P | c(filter, contains("\n")) | list
+    opt = pipe.optimize(grep=True)
+    assert isinstance(opt._chain[0], filtered_file)
+    assert opt() == pipe() == LINES
@@ -0,0 +1,69 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import mmap
+
+import numpy as np
+import pandas as pd
+
+from bramin import *
+from bramin import shm
+
+
+def _root_base(arr):
+    while getattr(arr, 'base', None) is not None:
+        arr = arr.base
+    return arr
+
+
+def _segments(prefix):
+    return [f for f in os.listdir('/dev/shm') if f.startswith(prefix)]
+
+
+class TestShm(object):
+    def test_array(self):
+        prefix = shm.new_prefix()
+        a = np.arange(100000, dtype='f8').reshape(1000, 100)
+        small = np.arange(10)
+        d = shm.share([a, small, "x"], prefix)
+        assert type(d[0]) is shm.SharedArray
+        assert d[1] is small
+        assert len(_segments(prefix)) == 1
+        b, s, x = shm.restore(d)
+        assert (b == a).all()
+        assert isinstance(_root_base(b), mmap.mmap)  # no copy
+        assert _segments(prefix) == []
+
+    def test_frame(self):
+        prefix = shm.new_prefix()
+        df = pd.DataFrame({'a': np.arange(20000.), 'b': ['x'] * 20000},
+                          index=np.arange(20000) * 2)
+        r = shm.restore(shm.share(df, prefix))
+        assert r.equals(df)
+        assert isinstance(_root_base(r['a'].to_numpy()), mmap.mmap)
+        s = shm.restore(shm.share(df['a'], prefix))
+        assert s.equals(df['a'])
+        assert s.name == 'a'
+
+    def test_cleanup(self):
+        prefix = shm.new_prefix()
+        shm.share(np.ones(100000), prefix)
+        assert len(_segments(prefix)) == 1
+        shm.cleanup(prefix)
+        assert _segments(prefix) == []
+
+    def test_pipelined(self):
+        def gen(n):
+            for i in range(n):
+                yield np.full(50000, i, dtype='f8')
+
+        def bases(arrs):
+            for a in arrs:
+                yield type(_root_base(a)).__name__, a.sum()
+
+        pipe = P | gen | (lambda xs: (x * 2 for x in xs)) | bases | list
+        res = pipe.pipelined(backend='process', chunksize=2)(10)
+        assert [s for _, s in res] == [i * 2 * 50000 for i in range(10)]
+        assert set(b for b, _ in res) == {'mmap'}
+        res = pipe.pipelined(backend='process', shm_min_bytes=None)(3)
+        assert 'mmap' not in set(b for b, _ in res)
@@ -0,0 +1,91 @@
+import sys
+sys.path.insert(0, '.')
+import os
+import random
+import shutil
+
+import pytest
+
+from bramin import *
+from bramin.sort import sort_stream
+
+
+def first(r):
+    return r[0]
+
+
+def records(n=3000, seed=0):
+    rnd = random.Random(seed)
+    return [(rnd.randint(0, 50), i) for i in range(n)]
+
+
+def lines(n=2000, seed=1):
+    rnd = random.Random(seed)
+    return [f"{rnd.randint(0, 999)}\t{i}\n" for i in range(n)]
+
+
+def test_in_memory(tmp_path):
+    s = sort_stream(key=first, tmpdir=str(tmp_path))
+    assert list(s(records())) == sorted(records(), key=first)
+    assert os.listdir(tmp_path) == []  # nothing spilled
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("workers,backend", [
+    (None, 'process'), (2, 'thread'), (2, 'process'),
+])
+def test_external(tmp_path, reverse, workers, backend):
+    s = sort_stream(key=first, reverse=reverse, memory_limit=10_000,
+                    workers=workers, backend=backend, tmpdir=str(tmp_path))
+    res = iter(records()) | P | s | list | END
+    # stable, same as sorted
+    assert res == sorted(records(), key=first, reverse=reverse)
+    assert os.listdir(tmp_path) == []  # temp files removed
+
+
+def test_multi_pass_merge(tmp_path):
+    s = sort_stream(memory_limit=2_000, fan_in=2, tmpdir=str(tmp_path))
+    data = [r[0] * 10000 + r[1] for r in records()]
+    assert list(s(iter(data))) == sorted(data)
+    assert os.listdir(tmp_path) == []
+
+
+def test_close_early(tmp_path):
+    s = sort_stream(memory_limit=10_000, tmpdir=str(tmp_path))
+    res = s(iter(lines()))
+    assert next(res) == min(lines())
+    assert len(os.listdir(tmp_path)) == 1
+    res.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_never_read(tmp_path):
+    import gc
+    s = sort_stream(memory_limit=10_000, tmpdir=str(tmp_path))
+    res = s(iter(lines()))
+    assert len(os.listdir(tmp_path)) == 1
+    del res  # dropped without being started
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+
+def test_args():
+    with pytest.raises(ValueError):
+        sort_stream(key=first, gnu=True)
+    with pytest.raises(ValueError):
+        sort_stream(fan_in=1)
+    with pytest.raises(ValueError):
+        sort_stream(backend='gpu')
+
+
+@pytest.mark.skipif(shutil.which("sort") is None, reason="no sort")
+def test_gnu(tmp_path):
+    s = sort_stream(gnu=True, workers=2, memory_limit=1 << 20,
+                    tmpdir=str(tmp_path))
+    assert "--parallel=2" in repr(s)
+    assert list(s(lines())) == sorted(lines())
+    s = sort_stream(gnu=True, gnu_args="-k1,1n", reverse=True)
+    res = lines() | P | s | list | END
+    key = lambda l: int(l.split('\t')[0])
+    assert res == sorted(lines(), key=key, reverse=True)
+    assert list(s([])) == []
@@ -0,0 +1,89 @@
+import sys
+sys.path.insert(0, '.')
+import random
+from functools import partial
+
+import pytest
+
+from bramin import *
+from bramin.chunk import concat
+from bramin.split import file_splits, read_split, split_file
+
+
+@pytest.fixture
+def text(tmp_path):
+    rnd = random.Random(0)
+    lines = [("x" * rnd.randint(0, 30)) + f"{i}\n" for i in range(500)]
+    lines.append("no newline at end")
+    fname = str(tmp_path / "big.txt")
+    with open(fname, 'w') as f:
+        f.writelines(lines)
+    return fname, lines
+
+
+def test_every_line_once(text):
+    fname, lines = text
+    for size in (1, 2, 7, 33, 100, 4096, 10 ** 6):
+        got = []
+        for s in file_splits(fname, size):
+            got.extend(read_split(s))
+        assert got == lines, size
+
+
+def test_newlines(tmp_path):
+    fname = str(tmp_path / "crlf.txt")
+    with open(fname, 'wb') as f:
+        f.write(b"a\r\nbb\rc\n\r\nd\re\r")
+    with open(fname) as f:  # universal newlines
+        expect = list(f)
+    for size in (1, 2, 3, 5, 100):
+        got = [l for s in file_splits(fname, size) for l in read_split(s)]
+        assert got == expect, size
+
+
+def test_n_splits(text):
+    fname, lines = text
+    splits = file_splits(fname, n_splits=4)
+    assert len(splits) == 4
+    assert [l for s in splits for l in read_split(s, binary=True)] == \
+        [l.encode() for l in lines]
+
+
+def test_empty_file(tmp_path):
+    fname = str(tmp_path / "empty.txt")
+    open(fname, 'w').close()
+    assert [list(read_split(s)) for s in file_splits(fname)] == [[]]
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_split_file(text, ordered):
+    fname, lines = text
+    p = split_file(fname, split_size=500, workers=2, ordered=ordered) \
+        | partial(map, str.upper) | list | concat
+    res = p | END
+    if ordered:
+        assert res == [l.upper() for l in lines]
+    else:
+        assert sorted(res) == sorted(l.upper() for l in lines)
+    n = split_file(fname, n_splits=3, workers=2) | list | len | concat \
+        | sum | END
+    assert n == len(lines)
+
+
+def test_default_workers(text):
+    import os
+    fname, lines = text
+    # the splits are read in worker processes by default
+    pids = split_file(fname, n_splits=4) | (lambda ls: [os.getpid()]) \
+        | concat | END
+    assert len(pids) == 4 and os.getpid() not in pids
+
+
+def test_not_splittable(tmp_path):
+    from bramin.io import callable_file, gzipped_text
+    callable_file.register(gzipped_text)
+    try:
+        with pytest.raises(ValueError):
+            file_splits(str(tmp_path / "a.gz"))
+    finally:
+        callable_file.unregister('gzipped_text')
@@ -1,7 +1,7 @@
 import sys
 sys.path.insert(0, '.')
 
-from bramin.subp import subp
+from bramin.subp import subp, collect_stats
 
 
 def gen_lines(s, t, st=1):
@@ -40,3 +40,61 @@ class TestSubp(object):
         p = subp("grep 1")
         c = b"1\n2\n11\n"
         assert list(p(c)) == [b"1\n", b"11\n"]
+
+    def test_stats(self):
+        got = []
+        p = subp("cat; exit 3", on_exit=got.append)
+        assert list(p(gen_lines(0, 3))) == ["0\n", "1\n", "2\n"]
+        [s] = got
+        assert not hasattr(p, 'last_stats')
+        assert s.returncode == 3
+        assert s.bytes_in == s.bytes_out == 6
+        assert s.wall > 0
+        if s.utime is not None:
+            assert s.cpu >= 0 and s.maxrss > 0
+
+    def test_stderr_sink(self):
+        err, got = [], []
+        # much more than the pipe buffer, must not deadlock
+        p = subp("seq 100000 >&2; echo done", stderr=err.append,
+                 on_exit=got.append)
+        assert list(p()) == ["done\n"]
+        assert len(err) == 100000 and err[-1] == "100000\n"
+        assert got[0].bytes_err == sum(len(l) for l in err)
+        # composed subp keep the sink
+        assert (p | subp("cat")).stderr is p.stderr
+
+    def test_early_stop(self):
+        got = []
+        p = subp("yes", on_exit=got.append)
+        out = p()
+        assert next(out) == "y\n"
+        out.close()
+        assert len(got) == 1
+        assert got[0].returncode != 0
+
+    def test_child_exit_early(self):
+        p = subp("head -n 1")
+        with collect_stats() as procs:
+            assert list(p(gen_lines(0, 100000))) == ["0\n"]
+        assert procs[0].returncode == 0
+
+    def test_universal_newlines(self):
+        got = []
+        p = subp(r"printf 'a\r\nb\rc\n'", on_exit=got.append)
+        assert list(p()) == ["a\n", "b\n", "c\n"]
+        assert list(p(b"")) == [b"a\r\n", b"b\rc\n"]
+        assert [s.bytes_out for s in got] == [7, 7]
+
+    def test_concurrent_stats(self):
+        # each call has it's own stats, nothing shared on the instance
+        from concurrent.futures import ThreadPoolExecutor
+        p = subp("wc -c")
+
+        def run(n):
+            with collect_stats() as procs:
+                list(p("x" * n))
+            return procs[0].bytes_in
+
+        with ThreadPoolExecutor(4) as pool:
+            assert list(pool.map(run, range(1, 33))) == list(range(1, 33))
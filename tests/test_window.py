@@ -0,0 +1,159 @@
+import sys
+sys.path.insert(0, '.')
+import random
+from collections import Counter
+
+import pytest
+from toolz import curry as c
+
+from bramin import *
+from bramin.aggregate import count, total, maximum
+from bramin.window import window, session_window, WindowResult
+
+
+def t0(e):
+    return e[0]
+
+
+def events(n=5000, n_keys=5, disorder=0, seed=0):
+    """(time, key, value), times shuffled within `disorder`."""
+    rnd = random.Random(seed)
+    evs = [(i + rnd.uniform(-disorder, disorder), f"k{rnd.randrange(n_keys)}",
+            rnd.randrange(10)) for i in range(n)]
+    return evs
+
+
+def brute(evs, size, slide, key=None):
+    res = Counter()
+    for t, k, _ in evs:
+        s = (t // slide) * slide
+        while s + size > t:
+            res[(s, None if key is None else k)] += 1
+            s -= slide
+    return res
+
+
+@pytest.mark.parametrize("slide", [None, 5, 3])
+def test_in_order(slide):
+    evs = events()
+    res = evs | P | window(10, slide, event_time=t0, key=it[1]) | list | END
+    ref = brute(evs, 10, slide or 10, key=True)
+    assert Counter({(w.start, w.key): w.value for w in res}) == ref
+    assert all(w.end - w.start == 10 for w in res)
+    starts = [w.start for w in res]
+    assert starts == sorted(starts)
+
+
+def test_out_of_order():
+    evs = events(disorder=3)
+    res = list(window(10, event_time=t0, lateness=6)(evs))
+    assert Counter({(w.start, None): w.value for w in res}) == \
+        brute(evs, 10, 10)
+    # lateness too small, some late records
+    late = []
+    res = list(window(10, event_time=t0, lateness=1,
+                      on_late=late.append)(evs))
+    assert late
+    assert sum(w.value for w in res) + len(late) == len(evs)
+
+
+def test_late_sliding():
+    late = []
+    w = window(10, 5, event_time=t0, lateness=3, on_late=late.append)
+    res = list(w([(12,), (21,), (13,), (3,)]))
+    # 13 is too late for [5, 15) but still in the open [10, 20)
+    assert [(r.start, r.value) for r in res] == \
+        [(5, 1), (10, 2), (15, 1), (20, 1)]
+    assert late == [(3,)]
+
+
+def test_gaps():
+    # slide > size: the records between windows are not late
+    late = []
+    w = window(5, slide=10, event_time=t0, on_late=late.append)
+    res = list(w([(1,), (7,), (12,), (30,), (3,)]))
+    assert [(r.start, r.end, r.value) for r in res] == \
+        [(0, 5, 1), (10, 15, 1), (30, 35, 1)]
+    assert late == [(3,)]
+
+
+def test_aggs():
+    evs = [(1, 'a', 3), (2, 'b', 5), (4, 'a', 7), (12, 'a', 1)]
+    w = window(10, event_time=t0, key=it[1],
+               agg={'n': count(), 'sum': total(it[2]), 'max': maximum(it[2])})
+    assert list(w(evs)) == [
+        WindowResult(0, 10, 'a', {'n': 2, 'sum': 10, 'max': 7}),
+        WindowResult(0, 10, 'b', {'n': 1, 'sum': 5, 'max': 5}),
+        WindowResult(10, 20, 'a', {'n': 1, 'sum': 1, 'max': 1}),
+    ]
+    assert [r.value for r in window(10, event_time=t0,
+                                    agg=[count(), total(it[2])])(evs)] == \
+        [(3, 15), (1, 1)]
+
+
+def test_open_windows_only():
+    """Emitted in the stream, not at the end, state is evicted."""
+    w = window(10, 5, event_time=t0)
+    seen = []
+
+    def gen():
+        for i in range(1000):
+            seen.append(i)
+            yield (i,)
+
+    res = w(gen())
+    first = next(res)
+    assert first.start == -5 and len(seen) == 6
+    for r in res:
+        # the window is emitted once the watermark passed
+        assert seen[-1] < r.end + 1 or len(seen) == 1000
+
+
+def test_arrival_time():
+    res = list(window(3600)(range(10)))
+    assert len(res) in (1, 2) and sum(r.value for r in res) == 10
+
+
+def test_bad_args():
+    with pytest.raises(ValueError):
+        window(0)
+    with pytest.raises(ValueError):
+        window(10, lateness=-1)
+    with pytest.raises(ValueError):
+        session_window(0)
+    with pytest.raises(TypeError):
+        window(10, agg=[sum])
+
+
+def test_session():
+    evs = [(1, 'a'), (3, 'a'), (4, 'b'), (20, 'a'), (22, 'a'), (40, 'b')]
+    res = list(session_window(5, event_time=t0, key=it[1])(evs))
+    assert res == [
+        WindowResult(1, 8, 'a', 2), WindowResult(4, 9, 'b', 1),
+        WindowResult(20, 27, 'a', 2), WindowResult(40, 45, 'b', 1)]
+
+
+def test_session_merge():
+    # 9.5 comes out of order and bridges two sessions
+    evs = [(1,), (5,), (14,), (18,), (9.5,), (2,), (100,)]
+    res = list(session_window(5, event_time=t0, lateness=20)(evs))
+    assert res == [WindowResult(1, 23, None, 6),
+                   WindowResult(100, 105, None, 1)]
+    # [1, 10) is closed when 9.5 comes, 2 is late
+    late = []
+    res = list(session_window(5, event_time=t0,
+                              on_late=late.append)(evs))
+    assert late == [(2,)]
+    assert [(r.start, r.value) for r in res] == [(1, 2), (9.5, 3), (100, 1)]
+
+
+def test_session_out_of_order():
+    rnd = random.Random(1)
+    times = sorted(rnd.sample(range(3000), 600))
+    evs = [(t + rnd.uniform(-2, 2),) for t in times]
+    res = list(session_window(4, event_time=t0, lateness=5)(evs))
+    assert sum(r.value for r in res) == len(evs)
+    # sessions are separated by the gap
+    ts = sorted(e[0] for e in evs)
+    n_sessions = 1 + sum(b - a > 4 for a, b in zip(ts, ts[1:]))
+    assert len(res) == n_sessions
@@ -0,0 +1,104 @@
+import sys
+sys.path.insert(0, '.')
+import gzip
+import time
+
+import pytest
+
+from bramin import *
+from bramin.io import callable_file, gzipped_text
+from bramin.writebehind import write_behind
+
+
+def lines(n):
+    return [f"{i}\n" for i in range(n)]
+
+
+def read(path):
+    with open(path) as f:
+        return f.readlines()
+
+
+def test_write(tmp_path):
+    fname = str(tmp_path / "a.txt")
+    assert write_behind(fname, buffer_size=10)(lines(100)) == fname
+    assert read(fname) == lines(100)
+
+
+def test_pipe_syntax(tmp_path):
+    fname = str(tmp_path / "a.txt")
+    lines(10) | P | sorted > write_behind(fname, buffer_size=3) | END
+    p = (P | sorted) >> write_behind(fname, fsync=False)
+    p(lines(5))
+    assert read(fname) == sorted(lines(10)) + lines(5)
+
+
+def test_gzip(tmp_path):
+    callable_file.register(gzipped_text)
+    try:
+        fname = str(tmp_path / "a.txt.gz")
+        write_behind(fname, buffer_size=100)(lines(1000))
+        with gzip.open(fname, 'rt') as f:
+            assert f.readlines() == lines(1000)
+    finally:
+        callable_file.unregister('gzipped_text')
+
+
+def test_overlap(tmp_path):
+    # the writer is slow, the producer is slow, total ~ max not sum
+    def gen():
+        for l in lines(10):
+            time.sleep(0.02)
+            yield l
+    sink = write_behind(str(tmp_path / "a.txt"), buffer_size=1, fsync=False)
+    real = sink._ftype
+
+    def slow_writer(fh, buf):
+        time.sleep(0.02)
+        real.writer(fh, buf)
+    sink._ftype = type(real)('slow', None, real.opener, None, slow_writer)
+    t = time.perf_counter()
+    sink(gen())
+    assert time.perf_counter() - t < 0.35
+    assert read(sink.fname) == lines(10)
+
+
+def test_writer_error(tmp_path):
+    sink = write_behind(str(tmp_path / "a.txt"), buffer_size=1)
+    with pytest.raises(TypeError):
+        sink([b"a\n"] * 5)  # can not write bytes to text file
+
+
+def test_producer_error(tmp_path):
+    def gen():
+        yield "a\n"
+        raise KeyError("x")
+    with pytest.raises(KeyError):
+        write_behind(str(tmp_path / "a.txt"))(gen())
+
+
+def test_double_buffer(tmp_path):
+    from bramin.io import FileType
+    consumed, ahead = [0], []
+
+    def slow_write(fh, buf):
+        time.sleep(0.01)
+        # buffers read from the input, but not written yet(this one too)
+        ahead.append(consumed[0] - int(buf[0]))
+        fh.writelines(buf)
+
+    def records():
+        for i in range(20):
+            consumed[0] += 1
+            yield f"{i}\n"
+
+    callable_file.register(FileType("slow", lambda f: False, open,
+                                    lambda fh: fh, slow_write))
+    try:
+        fname = str(tmp_path / "a.txt")
+        write_behind(fname, buffer_size=1, file_type="slow")(records())
+    finally:
+        callable_file.unregister('slow')
+    assert read(fname) == lines(20)
+    # the one being written, and the one filled
+    assert max(ahead) <= 2